@@ -1,17 +1,27 @@
+from django import forms
 from django.contrib import admin
 
 from .models import (
     Achievement,
+    BroadcastNotification,
+    ChatArchiveSegment,
     ChatChannel,
     ChatChannelMembership,
     ChatMessage,
     Event,
     EventRegistration,
+    EventReminder,
     Notification,
+    NotificationOutbox,
+    NotificationPreference,
     Skill,
     UserProfile,
     VolunteerAchievement,
+    XpRollup,
+    XpTransaction,
+    award_xp,
 )
+from .services import delete_chat_message
 
 
 @admin.register(Skill)
@@ -20,12 +30,33 @@ class SkillAdmin(admin.ModelAdmin):
     search_fields = ['name']
 
 
+class UserProfileAdminForm(forms.ModelForm):
+    xp_adjustment = forms.IntegerField(
+        required=False,
+        label='Корректировка XP',
+        help_text='Записывается в журнал XP; отрицательное значение списывает опыт',
+    )
+
+    class Meta:
+        model = UserProfile
+        fields = '__all__'
+
+
 @admin.register(UserProfile)
 class UserProfileAdmin(admin.ModelAdmin):
+    form = UserProfileAdminForm
     list_display = ['user', 'role', 'city', 'phone', 'level', 'xp']
     list_filter = ['role', 'city', 'level']
     search_fields = ['user__username', 'user__email', 'city']
     filter_horizontal = ['skills']
+    # XP меняется только через журнал, иначе сумма в профиле разойдется с ним
+    readonly_fields = ['xp', 'level', 'completed_events']
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        adjustment = form.cleaned_data.get('xp_adjustment')
+        if adjustment:
+            award_xp(obj.user, adjustment, source='adjustment')
 
 
 @admin.register(Event)
@@ -54,6 +85,37 @@ class NotificationAdmin(admin.ModelAdmin):
     readonly_fields = ['created_at']
 
 
+@admin.register(EventReminder)
+class EventReminderAdmin(admin.ModelAdmin):
+    list_display = ['registration', 'lead_minutes', 'sent_at']
+    list_filter = ['lead_minutes']
+    raw_id_fields = ['registration']
+
+
+@admin.register(NotificationPreference)
+class NotificationPreferenceAdmin(admin.ModelAdmin):
+    list_display = ['user', 'type', 'muted', 'updated_at']
+    list_filter = ['type', 'muted']
+    search_fields = ['user__username']
+    raw_id_fields = ['user']
+
+
+@admin.register(NotificationOutbox)
+class NotificationOutboxAdmin(admin.ModelAdmin):
+    list_display = ['id', 'kind', 'status', 'attempts', 'available_at', 'created_at']
+    list_filter = ['status', 'kind']
+    readonly_fields = ['created_at']
+
+
+@admin.register(BroadcastNotification)
+class BroadcastNotificationAdmin(admin.ModelAdmin):
+    list_display = ['title', 'type', 'audience_role', 'created_by', 'created_at']
+    list_filter = ['type', 'audience_role', 'created_at']
+    search_fields = ['title', 'message']
+    raw_id_fields = ['related_event', 'created_by']
+    readonly_fields = ['created_at']
+
+
 @admin.register(Achievement)
 class AchievementAdmin(admin.ModelAdmin):
     list_display = ['title', 'category', 'threshold', 'is_active']
@@ -69,6 +131,34 @@ class VolunteerAchievementAdmin(admin.ModelAdmin):
     search_fields = ['volunteer__username', 'achievement__title']
 
 
+@admin.register(XpTransaction)
+class XpTransactionAdmin(admin.ModelAdmin):
+    list_display = ['volunteer', 'source', 'amount', 'created_at']
+    list_filter = ['source', 'created_at']
+    search_fields = ['volunteer__username']
+    raw_id_fields = ['volunteer', 'related_registration']
+    readonly_fields = ['created_at']
+
+    # Журнал только дополняется через award_xp: правка записей здесь
+    # не обновила бы UserProfile.xp и XpRollup
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(XpRollup)
+class XpRollupAdmin(admin.ModelAdmin):
+    list_display = ['volunteer', 'period', 'period_start', 'city', 'xp', 'events_completed']
+    list_filter = ['period', 'period_start']
+    search_fields = ['volunteer__username', 'city']
+    raw_id_fields = ['volunteer']
+
+
 @admin.register(ChatChannel)
 class ChatChannelAdmin(admin.ModelAdmin):
     list_display = ['name', 'event', 'created_by', 'is_archived', 'updated_at']
@@ -78,13 +168,28 @@ class ChatChannelAdmin(admin.ModelAdmin):
 
 @admin.register(ChatChannelMembership)
 class ChatChannelMembershipAdmin(admin.ModelAdmin):
-    list_display = ['channel', 'user', 'notifications_enabled', 'last_read_at', 'joined_at']
+    list_display = ['channel', 'user', 'notifications_enabled', 'unread_count', 'last_read_at', 'joined_at']
     list_filter = ['notifications_enabled', 'joined_at']
     search_fields = ['channel__name', 'user__username']
 
 
+@admin.register(ChatArchiveSegment)
+class ChatArchiveSegmentAdmin(admin.ModelAdmin):
+    list_display = ['channel', 'message_count', 'first_created_at', 'last_created_at', 'created_at']
+    search_fields = ['channel__name', 'channel__event__title']
+    exclude = ['payload']
+
+
 @admin.register(ChatMessage)
 class ChatMessageAdmin(admin.ModelAdmin):
-    list_display = ['channel', 'author', 'created_at']
-    list_filter = ['created_at']
+    list_display = ['channel', 'author', 'created_at', 'edited_at', 'is_deleted']
+    list_filter = ['is_deleted', 'created_at']
     search_fields = ['channel__name', 'author__username', 'content']
+    readonly_fields = ['seq', 'deleted_at']
+    actions = ['soft_delete']
+
+    @admin.action(description='Удалить у участников чата')
+    def soft_delete(self, request, queryset):
+        # Через сервис, чтобы удаление получило номер изменения и дошло до клиентов
+        for message in queryset.filter(is_deleted=False):
+            delete_chat_message(message)
@@ -0,0 +1,236 @@
+"""
+Ключи и счетчики в кеше, которые используются несколькими модулями.
+Модуль не импортирует модели, чтобы его можно было использовать из models.py.
+"""
+import hashlib
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+
+def cache_is_shared():
+    """Общий ли кеш у всех процессов (Redis), а не локальная память каждого из них."""
+    return getattr(settings, 'CACHE_IS_SHARED', False)
+
+
+LEADERBOARD_VERSION_KEY = 'leaderboard:version'
+LEADERBOARD_TOP_TIMEOUT = 300
+
+
+def get_leaderboard_version():
+    version = cache.get(LEADERBOARD_VERSION_KEY)
+    if version is None:
+        version = 1
+        cache.add(LEADERBOARD_VERSION_KEY, version, timeout=None)
+    return version
+
+
+def bump_leaderboard_version():
+    """Инвалидирует закешированные страницы рейтинга после изменения XP."""
+    try:
+        return cache.incr(LEADERBOARD_VERSION_KEY)
+    except ValueError:
+        cache.set(LEADERBOARD_VERSION_KEY, 2, timeout=None)
+        return 2
+
+
+def _short_hash(value):
+    return hashlib.md5(value.encode('utf-8')).hexdigest()[:12]
+
+
+def leaderboard_top_key(city='', version=None):
+    if version is None:
+        version = get_leaderboard_version()
+    return f'leaderboard:top:{version}:{_short_hash(city)}'
+
+
+def leaderboard_snapshot_key(period, city, cursor, version):
+    """Снимок страницы рейтинга (по курсору страницы) для конкретной версии; по нему считается дельта."""
+    return f'leaderboard:snapshot:{version}:{period}:{_short_hash(city)}:{_short_hash(cursor or "")}'
+
+
+# Счетчики непрочитанных уведомлений. Ключ живет ограниченное время, поэтому
+# даже без reconcile_notification_counters счетчик периодически пересчитывается из БД.
+# Уведомления создает воркер очереди, поэтому счетчики ведутся только в общем кеше:
+# в локальной памяти веб-процесс не увидел бы его изменений.
+UNREAD_COUNT_TIMEOUT = 600
+
+
+def unread_count_key(user_id):
+    return f'notifications:unread:{user_id}'
+
+
+def broadcast_cursor_key(user_id):
+    return f'notifications:broadcast_cursor:{user_id}'
+
+
+def get_unread_count(user_id, fetch):
+    """Возвращает счетчик из кеша; при промахе считает через fetch() и кеширует."""
+    if not cache_is_shared():
+        return fetch()
+    key = unread_count_key(user_id)
+    count = cache.get(key)
+    if count is None:
+        count = fetch()
+        cache.set(key, count, timeout=UNREAD_COUNT_TIMEOUT)
+    return count
+
+
+def set_unread_counts(counts):
+    """Записывает точные значения счетчиков: {user_id: count}."""
+    if not cache_is_shared():
+        return
+    cache.set_many(
+        {unread_count_key(user_id): count for user_id, count in counts.items()},
+        timeout=UNREAD_COUNT_TIMEOUT,
+    )
+
+
+def incr_unread_counts(user_ids):
+    """
+    Увеличивает счетчики получателей новых уведомлений. Отсутствующие ключи
+    не создаются: их значение будет посчитано из БД при следующем чтении.
+    """
+    for user_id, delta in Counter(user_ids).items():
+        try:
+            cache.incr(unread_count_key(user_id), delta)
+        except ValueError:
+            pass
+
+
+def decr_unread_count(user_id):
+    key = unread_count_key(user_id)
+    try:
+        if cache.decr(key) < 0:
+            cache.delete(key)
+    except ValueError:
+        pass
+
+
+def invalidate_unread_counts(user_ids):
+    cache.delete_many([unread_count_key(user_id) for user_id in set(user_ids)])
+
+
+# Id последней рассылки. Рассылки создает воркер очереди, поэтому значение
+# держится только в общем кеше и обновляется после коммита новой рассылки.
+LATEST_BROADCAST_KEY = 'notifications:latest_broadcast'
+
+
+def get_latest_broadcast_id(fetch):
+    """Возвращает id последней рассылки из кеша; при промахе берет fetch() и кеширует."""
+    if not cache_is_shared():
+        return fetch()
+    latest_id = cache.get(LATEST_BROADCAST_KEY)
+    if latest_id is None:
+        latest_id = fetch()
+        cache.set(LATEST_BROADCAST_KEY, latest_id, timeout=UNREAD_COUNT_TIMEOUT)
+    return latest_id
+
+
+def remember_latest_broadcast_id(broadcast_id):
+    if not cache_is_shared():
+        return
+    # Ключ ограничен по времени: если параллельный воркер запишет меньший id,
+    # значение исправится при следующем промахе
+    cached_id = cache.get(LATEST_BROADCAST_KEY)
+    if cached_id is None or cached_id < broadcast_id:
+        cache.set(LATEST_BROADCAST_KEY, broadcast_id, timeout=UNREAD_COUNT_TIMEOUT)
+
+
+def get_broadcast_cursor(user_id):
+    """Id последней рассылки, уже подмешанной в ленту пользователя (или None)."""
+    return cache.get(broadcast_cursor_key(user_id))
+
+
+def remember_broadcast_cursor(user_id, broadcast_id):
+    cache.set(broadcast_cursor_key(user_id), broadcast_id, timeout=UNREAD_COUNT_TIMEOUT)
+
+
+# Отметки прочтения каналов чата. Время прочтения сначала пишется в кеш, а в
+# ChatChannelMembership переносится пачками (flush_read_markers). Новые пары
+# (канал, пользователь) попадают в журнал: счетчик READ_MARKER_LOG_KEY выдает
+# номер записи, сброс идет от READ_MARKER_FLUSHED_KEY до текущего номера.
+# Пока пара ждет сброса, повторные чтения только обновляют время в кеше.
+# Буфер ведется только в общем кеше: локальную память не видят другие процессы
+# и команда сброса, а LocMemCache еще и вытесняет записи журнала.
+READ_MARKER_TIMEOUT = 24 * 60 * 60
+READ_MARKER_LOG_KEY = 'chat:read:log'
+READ_MARKER_FLUSHED_KEY = 'chat:read:flushed'
+READ_MARKER_LOCK_KEY = 'chat:read:flush_lock'
+READ_MARKER_DUE_KEY = 'chat:read:flush_due'
+READ_MARKER_LOCK_TIMEOUT = 60
+
+
+def read_marker_key(channel_id, user_id):
+    return f'chat:read:{channel_id}:{user_id}'
+
+
+def _read_marker_pending_key(channel_id, user_id):
+    return f'chat:read:pending:{channel_id}:{user_id}'
+
+
+def _read_marker_log_entry_key(position):
+    return f'chat:read:log:{position}'
+
+
+def buffer_read_marker(channel_id, user_id, read_at):
+    """
+    Запоминает время прочтения канала. Возвращает номер записи журнала,
+    если пара только что встала в очередь на сброс, иначе None.
+    """
+    cache.set(read_marker_key(channel_id, user_id), read_at, timeout=READ_MARKER_TIMEOUT)
+    if not cache.add(_read_marker_pending_key(channel_id, user_id), 1, timeout=READ_MARKER_TIMEOUT):
+        return None
+    try:
+        position = cache.incr(READ_MARKER_LOG_KEY)
+    except ValueError:
+        # Журнал продолжается с последнего сброшенного номера, даже если счетчик вытеснен
+        cache.add(READ_MARKER_LOG_KEY, cache.get(READ_MARKER_FLUSHED_KEY, 0), timeout=None)
+        position = cache.incr(READ_MARKER_LOG_KEY)
+    cache.set(_read_marker_log_entry_key(position), (channel_id, user_id), timeout=READ_MARKER_TIMEOUT)
+    return position
+
+
+def get_read_markers(pairs):
+    """Несброшенные времена прочтения: {(channel_id, user_id): datetime}."""
+    if not cache_is_shared():
+        return {}
+    keys = {read_marker_key(channel_id, user_id): (channel_id, user_id) for channel_id, user_id in pairs}
+    return {keys[key]: read_at for key, read_at in cache.get_many(keys).items()}
+
+
+def claim_read_markers(limit):
+    """
+    Забирает до limit записей журнала: возвращает (пары, номер последней записи)
+    или (None, None), если журнал пуст. Флаги ожидания снимаются до чтения времени,
+    поэтому чтение во время сброса снова попадет в журнал и не потеряется.
+    """
+    flushed = cache.get(READ_MARKER_FLUSHED_KEY, 0)
+    last = cache.get(READ_MARKER_LOG_KEY, 0)
+    if last <= flushed:
+        return None, None
+    end = min(last, flushed + limit)
+    entries = cache.get_many([_read_marker_log_entry_key(position) for position in range(flushed + 1, end + 1)])
+    pairs = set(entries.values())
+    cache.delete_many([_read_marker_pending_key(channel_id, user_id) for channel_id, user_id in pairs])
+    return pairs, end
+
+
+def acknowledge_read_markers(position):
+    """Отмечает журнал сброшенным до position включительно."""
+    flushed = cache.get(READ_MARKER_FLUSHED_KEY, 0)
+    cache.delete_many([_read_marker_log_entry_key(number) for number in range(flushed + 1, position + 1)])
+    cache.set(READ_MARKER_FLUSHED_KEY, position, timeout=None)
+
+
+def read_markers_flush_due(interval):
+    """True не чаще раза в interval секунд - для сброса из запроса без отдельного воркера."""
+    return cache.add(READ_MARKER_DUE_KEY, 1, timeout=interval)
+
+
+def acquire_read_marker_lock():
+    return cache.add(READ_MARKER_LOCK_KEY, 1, timeout=READ_MARKER_LOCK_TIMEOUT)
+
+
+def release_read_marker_lock():
+    cache.delete(READ_MARKER_LOCK_KEY)
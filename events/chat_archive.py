@@ -0,0 +1,121 @@
+"""
+Холодное хранение истории чатов.
+
+Старые сообщения переносятся из ChatMessage в ChatArchiveSegment: сегмент -
+gzip-сжатый JSON с непрерывным по (created_at, id) диапазоном сообщений канала.
+Архивируется всегда самый старый хвост канала, поэтому весь архив лежит раньше
+горячих строк, и история канала читается как их продолжение по тому же курсору.
+
+Последнее сообщение канала остается в горячей таблице для превью в списке
+каналов. Архивные сообщения не участвуют в поиске и синхронизации по seq.
+"""
+import gzip
+import json
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from .models import ChatArchiveSegment, ChatMessage, User
+
+ARCHIVE_FIELDS = (
+    'id',
+    'author_id',
+    'content',
+    'created_at',
+    'edited_at',
+    'seq',
+    'is_deleted',
+    'deleted_at',
+)
+DATETIME_FIELDS = ('created_at', 'edited_at', 'deleted_at')
+
+
+def _encode(rows):
+    # isoformat() без округления: курсор истории сравнивает время с точностью до микросекунд
+    for row in rows:
+        for field in DATETIME_FIELDS:
+            if row[field] is not None:
+                row[field] = row[field].isoformat()
+    return gzip.compress(json.dumps(rows, ensure_ascii=False).encode())
+
+
+def _decode(payload):
+    rows = json.loads(gzip.decompress(bytes(payload)))
+    for row in rows:
+        for field in DATETIME_FIELDS:
+            if row[field] is not None:
+                row[field] = parse_datetime(row[field])
+    return rows
+
+
+def archive_channel_segment(channel, segment_size):
+    """
+    Переносит до segment_size самых старых сообщений канала в новый сегмент.
+    Возвращает число перенесенных сообщений (0 - архивировать нечего).
+    """
+    with transaction.atomic():
+        rows = list(
+            ChatMessage.objects.filter(channel=channel)
+            .exclude(pk=channel.last_message_id)
+            .order_by('created_at', 'id')
+            .select_for_update()
+            .values(*ARCHIVE_FIELDS)[:segment_size]
+        )
+        if not rows:
+            return 0
+        for row in rows:
+            if row['is_deleted']:
+                row['content'] = ''
+
+        first, last = rows[0], rows[-1]
+        ChatArchiveSegment.objects.create(
+            channel=channel,
+            first_created_at=first['created_at'],
+            first_message_id=first['id'],
+            last_created_at=last['created_at'],
+            last_message_id=last['id'],
+            message_count=len(rows),
+            payload=_encode(rows),
+        )
+        ChatMessage.objects.filter(id__in=[row['id'] for row in rows]).delete()
+    return len(rows)
+
+
+def archived_messages_before(channel, position, limit):
+    """
+    До limit архивных сообщений канала строго раньше position=(created_at, id)
+    (или самых новых при position=None), от новых к старым.
+    Возвращает (сообщения, есть ли еще более ранние).
+    Сообщения - несохраненные ChatMessage с атрибутом archived=True.
+    """
+    segments = channel.archive_segments.order_by('-last_created_at', '-last_message_id')
+    if position is not None:
+        created_at, pk = position
+        segments = segments.filter(
+            Q(first_created_at__lt=created_at) | Q(first_created_at=created_at, first_message_id__lt=pk)
+        )
+
+    rows = []
+    for segment in segments.iterator(chunk_size=4):
+        for row in reversed(_decode(segment.payload)):
+            if position is not None and (row['created_at'], row['id']) >= position:
+                continue
+            rows.append(row)
+            if len(rows) > limit:
+                break
+        if len(rows) > limit:
+            break
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    authors = User.objects.in_bulk({row['author_id'] for row in rows})
+    chat_messages = []
+    for row in rows:
+        author = authors.get(row['author_id'])
+        if author is None:
+            continue
+        message = ChatMessage(channel=channel, author=author, **{k: v for k, v in row.items() if k != 'author_id'})
+        message.archived = True
+        chat_messages.append(message)
+    return chat_messages, has_more
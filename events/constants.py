@@ -3,6 +3,41 @@ APPROVED_REGISTRATION_STATUSES = ('approved', 'completed')
 REAPPLY_REGISTRATION_STATUSES = ('rejected', 'cancelled')
 REGISTRATION_ACTIONS = {'approve', 'reject', 'complete'}
 
+# Сколько рассылок подмешивается в ленту пользователя одной вставкой
+BROADCAST_DELIVERY_LIMIT = 100
+
+# Размер пачки при массовой рассылке уведомлений
+FANOUT_CHUNK_SIZE = 1000
+
+# За сколько минут до начала события отправляются напоминания
+REMINDER_LEAD_MINUTES = (24 * 60, 2 * 60)
+# Время начала для событий без указанного времени
+REMINDER_DEFAULT_EVENT_TIME = (9, 0)
+
+# Типы уведомлений, которые пользователь может отключить в настройках
+MUTABLE_NOTIFICATION_TYPES = ('new_event', 'new_message', 'event_reminder')
+
+# Сроки хранения уведомлений, дни (purge_notifications)
+NOTIFICATION_READ_RETENTION_DAYS = 30
+NOTIFICATION_UNREAD_RETENTION_DAYS = 180
+
+# Сообщения каналов событий, прошедших больше N дней назад, уходят в архивные сегменты
+CHAT_ARCHIVE_AFTER_DAYS = 90
+# Сообщений в одном сжатом сегменте архива
+CHAT_ARCHIVE_SEGMENT_SIZE = 500
+# Отметки прочтения чата сбрасываются из кеша в БД прямо из запроса, когда их
+# накопилось столько или прошло столько секунд с прошлого сброса
+READ_MARKER_FLUSH_BATCH = 500
+READ_MARKER_FLUSH_SECONDS = 60
+
+# Интервал пинга в потоках Server-Sent Events, секунды
+REALTIME_HEARTBEAT_SECONDS = 25
+
+# Периоды рейтинга, для которых ведутся агрегаты XP
+LEADERBOARD_PERIODS = ('week', 'month')
+# Сколько прошедших периодов хранится в агрегатах
+LEADERBOARD_RETENTION = {'week': 12, 'month': 12}
+
 # Уровни волонтёра
 VOLUNTEER_LEVELS = [
     {'name': 'Beginner', 'min_xp': 0, 'icon': '🌱'},
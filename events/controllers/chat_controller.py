@@ -1,22 +1,131 @@
 """
 Контроллер для управления чатом.
 """
-from django.db import transaction
+from django.db import IntegrityError, transaction
 from django.db.models import Count, Q
 from django.shortcuts import get_object_or_404
 from django.contrib import messages
-from django.utils import timezone
+from django.http import JsonResponse
+from django.template.loader import render_to_string
 
 from events.models import (
     ChatChannel, ChatChannelMembership, ChatMessage, 
-    Event, Notification
+    Event
 )
+from events.chat_archive import archived_messages_before
 from events.forms import ChatChannelForm, ChatMessageForm
+from events.pagination import decode_cursor, encode_cursor, keyset_page
+from events.realtime import channel_topic, event_stream, format_sse
+from events.search import highlight_snippet, search_messages
 from events.selectors import (
+    apply_buffered_reads,
+    attach_read_receipts,
     available_channels_for_user,
-    unread_message_counts_by_channel
+    channel_inbox_for_user,
+    user_can_access_channel,
+    user_is_channel_member,
+    user_moderates_channel,
 )
-from events.services import add_approved_volunteers_to_channel
+from events.services import (
+    delete_chat_message,
+    edit_chat_message,
+    event_channel_member_ids,
+    mark_channel_read,
+    notify_new_chat_message,
+    sync_channel_members,
+)
+
+
+# Сколько последних сообщений показывается при открытии канала и подгружается за раз
+CHAT_PAGE_SIZE = 50
+SEARCH_PAGE_SIZE = 20
+
+
+def _message_page(channel, cursor=None):
+    """
+    Страница сообщений канала перед курсором, в хронологическом порядке.
+    Когда горячие строки заканчиваются, страница дополняется из архивных сегментов.
+    """
+    rows, older_cursor = keyset_page(
+        channel.messages.select_related('author__profile'),
+        cursor=cursor,
+        size=CHAT_PAGE_SIZE,
+    )
+    if older_cursor is None:
+        position = (rows[-1].created_at, rows[-1].pk) if rows else decode_cursor(cursor)
+        archived, has_more = archived_messages_before(channel, position, CHAT_PAGE_SIZE - len(rows))
+        rows.extend(archived)
+        if has_more and rows:
+            older_cursor = encode_cursor(rows[-1].created_at, rows[-1].pk)
+    rows.reverse()
+    return rows, older_cursor
+
+
+def _serialize_message(message):
+    return {
+        'id': message.id,
+        'seq': message.seq,
+        'author_id': message.author_id,
+        'author': message.author.get_full_name() or message.author.username,
+        'content': '' if message.is_deleted else message.content,
+        'is_deleted': message.is_deleted,
+        'created_at': message.created_at.isoformat(),
+        'edited_at': message.edited_at.isoformat() if message.edited_at else None,
+    }
+
+
+def _render_messages(chat_messages, user, can_moderate=False):
+    return render_to_string(
+        'events/chat_message.html',
+        {'messages': chat_messages, 'user': user, 'can_moderate': can_moderate},
+    )
+
+
+def _serialize_changes(chat_messages, user, can_moderate):
+    return [
+        dict(_serialize_message(message), html=_render_messages([message], user, can_moderate))
+        for message in chat_messages
+    ]
+
+
+def _changes_since(channel_id, seq):
+    """Изменения канала после номера seq - диапазон индекса (channel, seq)."""
+    return list(
+        ChatMessage.objects.filter(channel_id=channel_id, seq__gt=seq)
+        .select_related('author__profile')
+        .order_by('seq')[:CHAT_PAGE_SIZE]
+    )
+
+
+def _channel_stream_updates(user, channel_id, after_seq, can_moderate):
+    """Новые, измененные и удаленные сообщения канала после курсора (выполняется в потоке)."""
+    if after_seq is None:
+        return ChatChannel.objects.filter(pk=channel_id).values_list('last_seq', flat=True).first() or 0, [], False
+    batch = _changes_since(channel_id, after_seq)
+    if not batch:
+        return after_seq, [], False
+    # Открытый поток означает, что участник видит канал. Отметка нужна только
+    # при чужих сообщениях: свои, правки и удаления счетчик непрочитанного не меняют
+    if any(message.author_id != user.pk and not message.is_deleted for message in batch):
+        mark_channel_read(channel_id, user.pk)
+    events = [
+        format_sse('message', message, event_id=message['seq'])
+        for message in _serialize_changes(batch, user, can_moderate)
+    ]
+    # Полная пачка - за ней могут быть еще изменения
+    return batch[-1].seq, events, len(batch) == CHAT_PAGE_SIZE
+
+
+def _changeable_message(request, message_id):
+    message = get_object_or_404(
+        ChatMessage.objects.select_related('channel__event', 'author__profile'),
+        pk=message_id,
+        is_deleted=False,
+        channel__is_archived=False,
+    )
+    if not user_can_access_channel(request.user, message.channel):
+        raise ValueError('У вас нет доступа к этому каналу.')
+    return message
 
 
 class ChatController:
@@ -24,12 +133,11 @@ class ChatController:
     
     @staticmethod
     def get_user_channels(request):
-        """Получает список доступных каналов чата для пользователя"""
+        """Получает список доступных каналов с превью последнего сообщения"""
         if not hasattr(request.user, 'profile'):
             raise ValueError('Профиль не найден.')
         
-        channels = available_channels_for_user(request.user)
-        return channels
+        return apply_buffered_reads(request.user, list(channel_inbox_for_user(request.user)))
     
     @staticmethod
     def get_channel_detail(request, channel_id):
@@ -43,33 +151,26 @@ class ChatController:
             is_archived=False
         )
         
-        channels_qs = available_channels_for_user(request.user)
-        if not channels_qs.filter(pk=channel.pk).exists():
+        if not user_can_access_channel(request.user, channel):
             raise ValueError('У вас нет доступа к этому каналу.')
         
-        channels = list(channels_qs)
+        # Членство создается только при первом входе по праву организатора или заявки
+        if not user_is_channel_member(request.user, channel):
+            ChatChannelMembership.objects.get_or_create(channel=channel, user=request.user)
         
-        # Создаем или получаем членство
-        membership, _ = ChatChannelMembership.objects.get_or_create(
-            channel=channel,
-            user=request.user
-        )
+        # Номер изменений читается до сообщений: поток продолжит с него без пропусков
+        last_seq = channel.last_seq
+        # Только последние сообщения; более ранние подгружаются по курсору
+        channel_messages, older_cursor = _message_page(channel)
+        attach_read_receipts(channel, channel_messages, request.user)
         
-        # Получаем сообщения
-        messages_qs = channel.messages.select_related('author__profile')
-        
-        # Обновляем last_read_at
-        membership.last_read_at = timezone.now()
-        membership.save(update_fields=['last_read_at'])
-        
-        # Получаем счетчики непрочитанных сообщений
-        unread_by_channel = unread_message_counts_by_channel(request.user, channels)
+        # Отметка прочтения копится в кеше и попадает в БД пачкой
+        mark_channel_read(channel.pk, request.user.pk)
         
+        # Список каналов читается после отметки: счетчик текущего канала уже нулевой
+        channels = apply_buffered_reads(request.user, list(channel_inbox_for_user(request.user)))
         sidebar_channels = [
-            {
-                'channel': sidebar_channel,
-                'unread': unread_by_channel.get(sidebar_channel.pk, 0),
-            }
+            {'channel': sidebar_channel, 'unread': sidebar_channel.unread}
             for sidebar_channel in channels
         ]
         
@@ -77,19 +178,105 @@ class ChatController:
             'channel': channel,
             'channels': channels,
             'sidebar_channels': sidebar_channels,
-            'messages': messages_qs,
+            'messages': channel_messages,
+            'older_cursor': older_cursor,
+            'last_seq': last_seq,
+            'can_moderate': user_moderates_channel(request.user, channel),
             'message_form': ChatMessageForm(),
         }
     
+    @staticmethod
+    def get_older_messages(request, channel_id):
+        """Сообщения канала до курсора (API для кнопки "Показать ранее")"""
+        channel = get_object_or_404(ChatChannel.objects.select_related('event'), pk=channel_id, is_archived=False)
+        if not user_can_access_channel(request.user, channel):
+            return JsonResponse({'error': 'У вас нет доступа к этому каналу.'}, status=403)
+        
+        cursor = request.GET.get('before')
+        if not cursor:
+            return JsonResponse({'error': 'Не указан курсор.'}, status=400)
+        
+        channel_messages, older_cursor = _message_page(channel, cursor)
+        attach_read_receipts(channel, channel_messages, request.user)
+        return JsonResponse({
+            'messages': [_serialize_message(message) for message in channel_messages],
+            'html': _render_messages(channel_messages, request.user, user_moderates_channel(request.user, channel)),
+            'older_cursor': older_cursor,
+        })
+    
+    @staticmethod
+    def get_changes(request, channel_id):
+        """Изменения канала после номера ?since= (новые, измененные и удаленные сообщения)"""
+        channel = get_object_or_404(ChatChannel.objects.select_related('event'), pk=channel_id, is_archived=False)
+        if not user_can_access_channel(request.user, channel):
+            return JsonResponse({'error': 'У вас нет доступа к этому каналу.'}, status=403)
+        
+        since = request.GET.get('since', '')
+        if not since.isdigit():
+            return JsonResponse({'error': 'Не указан номер изменения.'}, status=400)
+        
+        changes = _changes_since(channel.pk, int(since))
+        return JsonResponse({
+            'changes': _serialize_changes(changes, request.user, user_moderates_channel(request.user, channel)),
+            'last_seq': changes[-1].seq if changes else int(since),
+            # Пачка заполнена - клиент запрашивает следующую с новым since
+            'has_more': len(changes) == CHAT_PAGE_SIZE,
+        })
+    
+    @staticmethod
+    def serialize_message(message, user):
+        """JSON-ответ на отправку, изменение или удаление сообщения"""
+        return _serialize_changes([message], user, user_moderates_channel(user, message.channel))[0]
+    
+    @staticmethod
+    def stream_channel(user, channel_id, last_event_id=None, can_moderate=False):
+        """Поток Server-Sent Events с изменениями канала; id события - номер изменения (seq)."""
+        return event_stream(
+            channel_topic(channel_id),
+            lambda after_seq: _channel_stream_updates(user, channel_id, after_seq, can_moderate),
+            cursor=last_event_id,
+        )
+    
+    @staticmethod
+    def search(request):
+        """Поиск по сообщениям доступных каналов или одного канала"""
+        query = request.GET.get('q', '').strip()
+        channel = None
+        found = ChatMessage.objects.select_related('channel__event', 'author__profile')
+        
+        channel_id = request.GET.get('channel', '')
+        if channel_id.isdigit():
+            channel = get_object_or_404(ChatChannel.objects.select_related('event'), pk=channel_id)
+            if not user_can_access_channel(request.user, channel):
+                raise ValueError('У вас нет доступа к этому каналу.')
+            found = found.filter(channel=channel)
+        else:
+            found = found.filter(channel__in=available_channels_for_user(request.user).order_by().values('pk'))
+        found = found.filter(is_deleted=False)
+        
+        # Новые совпадения первыми; курсор по (created_at, id), как в истории канала
+        results, next_cursor = keyset_page(
+            search_messages(found, query),
+            cursor=request.GET.get('cursor'),
+            size=SEARCH_PAGE_SIZE,
+        )
+        for result in results:
+            result.snippet_html = highlight_snippet(result.snippet)
+        
+        return {
+            'query': query,
+            'channel': channel,
+            'results': results,
+            'next_cursor': next_cursor,
+        }
+    
     @staticmethod
     @transaction.atomic
     def send_message(request, channel_id):
         """Отправляет сообщение в канал"""
         channel = get_object_or_404(ChatChannel, pk=channel_id, is_archived=False)
         
-        # Проверяем доступ
-        channels_qs = available_channels_for_user(request.user)
-        if not channels_qs.filter(pk=channel.pk).exists():
+        if not user_can_access_channel(request.user, channel):
             raise ValueError('У вас нет доступа к этому каналу.')
         
         form = ChatMessageForm(request.POST)
@@ -99,36 +286,36 @@ class ChatController:
         message_obj = form.save(commit=False)
         message_obj.channel = channel
         message_obj.author = request.user
+        # last_message и updated_at канала обновляет сигнал post_save сообщения
         message_obj.save()
         
-        # Обновляем время последнего сообщения в канале
-        channel.updated_at = timezone.now()
-        channel.save(update_fields=['updated_at'])
-        
-        # Отправляем уведомления участникам канала
-        recipients = ChatChannelMembership.objects.filter(
-            channel=channel,
-            notifications_enabled=True,
-        ).exclude(user=request.user).values_list('user_id', flat=True)
-        
-        recipient_ids = list(recipients)
-        if recipient_ids:
-            preview = message_obj.content[:80]
-            sender_name = request.user.get_full_name() or request.user.username
-            notifications = [
-                Notification(
-                    user_id=user_id,
-                    type='new_message',
-                    title=f'Новое сообщение в канале "{channel.name}"',
-                    message=f'{sender_name}: {preview}',
-                    related_event=channel.event,
-                )
-                for user_id in recipient_ids
-            ]
-            Notification.objects.bulk_create(notifications)
+        # Уведомления участникам канала создаст воркер очереди
+        notify_new_chat_message(message_obj)
         
         return message_obj
     
+    @staticmethod
+    def edit_message(request, message_id):
+        """Изменяет текст своего сообщения"""
+        message = _changeable_message(request, message_id)
+        if message.author_id != request.user.pk:
+            raise ValueError('Изменять можно только свои сообщения.')
+        
+        form = ChatMessageForm(request.POST)
+        if not form.is_valid():
+            raise ValueError('Форма сообщения невалидна')
+        
+        return edit_chat_message(message, form.cleaned_data['content'])
+    
+    @staticmethod
+    def delete_message(request, message_id):
+        """Удаляет сообщение: автор - свое, организатор события - любое"""
+        message = _changeable_message(request, message_id)
+        if message.author_id != request.user.pk and not user_moderates_channel(request.user, message.channel):
+            raise ValueError('Недостаточно прав для удаления сообщения.')
+        
+        return delete_chat_message(message)
+    
     @staticmethod
     @transaction.atomic
     def create_channel(request, event_pk):
@@ -153,10 +340,7 @@ class ChatController:
         except IntegrityError:
             raise ValueError('Канал с таким названием для этого события уже существует.')
         
-        # Добавляем создателя в канал
-        ChatChannelMembership.objects.get_or_create(channel=channel, user=request.user)
-        
-        # Добавляем одобренных волонтеров в канал
-        add_approved_volunteers_to_channel(channel, event)
+        # Организатор и одобренные волонтеры добавляются одной вставкой
+        sync_channel_members(channel, event_channel_member_ids(event))
         
         return channel
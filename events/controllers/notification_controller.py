@@ -1,13 +1,86 @@
 """
 Контроллер для управления уведомлениями.
 """
+from datetime import timedelta
+
+from django.core.exceptions import ObjectDoesNotExist
 from django.shortcuts import get_object_or_404
+from django.template.loader import render_to_string
 from django.contrib import messages
 from django.http import JsonResponse
 from django.db.models import Count, Q
+from django.utils import timezone
 
-from events.models import Notification
+from events.caching import decr_unread_count, set_unread_counts
+from events.constants import MUTABLE_NOTIFICATION_TYPES
+from events.forms import NotificationPreferencesForm
+from events.models import Notification, NotificationPreference
 from events.decorators import rate_limit
+from events.pagination import keyset_page
+from events.realtime import event_stream, format_sse, user_topic
+from events.services import unread_notification_count
+
+NOTIFICATIONS_PAGE_SIZE = 20
+# Сколько новых уведомлений отправляется в поток за одно пробуждение
+STREAM_BATCH_SIZE = 20
+# Объединенные уведомления перечитываются с запасом: updated_at ставится до коммита
+STREAM_UPDATE_OVERLAP = timedelta(seconds=10)
+
+
+def _serialize_notification(notification):
+    return {
+        'id': notification.id,
+        'type': notification.type,
+        'title': notification.title,
+        'message': notification.message,
+        'count': notification.count,
+        'icon': notification.icon,
+        'created_at': notification.created_at.strftime('%d.%m.%Y %H:%M'),
+        'url': notification.get_absolute_url() if notification.related_event else None,
+    }
+
+
+def _stream_updates(user, state):
+    """
+    События потока уведомлений после состояния (выполняется в потоке):
+    новые уведомления после курсора, уже отправленные, но объединенные
+    с новыми событиями после прошлого чтения, и актуальный счетчик.
+    Состояние - (курсор id, время прошлого чтения, отправленные (id, count), id события SSE).
+    """
+    after_id, since, sent, event_id = state
+    fetched_at = timezone.now()
+    notifications = Notification.objects.filter(user=user).select_related('related_event')
+    if after_id is None:
+        after_id = notifications.order_by('-id').values_list('id', flat=True).first() or 0
+        count = unread_notification_count(user)
+        return (after_id, fetched_at, set(), after_id), [format_sse('count', {'count': count})], False
+
+    created = list(notifications.filter(id__gt=after_id).order_by('id')[:STREAM_BATCH_SIZE])
+    updated = []
+    if since is not None:
+        updated = list(
+            notifications.filter(
+                id__lte=after_id,
+                is_read=False,
+                updated_at__gt=since - STREAM_UPDATE_OVERLAP,
+            ).order_by('updated_at')[:STREAM_BATCH_SIZE]
+        )
+    if created:
+        after_id = created[-1].id
+
+    events = []
+    versions = set()
+    for notification in updated + created:
+        # Объединенное уведомление приходит повторно с тем же id и новым count;
+        # id события SSE не уменьшается, чтобы переподключение продолжило с курсора
+        version = (notification.id, notification.count)
+        versions.add(version)
+        if version in sent:
+            continue
+        event_id = max(event_id, notification.id)
+        events.append(format_sse('notification', _serialize_notification(notification), event_id=event_id))
+    events.append(format_sse('count', {'count': unread_notification_count(user)}))
+    return (after_id, fetched_at, versions, event_id), events, len(created) == STREAM_BATCH_SIZE
 
 
 class NotificationController:
@@ -19,6 +92,19 @@ class NotificationController:
         if not hasattr(request.user, 'profile'):
             raise ValueError('Профиль не найден.')
         
+        unread_count = unread_notification_count(request.user)
+        filter_type, notifications, next_cursor = NotificationController._feed_page(request)
+        
+        return {
+            'notifications': notifications,
+            'next_cursor': next_cursor,
+            'unread_count': unread_count,
+            'filter_type': filter_type,
+        }
+    
+    @staticmethod
+    def _feed_page(request):
+        """Страница ленты по курсору: диапазон индекса (user, [is_read,] -created_at, -id)"""
         notifications_qs = Notification.objects.filter(
             user=request.user
         ).select_related('related_event')
@@ -28,18 +114,59 @@ class NotificationController:
             notifications_qs = notifications_qs.filter(is_read=False)
         elif filter_type == 'read':
             notifications_qs = notifications_qs.filter(is_read=True)
+        else:
+            filter_type = 'all'
+        
+        notifications, next_cursor = keyset_page(
+            notifications_qs,
+            cursor=request.GET.get('cursor'),
+            size=NOTIFICATIONS_PAGE_SIZE,
+        )
+        return filter_type, notifications, next_cursor
+    
+    @staticmethod
+    @rate_limit('notifications_feed', limit=120, window_seconds=60)
+    def get_notifications_feed(request):
+        """Следующая страница ленты для бесконечной прокрутки (API)"""
+        if not hasattr(request.user, 'profile'):
+            return JsonResponse({'notifications': [], 'html': '', 'next_cursor': None})
         
-        from django.core.paginator import Paginator
-        paginator = Paginator(notifications_qs, 20)
-        page_obj = paginator.get_page(request.GET.get('page', 1))
-        unread_count = Notification.objects.filter(user=request.user, is_read=False).count()
+        filter_type, notifications, next_cursor = NotificationController._feed_page(request)
+        html = render_to_string(
+            'events/notification_card.html',
+            {'notifications': notifications},
+            request=request,
+        )
+        return JsonResponse({
+            'notifications': [_serialize_notification(n) for n in notifications],
+            'html': html,
+            'next_cursor': next_cursor,
+        })
+    
+    @staticmethod
+    def get_preferences_form(request):
+        """Форма настроек с текущими отключенными типами"""
+        muted = NotificationPreference.objects.filter(user=request.user, muted=True).values_list('type', flat=True)
+        return NotificationPreferencesForm(initial={'muted_types': list(muted)})
+    
+    @staticmethod
+    def save_preferences(request):
+        """Сохраняет настройки одним upsert по всем настраиваемым типам"""
+        form = NotificationPreferencesForm(request.POST)
+        if not form.is_valid():
+            return form, False
         
-        return {
-            'notifications': page_obj.object_list,
-            'page_obj': page_obj,
-            'unread_count': unread_count,
-            'filter_type': filter_type,
-        }
+        muted = set(form.cleaned_data['muted_types'])
+        NotificationPreference.objects.bulk_create(
+            [
+                NotificationPreference(user=request.user, type=notification_type, muted=notification_type in muted)
+                for notification_type in MUTABLE_NOTIFICATION_TYPES
+            ],
+            update_conflicts=True,
+            unique_fields=['user', 'type'],
+            update_fields=['muted', 'updated_at'],
+        )
+        return form, True
     
     @staticmethod
     def mark_notification_read(request, pk):
@@ -48,8 +175,10 @@ class NotificationController:
             raise ValueError('Профиль не найден.')
         
         notification = get_object_or_404(Notification, pk=pk, user=request.user)
+        # Условный UPDATE: счетчик уменьшается только если уведомление было непрочитанным
+        if Notification.objects.filter(pk=notification.pk, is_read=False).update(is_read=True):
+            decr_unread_count(request.user.pk)
         notification.is_read = True
-        notification.save(update_fields=['is_read'])
         
         if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
             return JsonResponse({'success': True})
@@ -63,6 +192,7 @@ class NotificationController:
             raise ValueError('Профиль не найден.')
         
         Notification.objects.filter(user=request.user, is_read=False).update(is_read=True)
+        set_unread_counts({request.user.pk: 0})
         
         if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
             return JsonResponse({'success': True})
@@ -74,10 +204,11 @@ class NotificationController:
     @rate_limit('notifications_count', limit=180, window_seconds=60)
     def get_unread_count(request):
         """Возвращает количество непрочитанных уведомлений (API)"""
-        if not hasattr(request.user, 'profile'):
-            return JsonResponse({'count': 0}, status=200)
-        
-        count = Notification.objects.filter(user=request.user, is_read=False).count()
+        # Профиль не проверяется заранее: при теплом кеше счетчик отдается без запросов к БД
+        try:
+            count = unread_notification_count(request.user)
+        except ObjectDoesNotExist:
+            count = 0
         return JsonResponse({'count': count})
     
     @staticmethod
@@ -87,27 +218,25 @@ class NotificationController:
         if not hasattr(request.user, 'profile'):
             return JsonResponse({'notifications': [], 'count': 0}, status=200)
         
+        count = unread_notification_count(request.user)
         unread_qs = (
             Notification.objects.filter(user=request.user, is_read=False)
             .select_related('related_event')
-            .order_by('-created_at')
+            .order_by('-updated_at', '-id')
         )
-        count = unread_qs.count()
         notifications = list(unread_qs[:5])
         
         data = {
-            'notifications': [
-                {
-                    'id': n.id,
-                    'type': n.type,
-                    'title': n.title,
-                    'message': n.message,
-                    'icon': n.icon,
-                    'created_at': n.created_at.strftime('%d.%m.%Y %H:%M'),
-                    'url': n.get_absolute_url() if n.related_event else None,
-                }
-                for n in notifications
-            ],
+            'notifications': [_serialize_notification(n) for n in notifications],
             'count': count,
         }
         return JsonResponse(data)
+    
+    @staticmethod
+    def stream_notifications(user, last_event_id=None):
+        """Поток Server-Sent Events: новые и объединенные уведомления и счетчик непрочитанных."""
+        return event_stream(
+            user_topic(user.pk),
+            lambda state: _stream_updates(user, state),
+            cursor=(last_event_id, None, set(), last_event_id or 0),
+        )
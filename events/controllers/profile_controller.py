@@ -1,13 +1,52 @@
 """
 Контроллер для управления профилями пользователей.
 """
-from django.db.models import Count, Q
+import base64
+
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponseNotModified, JsonResponse
 from django.shortcuts import get_object_or_404
 from django.contrib import messages
 from django.utils import timezone
 
+from events.caching import (
+    LEADERBOARD_TOP_TIMEOUT,
+    bump_leaderboard_version,
+    get_leaderboard_version,
+    leaderboard_snapshot_key,
+    leaderboard_top_key,
+)
+from events.constants import LEADERBOARD_PERIODS
 from events.models import UserProfile, Event, EventRegistration, VolunteerAchievement
 from events.forms import UserProfileForm, VolunteerSearchForm
+from events.selectors import (
+    leaderboard_neighbours,
+    period_leaderboard_queryset,
+    volunteer_ranking_after,
+    volunteer_ranking_queryset,
+)
+
+LEADERBOARD_SIZE = 100
+LEADERBOARD_PAGE_SIZE = 50
+
+
+def _encode_rank_cursor(rank, profile):
+    """Курсор страницы рейтинга: место и ключ (xp, completed_events, id) последней строки."""
+    raw = f'{rank}|{profile.xp}|{profile.completed_events}|{profile.pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def _decode_rank_cursor(cursor):
+    """Возвращает (место, (xp, completed_events, id)) или None для пустого и поврежденного курсора."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        rank, xp, completed_events, pk = (int(value) for value in raw.split('|'))
+    except (ValueError, UnicodeDecodeError):
+        return None
+    return rank, (xp, completed_events, pk)
 
 
 class ProfileController:
@@ -76,6 +115,8 @@ class ProfileController:
             raise ValueError('Форма невалидна')
         
         form.save()
+        # Имя, город и навыки показываются в закешированных страницах рейтинга
+        transaction.on_commit(bump_leaderboard_version)
         return form.instance
     
     @staticmethod
@@ -134,36 +175,148 @@ class ProfileController:
         }
     
     @staticmethod
-    def get_leaderboard():
-        """Получает данные для таблицы лидеров"""
-        from django.db.models import Count, Q
-        
-        volunteers = UserProfile.objects.filter(role='volunteer').select_related('user')
-        
-        # Аннотируем количество завершенных событий
-        volunteers = volunteers.annotate(
-            completed_events_count=Count(
-                'user__event_registrations',
-                filter=Q(user__event_registrations__status='completed')
-            )
+    def _leaderboard_row(rank, profile, xp, completed_events):
+        user = profile.user
+        if profile.avatar:
+            avatar = profile.avatar.url
+        else:
+            avatar = profile.avatar_url
+        return {
+            'rank': rank,
+            'profile_id': profile.pk,
+            'username': user.username,
+            'full_name': user.get_full_name() or user.username,
+            'avatar': avatar,
+            'level': profile.level,
+            'level_name': profile.level_name,
+            'level_icon': profile.level_icon,
+            'xp': xp,
+            'completed_events': completed_events,
+            'skills': [skill.name for skill in profile.skills.all()],
+        }
+
+    @staticmethod
+    def _ranking_page(city, position=None):
+        """
+        Одна страница общего рейтинга после позиции курсора - диапазон по индексу
+        без OFFSET, поэтому глубокие страницы не дороже первой.
+        Возвращает (строки, курсор следующей страницы или None).
+        """
+        rank = 0
+        ranking = volunteer_ranking_queryset(city)
+        if position is not None:
+            rank, key = position
+            ranking = volunteer_ranking_after(key, city)
+        profiles = list(
+            ranking.select_related('user').prefetch_related('skills')[:LEADERBOARD_PAGE_SIZE + 1]
         )
-        
-        # Сортируем по XP и завершенным событиям
-        volunteers = volunteers.order_by('-xp', '-completed_events_count', 'user__date_joined')
-        
-        # Prefetch skills
-        volunteers = volunteers.prefetch_related('skills')
-        
-        # Добавляем ранги
-        leaderboard_data = []
-        for idx, profile in enumerate(volunteers, start=1):
-            leaderboard_data.append({
-                'rank': idx,
-                'profile': profile,
-                'xp': profile.xp,
-                'level_name': profile.level_name,
-                'level_icon': profile.level_icon,
-                'completed_events': profile.completed_events_count,
-            })
-        
-        return leaderboard_data
+        next_cursor = None
+        if len(profiles) > LEADERBOARD_PAGE_SIZE:
+            profiles = profiles[:LEADERBOARD_PAGE_SIZE]
+            next_cursor = _encode_rank_cursor(rank + LEADERBOARD_PAGE_SIZE, profiles[-1])
+        rows = [
+            ProfileController._leaderboard_row(rank + idx, profile, profile.xp, profile.completed_events)
+            for idx, profile in enumerate(profiles, start=1)
+        ]
+        return rows, next_cursor
+
+    @staticmethod
+    def get_leaderboard(period='all', city='', cursor=None, user=None):
+        """Получает данные для таблицы лидеров за все время, неделю или месяц"""
+        version = get_leaderboard_version()
+        if period in LEADERBOARD_PERIODS:
+            rollups = period_leaderboard_queryset(period, city)[:LEADERBOARD_SIZE]
+            rows = [
+                ProfileController._leaderboard_row(
+                    idx, rollup.volunteer.profile, rollup.xp, rollup.events_completed
+                )
+                for idx, rollup in enumerate(rollups, start=1)
+            ]
+            cache.add(leaderboard_snapshot_key(period, city, None, version), rows, timeout=LEADERBOARD_TOP_TIMEOUT)
+            return {
+                'leaderboard': rows,
+                'cursor': None,
+                'next_cursor': None,
+                'my_rank': None,
+                'neighbours': [],
+                'version': version,
+            }
+
+        position = _decode_rank_cursor(cursor)
+        if position is None:
+            cursor = None
+            # Первая страница (топ-N) кешируется до следующего начисления XP или правки профиля
+            cache_key = leaderboard_top_key(city, version)
+            cached = cache.get(cache_key)
+            if cached is None:
+                cached = ProfileController._ranking_page(city)
+                cache.set(cache_key, cached, timeout=LEADERBOARD_TOP_TIMEOUT)
+            rows, next_cursor = cached
+        else:
+            rows, next_cursor = ProfileController._ranking_page(city, position)
+
+        my_rank = None
+        neighbours = []
+        profile = getattr(user, 'profile', None) if user is not None else None
+        if profile is not None and profile.is_volunteer and (not city or profile.city == city):
+            neighbours = [
+                ProfileController._leaderboard_row(rank, item, item.xp, item.completed_events)
+                for rank, item in leaderboard_neighbours(profile, city=city)
+            ]
+            my_rank = next(row['rank'] for row in neighbours if row['profile_id'] == profile.pk)
+
+        cache.add(leaderboard_snapshot_key(period, city, cursor, version), rows, timeout=LEADERBOARD_TOP_TIMEOUT)
+        return {
+            'leaderboard': rows,
+            'cursor': cursor,
+            'next_cursor': next_cursor,
+            'my_rank': my_rank,
+            'neighbours': neighbours,
+            'version': version,
+        }
+
+    @staticmethod
+    def get_leaderboard_delta(request):
+        """
+        Возвращает изменения страницы рейтинга с версии клиента (API).
+        Если версия не менялась, отвечает 304 без обращения к БД.
+        """
+        period = request.GET.get('period', 'all')
+        if period not in LEADERBOARD_PERIODS:
+            period = 'all'
+        city = request.GET.get('city', '').strip()
+        cursor = request.GET.get('cursor') or None
+        if _decode_rank_cursor(cursor) is None:
+            cursor = None
+
+        version = get_leaderboard_version()
+        client_version = request.GET.get('version')
+        if client_version == str(version):
+            return HttpResponseNotModified()
+
+        rows = cache.get(leaderboard_snapshot_key(period, city, cursor, version))
+        if rows is None:
+            data = ProfileController.get_leaderboard(period=period, city=city, cursor=cursor)
+            rows, version = data['leaderboard'], data['version']
+
+        previous = None
+        if client_version and client_version.isdigit():
+            previous = cache.get(leaderboard_snapshot_key(period, city, cursor, int(client_version)))
+
+        if previous is None:
+            return JsonResponse({'version': version, 'full': True, 'rows': rows, 'removed': []})
+
+        old_rows = {row['profile_id']: row for row in previous}
+        new_ids = {row['profile_id'] for row in rows}
+        changed = [
+            row for row in rows
+            if ProfileController._row_state(old_rows.get(row['profile_id'])) != ProfileController._row_state(row)
+        ]
+        removed = [profile_id for profile_id in old_rows if profile_id not in new_ids]
+        return JsonResponse({'version': version, 'full': False, 'rows': changed, 'removed': removed})
+
+    @staticmethod
+    def _row_state(row):
+        if row is None:
+            return None
+        return row['rank'], row['xp'], row['completed_events'], row['level']
@@ -3,11 +3,13 @@ from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
 from django.utils import timezone
 
+from .constants import MUTABLE_NOTIFICATION_TYPES
 from .models import (
     ChatChannel,
     ChatMessage,
     Event,
     EventRegistration,
+    Notification,
     Skill,
     UserProfile,
 )
@@ -71,7 +73,7 @@ class UserProfileForm(forms.ModelForm):
 
     class Meta:
         model = UserProfile
-        fields = ['bio', 'phone', 'city', 'skills', 'avatar', 'avatar_url']
+        fields = ['bio', 'phone', 'city', 'skills', 'avatar', 'avatar_url', 'message_digest']
         widgets = {
             'bio': forms.Textarea(attrs={'rows': 4}),
             'skills': forms.CheckboxSelectMultiple(),
@@ -254,3 +256,16 @@ class ChatMessageForm(forms.ModelForm):
                 }
             ),
         }
+
+
+class NotificationPreferencesForm(forms.Form):
+    muted_types = forms.MultipleChoiceField(
+        choices=[
+            (value, label)
+            for value, label in Notification.TYPE_CHOICES
+            if value in MUTABLE_NOTIFICATION_TYPES
+        ],
+        required=False,
+        widget=forms.CheckboxSelectMultiple(),
+        label='Не присылать уведомления',
+    )
@@ -0,0 +1,121 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from ...chat_archive import archive_channel_segment
+from ...constants import CHAT_ARCHIVE_AFTER_DAYS, CHAT_ARCHIVE_SEGMENT_SIZE
+from ...models import ChatChannel, ChatMessage
+
+
+class Command(BaseCommand):
+    help = (
+        'Move chat messages of long-finished events into compressed archive segments. '
+        'DELETE leaves dead rows behind: plain VACUUM (--vacuum or autovacuum) makes the space '
+        'reusable, returning it to the OS needs VACUUM FULL or pg_repack in a maintenance window.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=CHAT_ARCHIVE_AFTER_DAYS,
+            help='Archive channels of events that took place more than this many days ago',
+        )
+        parser.add_argument(
+            '--segment-size',
+            type=int,
+            default=CHAT_ARCHIVE_SEGMENT_SIZE,
+            help='Messages per archive segment (one transaction each)',
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=0.0,
+            help='Seconds to pause between segments to reduce load',
+        )
+        parser.add_argument(
+            '--vacuum',
+            action='store_true',
+            help='Run VACUUM (ANALYZE) on the message table afterwards (PostgreSQL only)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only count messages that would be archived',
+        )
+
+    def handle(self, *args, **options):
+        if options['days'] <= 0:
+            raise CommandError('--days must be positive')
+        if options['segment_size'] <= 0:
+            raise CommandError('--segment-size must be positive')
+
+        cutoff = timezone.localdate() - timedelta(days=options['days'])
+        channels = ChatChannel.objects.filter(
+            Exists(ChatMessage.objects.filter(channel=OuterRef('pk'))),
+            event__date__lt=cutoff,
+        ).order_by('id')
+
+        if options['dry_run']:
+            # Последнее сообщение каждого канала остается в горячей таблице
+            count = ChatMessage.objects.filter(channel__in=channels).exclude(
+                pk__in=channels.filter(last_message__isnull=False).values('last_message_id')
+            ).count()
+            self.stdout.write(f'{count} messages would be archived')
+            return
+
+        stats_before = self._table_stats()
+        archived = segments = 0
+        for channel in channels.iterator():
+            while True:
+                moved = archive_channel_segment(channel, options['segment_size'])
+                if not moved:
+                    break
+                archived += moved
+                segments += 1
+                if options['sleep']:
+                    time.sleep(options['sleep'])
+                if moved < options['segment_size']:
+                    break
+
+        self.stdout.write(f'Archived {archived} messages into {segments} segments')
+        if options['vacuum']:
+            self._vacuum()
+        stats_after = self._table_stats()
+        if stats_before is not None:
+            # Размер файла таблицы после DELETE не меняется; уменьшается число живых строк,
+            # а мертвые освобождает VACUUM для повторного использования.
+            self.stdout.write(
+                'Live rows: {} -> {}, dead rows: {} -> {}'.format(
+                    stats_before[0], stats_after[0], stats_before[1], stats_after[1]
+                )
+            )
+        self.stdout.write(self.style.SUCCESS('Chat archive updated'))
+
+    def _vacuum(self):
+        if connection.vendor != 'postgresql':
+            self.stdout.write('VACUUM skipped: only supported on PostgreSQL')
+            return
+        # VACUUM нельзя выполнять в транзакции; команда работает в autocommit
+        with connection.cursor() as cursor:
+            cursor.execute(f'VACUUM (ANALYZE) {connection.ops.quote_name(ChatMessage._meta.db_table)}')
+        self.stdout.write('Message table vacuumed')
+
+    @staticmethod
+    def _table_stats():
+        """(живые, мертвые) строки таблицы сообщений по статистике PostgreSQL или None."""
+        if connection.vendor != 'postgresql':
+            return None
+        with connection.cursor() as cursor:
+            # Статистика обновляется асинхронно; сбрасываем снимок, чтобы прочитать свежие значения
+            cursor.execute('SELECT pg_stat_clear_snapshot()')
+            cursor.execute(
+                'SELECT n_live_tup, n_dead_tup FROM pg_stat_user_tables WHERE relid = %s::regclass',
+                [ChatMessage._meta.db_table],
+            )
+            row = cursor.fetchone()
+            return row if row is not None else (0, 0)
@@ -0,0 +1,115 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from ...models import (
+    Achievement,
+    Notification,
+    VolunteerAchievement,
+    ensure_default_achievements,
+    qualified_volunteer_ids,
+)
+
+
+class Command(BaseCommand):
+    help = 'Retroactively award achievements to volunteers who already qualify for them'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--achievement',
+            action='append',
+            dest='slugs',
+            default=[],
+            help='Slug of the achievement to backfill (can be repeated). Defaults to all active.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Number of awards inserted per transaction',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report how many volunteers would receive each achievement',
+        )
+        parser.add_argument(
+            '--no-notify',
+            action='store_true',
+            help='Do not create achievement_unlocked notifications',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size <= 0:
+            raise CommandError('--batch-size must be positive')
+
+        ensure_default_achievements()
+        achievements = Achievement.objects.filter(is_active=True)
+        if options['slugs']:
+            achievements = achievements.filter(slug__in=options['slugs'])
+            missing = set(options['slugs']) - set(achievements.values_list('slug', flat=True))
+            if missing:
+                raise CommandError(f'Unknown achievements: {", ".join(sorted(missing))}')
+
+        total_awarded = 0
+        for achievement in achievements:
+            # Кандидаты выбираются одним агрегирующим запросом; в памяти держим только id.
+            volunteer_ids = list(qualified_volunteer_ids(achievement).iterator(chunk_size=batch_size))
+            pending = len(volunteer_ids)
+
+            if options['dry_run']:
+                self.stdout.write(f'[dry-run] {achievement.slug}: {pending} volunteers qualify')
+                continue
+
+            started = time.monotonic()
+            awarded = 0
+            for offset in range(0, pending, batch_size):
+                chunk = volunteer_ids[offset:offset + batch_size]
+                awarded += self._award_chunk(achievement, chunk, notify=not options['no_notify'])
+                elapsed = time.monotonic() - started
+                rate = awarded / elapsed if elapsed else awarded
+                self.stdout.write(
+                    f'  {achievement.slug}: {min(offset + batch_size, pending)}/{pending} '
+                    f'processed, {awarded} awarded ({rate:.0f}/s)'
+                )
+
+            total_awarded += awarded
+            self.stdout.write(f'{achievement.slug}: awarded {awarded}')
+
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS('Dry run finished, nothing was written'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Backfill finished: {total_awarded} achievements awarded'))
+
+    @staticmethod
+    @transaction.atomic
+    def _award_chunk(achievement, volunteer_ids, notify=True):
+        existing = set(
+            VolunteerAchievement.objects.filter(
+                achievement=achievement,
+                volunteer_id__in=volunteer_ids,
+            ).values_list('volunteer_id', flat=True)
+        )
+        new_ids = [volunteer_id for volunteer_id in volunteer_ids if volunteer_id not in existing]
+        if not new_ids:
+            return 0
+
+        VolunteerAchievement.objects.bulk_create(
+            [VolunteerAchievement(volunteer_id=volunteer_id, achievement=achievement) for volunteer_id in new_ids],
+            ignore_conflicts=True,
+        )
+        if notify:
+            Notification.objects.bulk_create(
+                [
+                    Notification(
+                        user_id=volunteer_id,
+                        type='achievement_unlocked',
+                        title=f'Достижение: {achievement.title}',
+                        message=achievement.description,
+                    )
+                    for volunteer_id in new_ids
+                ]
+            )
+        return len(new_ids)
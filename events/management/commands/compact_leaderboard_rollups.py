@@ -0,0 +1,81 @@
+from datetime import datetime, time, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from ...constants import LEADERBOARD_PERIODS, LEADERBOARD_RETENTION
+from ...models import XpRollup, XpTransaction, period_start_for
+
+
+class Command(BaseCommand):
+    help = 'Compact leaderboard rollups: drop expired periods and empty rows, optionally rebuild current periods'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Recompute rollups of the current week and month from the XP ledger',
+        )
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+
+        if options['rebuild']:
+            for period in LEADERBOARD_PERIODS:
+                rebuilt = self._rebuild_period(period, period_start_for(period, today))
+                self.stdout.write(f'Rebuilt {rebuilt} {period} rollups')
+
+        expired = 0
+        for period in LEADERBOARD_PERIODS:
+            cutoff = self._retention_cutoff(period, today)
+            deleted, _ = XpRollup.objects.filter(period=period, period_start__lt=cutoff).delete()
+            expired += deleted
+
+        empty, _ = XpRollup.objects.filter(xp=0, events_completed=0).delete()
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Removed {expired} expired and {empty} empty leaderboard rollups')
+        )
+
+    @staticmethod
+    def _retention_cutoff(period, today):
+        keep = LEADERBOARD_RETENTION[period]
+        start = period_start_for(period, today)
+        for _ in range(keep):
+            start = period_start_for(period, start - timedelta(days=1))
+        return start
+
+    @staticmethod
+    @transaction.atomic
+    def _rebuild_period(period, period_start):
+        started_at = timezone.make_aware(datetime.combine(period_start, time.min))
+        totals = (
+            XpTransaction.objects.filter(created_at__gte=started_at)
+            .exclude(source='opening_balance')
+            .values('volunteer_id', 'volunteer__profile__city')
+            .annotate(
+                total=Sum('amount'),
+                completed=Count('id', filter=Q(source='event_completion')),
+            )
+        )
+
+        rows = []
+        for item in totals.iterator(chunk_size=2000):
+            scopes = [''] + ([item['volunteer__profile__city']] if item['volunteer__profile__city'] else [])
+            for city in scopes:
+                rows.append(
+                    XpRollup(
+                        volunteer_id=item['volunteer_id'],
+                        period=period,
+                        period_start=period_start,
+                        city=city,
+                        xp=item['total'],
+                        events_completed=item['completed'],
+                    )
+                )
+
+        XpRollup.objects.filter(period=period, period_start=period_start).delete()
+        XpRollup.objects.bulk_create(rows, batch_size=2000)
+        return len(rows)
@@ -0,0 +1,53 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ...caching import cache_is_shared
+from ...constants import READ_MARKER_FLUSH_BATCH
+from ...services import flush_read_markers
+
+
+class Command(BaseCommand):
+    help = 'Write buffered chat read markers from the cache to channel memberships'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=READ_MARKER_FLUSH_BATCH,
+            help='Maximum number of read markers flushed per transaction',
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep flushing instead of exiting when the buffer is empty',
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=5.0,
+            help='Seconds to wait between flushes when the buffer is empty (with --loop)',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] <= 0:
+            raise CommandError('--batch-size must be positive')
+        if not cache_is_shared():
+            # Без общего кеша отметки прочтения пишутся в БД сразу, буфера нет
+            self.stdout.write('Cache is not shared between processes (REDIS_URL is not set); nothing to flush')
+            return
+
+        total = 0
+        try:
+            while True:
+                flushed = flush_read_markers(batch_size=options['batch_size'])
+                total += flushed
+                if flushed:
+                    continue
+                if not options['loop']:
+                    break
+                time.sleep(options['sleep'])
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(f'Flushed {total} chat read markers'))
@@ -0,0 +1,64 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ...outbox import DEFAULT_MAX_ATTEMPTS, process_outbox_batch
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued notifications from the database outbox'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Maximum number of outbox tasks claimed at once',
+        )
+        parser.add_argument(
+            '--max-attempts',
+            type=int,
+            default=DEFAULT_MAX_ATTEMPTS,
+            help='Attempts before a task is marked as failed',
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep polling the outbox instead of exiting when it is empty',
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=2.0,
+            help='Seconds to wait between polls when the outbox is empty (with --loop)',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] <= 0:
+            raise CommandError('--batch-size must be positive')
+
+        total_succeeded = total_failed = 0
+        try:
+            while True:
+                started = time.monotonic()
+                succeeded, failed = process_outbox_batch(
+                    batch_size=options['batch_size'],
+                    max_attempts=options['max_attempts'],
+                )
+                total_succeeded += succeeded
+                total_failed += failed
+                if succeeded or failed:
+                    elapsed = time.monotonic() - started
+                    self.stdout.write(
+                        f'Processed {succeeded} tasks, {failed} failed in {elapsed:.2f}s'
+                    )
+                    continue
+                if not options['loop']:
+                    break
+                time.sleep(options['sleep'])
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Outbox drained: {total_succeeded} delivered, {total_failed} failed')
+        )
@@ -0,0 +1,198 @@
+import gzip
+import json
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models import Max, Min, Q
+from django.utils import timezone
+
+from ...caching import invalidate_unread_counts
+from ...constants import NOTIFICATION_READ_RETENTION_DAYS, NOTIFICATION_UNREAD_RETENTION_DAYS
+from ...models import BroadcastNotification, Notification
+
+ARCHIVE_FIELDS = (
+    'id',
+    'user_id',
+    'type',
+    'title',
+    'message',
+    'is_read',
+    'count',
+    'related_event_id',
+    'related_registration_id',
+    'related_channel_id',
+    'related_message_id',
+    'broadcast_id',
+    'created_at',
+    'updated_at',
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Archive and delete expired notifications in small primary-key ranges. '
+        'DELETE leaves dead rows behind: plain VACUUM (--vacuum or autovacuum) makes the space '
+        'reusable, returning it to the OS needs VACUUM FULL or pg_repack in a maintenance window.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--read-days',
+            type=int,
+            default=NOTIFICATION_READ_RETENTION_DAYS,
+            help='Delete read notifications older than this many days',
+        )
+        parser.add_argument(
+            '--unread-days',
+            type=int,
+            default=NOTIFICATION_UNREAD_RETENTION_DAYS,
+            help='Delete unread notifications older than this many days',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Width of the primary-key range handled per transaction',
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=0.0,
+            help='Seconds to pause between ranges to reduce load',
+        )
+        parser.add_argument(
+            '--archive-dir',
+            default=None,
+            help='Directory for gzip JSONL archives (defaults to ARCHIVE_ROOT/notifications)',
+        )
+        parser.add_argument(
+            '--no-archive',
+            action='store_true',
+            help='Delete without writing an archive',
+        )
+        parser.add_argument(
+            '--vacuum',
+            action='store_true',
+            help='Run VACUUM (ANALYZE) on the notification table afterwards (PostgreSQL only)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only count notifications that would be removed',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size <= 0:
+            raise CommandError('--batch-size must be positive')
+        if options['read_days'] <= 0 or options['unread_days'] <= 0:
+            raise CommandError('Retention periods must be positive')
+
+        now = timezone.now()
+        read_cutoff = now - timedelta(days=options['read_days'])
+        unread_cutoff = now - timedelta(days=options['unread_days'])
+        expired = (
+            Q(is_read=True, created_at__lt=read_cutoff)
+            | Q(is_read=False, created_at__lt=unread_cutoff)
+        )
+
+        if options['dry_run']:
+            count = Notification.objects.filter(expired).count()
+            self.stdout.write(f'{count} notifications would be removed')
+            return
+
+        stats_before = self._table_stats()
+        bounds = Notification.objects.aggregate(low=Min('id'), high=Max('id'))
+        archive_path = None if options['no_archive'] else self._archive_path(options['archive_dir'], now)
+        archive = gzip.open(archive_path, 'at', encoding='utf-8') if archive_path else None
+
+        deleted = 0
+        try:
+            low = bounds['low']
+            while low is not None and low <= bounds['high']:
+                high = low + batch_size
+                deleted += self._purge_range(low, high, expired, archive)
+                low = high
+                if options['sleep']:
+                    time.sleep(options['sleep'])
+        finally:
+            if archive is not None:
+                archive.close()
+                if not deleted:
+                    archive_path.unlink()
+
+        # Рассылки старше обоих сроков больше никому не будут доставлены.
+        oldest_cutoff = min(read_cutoff, unread_cutoff)
+        broadcasts, _ = BroadcastNotification.objects.filter(created_at__lt=oldest_cutoff).delete()
+
+        self.stdout.write(f'Deleted {deleted} notifications and {broadcasts} broadcast rows')
+        if archive is not None and deleted:
+            self.stdout.write(f'Archive: {archive_path}')
+        if options['vacuum']:
+            self._vacuum()
+        stats_after = self._table_stats()
+        if stats_before is not None:
+            # Размер файла таблицы после DELETE не меняется; уменьшается число живых строк,
+            # а мертвые освобождает VACUUM для повторного использования.
+            self.stdout.write(
+                'Live rows: {} -> {}, dead rows: {} -> {}'.format(
+                    stats_before[0], stats_after[0], stats_before[1], stats_after[1]
+                )
+            )
+        self.stdout.write(self.style.SUCCESS('Notification retention applied'))
+
+    @staticmethod
+    def _purge_range(low, high, expired, archive):
+        with transaction.atomic():
+            rows = list(
+                Notification.objects.filter(expired, id__gte=low, id__lt=high)
+                .order_by('id')
+                .values(*ARCHIVE_FIELDS)
+            )
+            if not rows:
+                return 0
+            if archive is not None:
+                for row in rows:
+                    archive.write(json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n')
+                # Архив сбрасывается на диск до удаления строк.
+                archive.flush()
+            Notification.objects.filter(id__in=[row['id'] for row in rows]).delete()
+            unread_users = [row['user_id'] for row in rows if not row['is_read']]
+            if unread_users:
+                transaction.on_commit(lambda: invalidate_unread_counts(unread_users))
+        return len(rows)
+
+    @staticmethod
+    def _archive_path(archive_dir, now):
+        directory = Path(archive_dir) if archive_dir else settings.ARCHIVE_ROOT / 'notifications'
+        directory.mkdir(parents=True, exist_ok=True)
+        return directory / f'notifications-{now:%Y%m%d-%H%M%S}.jsonl.gz'
+
+    def _vacuum(self):
+        if connection.vendor != 'postgresql':
+            self.stdout.write('VACUUM skipped: only supported on PostgreSQL')
+            return
+        # VACUUM нельзя выполнять в транзакции; команда работает в autocommit
+        with connection.cursor() as cursor:
+            cursor.execute(f'VACUUM (ANALYZE) {connection.ops.quote_name(Notification._meta.db_table)}')
+        self.stdout.write('Notification table vacuumed')
+
+    @staticmethod
+    def _table_stats():
+        """(живые, мертвые) строки таблицы уведомлений по статистике PostgreSQL или None."""
+        if connection.vendor != 'postgresql':
+            return None
+        with connection.cursor() as cursor:
+            # Статистика обновляется асинхронно; сбрасываем снимок, чтобы прочитать свежие значения
+            cursor.execute('SELECT pg_stat_clear_snapshot()')
+            cursor.execute(
+                'SELECT n_live_tup, n_dead_tup FROM pg_stat_user_tables WHERE relid = %s::regclass',
+                [Notification._meta.db_table],
+            )
+            row = cursor.fetchone()
+            return row if row is not None else (0, 0)
@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Sum
+
+from ...models import UserProfile, XpTransaction
+
+
+class Command(BaseCommand):
+    help = 'Verify or rebuild UserProfile.xp totals from the XP ledger'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Only report profiles whose XP differs from the ledger',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=2000,
+            help='Number of profiles updated per transaction',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size <= 0:
+            raise CommandError('--batch-size must be positive')
+
+        # Одна агрегация по журналу на всех волонтеров.
+        ledger_totals = dict(
+            XpTransaction.objects.values('volunteer_id')
+            .annotate(total=Sum('amount'))
+            .values_list('volunteer_id', 'total')
+            .iterator(chunk_size=batch_size)
+        )
+
+        mismatched = []
+        profiles = UserProfile.objects.only('id', 'user_id', 'xp', 'level').iterator(chunk_size=batch_size)
+        for profile in profiles:
+            expected = max(ledger_totals.get(profile.user_id) or 0, 0)
+            if profile.xp != expected:
+                profile.xp = expected
+                profile.recalculate_level()
+                mismatched.append(profile)
+
+        if options['verify']:
+            for profile in mismatched[:50]:
+                self.stdout.write(f'  profile {profile.pk}: ledger total {profile.xp}')
+            self.stdout.write(f'{len(mismatched)} profiles differ from the XP ledger')
+            return
+
+        for offset in range(0, len(mismatched), batch_size):
+            with transaction.atomic():
+                UserProfile.objects.bulk_update(mismatched[offset:offset + batch_size], ['xp', 'level'])
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt XP totals for {len(mismatched)} profiles'))
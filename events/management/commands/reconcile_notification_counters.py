@@ -0,0 +1,70 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+
+from ...caching import cache_is_shared, set_unread_counts, unread_count_key
+from ...models import Notification
+
+
+class Command(BaseCommand):
+    help = 'Reconcile cached unread-notification counters with the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of users checked per cache round trip',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size <= 0:
+            raise CommandError('--batch-size must be positive')
+        if not cache_is_shared():
+            # Локальный кеш этого процесса пуст, а счетчики без общего кеша читаются из БД
+            self.stdout.write('Cache is not shared between processes (REDIS_URL is not set); nothing to reconcile')
+            return
+
+        checked = fixed = 0
+        user_ids = User.objects.order_by('id').values_list('id', flat=True).iterator(chunk_size=batch_size)
+        batch = []
+        for user_id in user_ids:
+            batch.append(user_id)
+            if len(batch) >= batch_size:
+                checked_batch, fixed_batch = self._reconcile(batch)
+                checked += checked_batch
+                fixed += fixed_batch
+                batch = []
+        if batch:
+            checked_batch, fixed_batch = self._reconcile(batch)
+            checked += checked_batch
+            fixed += fixed_batch
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Checked {checked} cached counters, corrected {fixed}')
+        )
+
+    @staticmethod
+    def _reconcile(user_ids):
+        # Сверяются только счетчики, которые есть в кеше; остальные посчитаются при чтении.
+        cached = cache.get_many([unread_count_key(user_id) for user_id in user_ids])
+        cached_ids = [user_id for user_id in user_ids if unread_count_key(user_id) in cached]
+        if not cached_ids:
+            return 0, 0
+
+        actual = dict(
+            Notification.objects.filter(user_id__in=cached_ids, is_read=False)
+            .values('user_id')
+            .annotate(total=Count('id'))
+            .values_list('user_id', 'total')
+        )
+        corrected = {
+            user_id: actual.get(user_id, 0)
+            for user_id in cached_ids
+            if cached[unread_count_key(user_id)] != actual.get(user_id, 0)
+        }
+        if corrected:
+            set_unread_counts(corrected)
+        return len(cached_ids), len(corrected)
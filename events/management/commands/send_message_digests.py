@@ -0,0 +1,104 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from ...models import ChatChannelMembership, Notification, UserProfile, muted_notification
+
+DIGEST_PERIODS = {
+    'hourly': timedelta(hours=1),
+    'daily': timedelta(days=1),
+}
+
+
+class Command(BaseCommand):
+    help = 'Send chat message digests to users who chose hourly or daily delivery (run from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'frequency',
+            choices=sorted(DIGEST_PERIODS),
+            help='Digest frequency to process; schedule the command with the same period',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of users processed per query',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size <= 0:
+            raise CommandError('--batch-size must be positive')
+
+        now = timezone.now()
+        window_start = now - DIGEST_PERIODS[options['frequency']]
+        user_ids = (
+            UserProfile.objects.filter(message_digest=options['frequency'])
+            .order_by('user_id')
+            .values_list('user_id', flat=True)
+        )
+
+        sent = 0
+        batch = []
+        for user_id in user_ids.iterator(chunk_size=batch_size):
+            batch.append(user_id)
+            if len(batch) >= batch_size:
+                sent += self._send_digests(batch, window_start, now)
+                batch = []
+        if batch:
+            sent += self._send_digests(batch, window_start, now)
+
+        self.stdout.write(self.style.SUCCESS(f'Sent {sent} {options["frequency"]} message digests'))
+
+    @staticmethod
+    def _send_digests(user_ids, window_start, now):
+        # Непрочитанные чужие сообщения за окно сводки, по каналам пользователя.
+        unread_by_channel = (
+            ChatChannelMembership.objects.filter(
+                ~muted_notification('new_message', 'user_id'),
+                user_id__in=user_ids,
+                notifications_enabled=True,
+            )
+            .annotate(
+                unread=Count(
+                    'channel__messages',
+                    filter=Q(
+                        channel__messages__created_at__gt=F('last_read_at'),
+                        channel__messages__created_at__gte=window_start,
+                        channel__messages__created_at__lt=now,
+                    ) & ~Q(channel__messages__author_id=F('user_id')),
+                )
+            )
+            .filter(unread__gt=0)
+            .values_list('user_id', 'channel__name', 'unread')
+        )
+
+        channels_by_user = defaultdict(list)
+        for user_id, channel_name, unread in unread_by_channel:
+            channels_by_user[user_id].append((channel_name, unread))
+
+        notifications = []
+        for user_id, channels in channels_by_user.items():
+            total = sum(unread for _, unread in channels)
+            summary = ', '.join(f'{name} ({unread})' for name, unread in channels[:5])
+            if len(channels) > 5:
+                summary += f' и еще {len(channels) - 5}'
+            notifications.append(
+                Notification(
+                    user_id=user_id,
+                    type='new_message',
+                    title=f'Новых сообщений в чатах: {total}',
+                    message=summary,
+                    count=total,
+                    created_at=now,
+                )
+            )
+
+        with transaction.atomic():
+            Notification.objects.bulk_create(notifications)
+        return len(notifications)
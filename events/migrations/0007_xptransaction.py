@@ -0,0 +1,48 @@
+# Generated by Django 5.2.8 on 2026-10-19 01:40
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def create_opening_balances(apps, schema_editor):
+    UserProfile = apps.get_model('events', 'UserProfile')
+    XpTransaction = apps.get_model('events', 'XpTransaction')
+    batch = []
+    for user_id, xp in UserProfile.objects.filter(xp__gt=0).values_list('user_id', 'xp').iterator():
+        batch.append(XpTransaction(volunteer_id=user_id, source='opening_balance', amount=xp))
+        if len(batch) >= 1000:
+            XpTransaction.objects.bulk_create(batch)
+            batch = []
+    XpTransaction.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0006_alter_achievement_options_alter_chatchannel_options_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='XpTransaction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(choices=[('event_completion', 'Завершение события'), ('opening_balance', 'Начальный баланс'), ('adjustment', 'Корректировка')], max_length=30, verbose_name='Источник')),
+                ('amount', models.IntegerField(verbose_name='Количество XP')),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='Создано')),
+                ('related_registration', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='xp_transactions', to='events.eventregistration', verbose_name='Связанная заявка')),
+                ('volunteer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='xp_transactions', to=settings.AUTH_USER_MODEL, verbose_name='Волонтер')),
+            ],
+            options={
+                'verbose_name': 'Начисление XP',
+                'verbose_name_plural': 'Начисления XP',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['volunteer', 'created_at'], name='events_xptr_volunte_8b7244_idx')],
+                'constraints': [models.UniqueConstraint(fields=('related_registration', 'source'), name='unique_xp_transaction_per_registration')],
+            },
+        ),
+        migrations.RunPython(create_opening_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.8 on 2026-10-19 01:41
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0007_xptransaction'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='XpRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('week', 'Неделя'), ('month', 'Месяц')], max_length=10, verbose_name='Период')),
+                ('period_start', models.DateField(verbose_name='Начало периода')),
+                ('city', models.CharField(blank=True, max_length=100, verbose_name='Город')),
+                ('xp', models.IntegerField(default=0, verbose_name='XP за период')),
+                ('events_completed', models.PositiveIntegerField(default=0, verbose_name='Завершено событий')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Обновлено')),
+                ('volunteer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='xp_rollups', to=settings.AUTH_USER_MODEL, verbose_name='Волонтер')),
+            ],
+            options={
+                'verbose_name': 'Агрегат рейтинга',
+                'verbose_name_plural': 'Агрегаты рейтинга',
+                'indexes': [models.Index(fields=['period', 'period_start', 'city', '-xp', '-events_completed'], name='xp_rollup_ranking_idx')],
+                'constraints': [models.UniqueConstraint(fields=('period', 'period_start', 'city', 'volunteer'), name='unique_xp_rollup_per_period')],
+            },
+        ),
+    ]
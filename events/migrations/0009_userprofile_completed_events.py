@@ -0,0 +1,44 @@
+# Generated by Django 5.2.8 on 2026-10-19 01:42
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_completed_events(apps, schema_editor):
+    UserProfile = apps.get_model('events', 'UserProfile')
+    EventRegistration = apps.get_model('events', 'EventRegistration')
+    totals = dict(
+        EventRegistration.objects.filter(status='completed')
+        .values('volunteer_id')
+        .annotate(total=models.Count('id'))
+        .values_list('volunteer_id', 'total')
+    )
+    profiles = list(UserProfile.objects.filter(user_id__in=totals).only('id', 'user_id'))
+    for profile in profiles:
+        profile.completed_events = totals[profile.user_id]
+    UserProfile.objects.bulk_update(profiles, ['completed_events'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0008_xprollup'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='completed_events',
+            field=models.PositiveIntegerField(default=0, verbose_name='Завершено событий'),
+        ),
+        migrations.AddIndex(
+            model_name='userprofile',
+            index=models.Index(fields=['role', '-xp', '-completed_events', 'id'], name='profile_ranking_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userprofile',
+            index=models.Index(fields=['role', 'city', '-xp', '-completed_events', 'id'], name='profile_city_ranking_idx'),
+        ),
+        migrations.RunPython(fill_completed_events, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.8 on 2026-10-19 01:47
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0009_userprofile_completed_events'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='last_broadcast_id',
+            field=models.PositiveBigIntegerField(default=0, verbose_name='Последняя полученная рассылка'),
+        ),
+        migrations.AlterField(
+            model_name='notification',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Создано'),
+        ),
+        migrations.CreateModel(
+            name='BroadcastNotification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type', models.CharField(max_length=50, verbose_name='Тип уведомления')),
+                ('title', models.CharField(max_length=200, verbose_name='Заголовок')),
+                ('message', models.TextField(verbose_name='Сообщение')),
+                ('audience_role', models.CharField(choices=[('volunteer', 'Волонтер'), ('organizer', 'Организатор')], default='volunteer', max_length=20, verbose_name='Аудитория')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создано')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='sent_broadcasts', to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+                ('related_event', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='broadcasts', to='events.event', verbose_name='Связанное событие')),
+            ],
+            options={
+                'verbose_name': 'Рассылка',
+                'verbose_name_plural': 'Рассылки',
+                'ordering': ['-id'],
+            },
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='broadcast',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='deliveries', to='events.broadcastnotification', verbose_name='Рассылка'),
+        ),
+        migrations.AddConstraint(
+            model_name='notification',
+            constraint=models.UniqueConstraint(condition=models.Q(('broadcast__isnull', False)), fields=('user', 'broadcast'), name='unique_broadcast_delivery_per_user'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.8 on 2026-10-19 01:59
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0011_notificationoutbox'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='count',
+            field=models.PositiveIntegerField(default=1, verbose_name='Количество'),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='related_channel',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to='events.chatchannel', verbose_name='Связанный канал'),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='message_digest',
+            field=models.CharField(choices=[('instant', 'Сразу'), ('hourly', 'Сводка раз в час'), ('daily', 'Сводка раз в день')], default='instant', max_length=10, verbose_name='Уведомления о сообщениях в чатах'),
+        ),
+        migrations.AddConstraint(
+            model_name='notification',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_read', False), ('related_channel__isnull', False)), fields=('user', 'related_channel'), name='unique_unread_channel_notification'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-19 02:03
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0012_notification_coalescing'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='notification_feed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', 'is_read', '-created_at', '-id'], name='notification_status_feed_idx'),
+        ),
+        # (user, is_read) - префикс нового индекса, удаляется после его создания
+        migrations.RemoveIndex(
+            model_name='notification',
+            name='events_noti_user_id_bdde29_idx',
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-19 02:04
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0013_notification_feed_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationPreference',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type', models.CharField(choices=[('application_approved', 'Заявка одобрена'), ('application_rejected', 'Заявка отклонена'), ('new_application', 'Новая заявка'), ('new_event', 'Новое событие'), ('event_reminder', 'Напоминание о событии'), ('new_message', 'Новое сообщение в чате'), ('achievement_unlocked', 'Новое достижение'), ('level_up', 'Новый уровень')], max_length=50, verbose_name='Тип уведомления')),
+                ('muted', models.BooleanField(default=True, verbose_name='Отключено')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Обновлено')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notification_preferences', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Настройка уведомлений',
+                'verbose_name_plural': 'Настройки уведомлений',
+                'constraints': [models.UniqueConstraint(fields=('user', 'type'), name='unique_notification_preference')],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.8 on 2026-10-19 02:06
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0014_notificationpreference'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventReminder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('lead_minutes', models.PositiveIntegerField(verbose_name='За сколько минут до начала')),
+                ('sent_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Отправлено')),
+                ('registration', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reminders', to='events.eventregistration', verbose_name='Заявка')),
+            ],
+            options={
+                'verbose_name': 'Напоминание о событии',
+                'verbose_name_plural': 'Напоминания о событиях',
+                'constraints': [models.UniqueConstraint(fields=('registration', 'lead_minutes'), name='unique_reminder_per_lead')],
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.8 on 2026-10-19 02:15
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def fill_unread_counts(apps, schema_editor):
+    ChatChannelMembership = apps.get_model('events', 'ChatChannelMembership')
+    ChatMessage = apps.get_model('events', 'ChatMessage')
+    unread = (
+        ChatMessage.objects.filter(
+            channel_id=models.OuterRef('channel_id'),
+            created_at__gt=models.OuterRef('last_read_at'),
+        )
+        .exclude(author_id=models.OuterRef('user_id'))
+        .values('channel_id')
+        .annotate(total=models.Count('id'))
+        .values('total')
+    )
+    ChatChannelMembership.objects.update(unread_count=Coalesce(models.Subquery(unread), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0015_eventreminder'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatchannelmembership',
+            name='unread_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Непрочитанных сообщений'),
+        ),
+        migrations.RunPython(fill_unread_counts, migrations.RunPython.noop),
+    ]
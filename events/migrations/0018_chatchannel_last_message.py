@@ -0,0 +1,27 @@
+# Generated by Django 5.2.8 on 2026-10-19 02:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_last_message(apps, schema_editor):
+    ChatChannel = apps.get_model('events', 'ChatChannel')
+    ChatMessage = apps.get_model('events', 'ChatMessage')
+    latest = ChatMessage.objects.filter(channel_id=models.OuterRef('pk')).order_by('-id').values('id')[:1]
+    ChatChannel.objects.update(last_message_id=models.Subquery(latest))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0017_chatmessage_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatchannel',
+            name='last_message',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='events.chatmessage', verbose_name='Последнее сообщение'),
+        ),
+        migrations.RunPython(fill_last_message, migrations.RunPython.noop),
+    ]
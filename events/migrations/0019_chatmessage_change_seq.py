@@ -0,0 +1,58 @@
+# Generated by Django 5.2.8 on 2026-10-19 02:23
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+from events.search import install_sqlite_triggers
+
+
+def fill_change_seq(apps, schema_editor):
+    # Идентификаторы уже растут внутри каждого канала, их можно взять как начальные номера
+    ChatChannel = apps.get_model('events', 'ChatChannel')
+    ChatMessage = apps.get_model('events', 'ChatMessage')
+    ChatMessage.objects.update(seq=models.F('id'))
+    latest = ChatMessage.objects.filter(channel_id=models.OuterRef('pk')).order_by('-id').values('id')[:1]
+    ChatChannel.objects.update(last_seq=Coalesce(models.Subquery(latest), 0))
+
+
+def restore_search_triggers(apps, schema_editor):
+    # SQLite пересоздает таблицу сообщений при добавлении полей и теряет триггеры FTS5
+    install_sqlite_triggers(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0018_chatchannel_last_message'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatchannel',
+            name='last_seq',
+            field=models.PositiveBigIntegerField(default=0, verbose_name='Номер последнего изменения'),
+        ),
+        migrations.AddField(
+            model_name='chatmessage',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Удалено в'),
+        ),
+        migrations.AddField(
+            model_name='chatmessage',
+            name='is_deleted',
+            field=models.BooleanField(default=False, verbose_name='Удалено'),
+        ),
+        migrations.AddField(
+            model_name='chatmessage',
+            name='seq',
+            field=models.PositiveBigIntegerField(default=0, verbose_name='Номер изменения'),
+        ),
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['channel', 'seq'], name='chatmessage_channel_seq_idx'),
+        ),
+        migrations.RunPython(fill_change_seq, migrations.RunPython.noop),
+        migrations.RunPython(restore_search_triggers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-19 02:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0019_chatmessage_change_seq'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChatArchiveSegment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('first_created_at', models.DateTimeField(verbose_name='Первое сообщение')),
+                ('first_message_id', models.PositiveBigIntegerField(verbose_name='ID первого сообщения')),
+                ('last_created_at', models.DateTimeField(verbose_name='Последнее сообщение')),
+                ('last_message_id', models.PositiveBigIntegerField(verbose_name='ID последнего сообщения')),
+                ('message_count', models.PositiveIntegerField(verbose_name='Сообщений')),
+                ('payload', models.BinaryField(verbose_name='Сжатые сообщения')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создан')),
+                ('channel', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archive_segments', to='events.chatchannel', verbose_name='Канал')),
+            ],
+            options={
+                'verbose_name': 'Архивный сегмент чата',
+                'verbose_name_plural': 'Архивные сегменты чата',
+                'indexes': [models.Index(fields=['channel', '-last_created_at', '-last_message_id'], name='chat_archive_segment_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.8 on 2026-10-19 03:06
+
+from django.db import migrations
+
+
+def scrub_deleted_messages(apps, schema_editor):
+    # Удаленные раньше сообщения сохраняли текст; триггеры поиска уберут его и из индекса
+    ChatMessage = apps.get_model('events', 'ChatMessage')
+    ChatMessage.objects.filter(is_deleted=True).exclude(content='').update(content='')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0021_notification_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(scrub_deleted_messages, migrations.RunPython.noop),
+    ]
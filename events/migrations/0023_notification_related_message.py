@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-19 03:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0022_scrub_deleted_chat_messages'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='related_message',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='notifications', to='events.chatmessage', verbose_name='Связанное сообщение'),
+        ),
+    ]
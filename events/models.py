@@ -1,10 +1,19 @@
+from datetime import timedelta
+
 from django.contrib.auth.models import User
-from django.db import models, transaction
+from django.db import IntegrityError, models, transaction
+from django.db.models import Exists, F, OuterRef
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from django.utils import timezone
 from django.urls import reverse
-from .constants import VOLUNTEER_LEVELS
+from .caching import (
+    bump_leaderboard_version,
+    incr_unread_counts,
+    invalidate_unread_counts,
+)
+from .constants import LEADERBOARD_PERIODS, VOLUNTEER_LEVELS
+from .realtime import channel_topic, publish, user_topic
 
 
 class Skill(models.Model):
@@ -25,6 +34,11 @@ class UserProfile(models.Model):
         ('volunteer', 'Волонтер'),
         ('organizer', 'Организатор'),
     ]
+    MESSAGE_DIGEST_CHOICES = [
+        ('instant', 'Сразу'),
+        ('hourly', 'Сводка раз в час'),
+        ('daily', 'Сводка раз в день'),
+    ]
 
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
     role = models.CharField(max_length=20, choices=ROLE_CHOICES, default='volunteer', verbose_name='Роль')
@@ -36,11 +50,27 @@ class UserProfile(models.Model):
     avatar_url = models.URLField(blank=True, verbose_name='Аватар URL (опционально)')
     xp = models.PositiveIntegerField(default=0, verbose_name='Опыт (XP)')
     level = models.PositiveIntegerField(default=1, verbose_name='Уровень')
+    completed_events = models.PositiveIntegerField(default=0, verbose_name='Завершено событий')
+    last_broadcast_id = models.PositiveBigIntegerField(
+        default=0,
+        verbose_name='Последняя полученная рассылка',
+    )
+    message_digest = models.CharField(
+        max_length=10,
+        choices=MESSAGE_DIGEST_CHOICES,
+        default='instant',
+        verbose_name='Уведомления о сообщениях в чатах',
+    )
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         verbose_name = 'Профиль'
         verbose_name_plural = 'Профили'
+        indexes = [
+            # Порядок рейтинга: (-xp, -completed_events, id)
+            models.Index(fields=['role', '-xp', '-completed_events', 'id'], name='profile_ranking_idx'),
+            models.Index(fields=['role', 'city', '-xp', '-completed_events', 'id'], name='profile_city_ranking_idx'),
+        ]
 
     def __str__(self):
         return f'{self.user.username} ({self.get_role_display()})'
@@ -213,6 +243,29 @@ class EventRegistration(models.Model):
         return f'{self.volunteer.username} -> {self.event.title}'
 
 
+class EventReminder(models.Model):
+    """Отметка об отправленном напоминании с заданным упреждением; защищает от повторов."""
+
+    registration = models.ForeignKey(
+        EventRegistration,
+        on_delete=models.CASCADE,
+        related_name='reminders',
+        verbose_name='Заявка',
+    )
+    lead_minutes = models.PositiveIntegerField(verbose_name='За сколько минут до начала')
+    sent_at = models.DateTimeField(default=timezone.now, verbose_name='Отправлено')
+
+    class Meta:
+        verbose_name = 'Напоминание о событии'
+        verbose_name_plural = 'Напоминания о событиях'
+        constraints = [
+            models.UniqueConstraint(fields=['registration', 'lead_minutes'], name='unique_reminder_per_lead'),
+        ]
+
+    def __str__(self):
+        return f'{self.registration} ({self.lead_minutes} min)'
+
+
 class Achievement(models.Model):
     CATEGORY_CHOICES = [
         ('events_completed', 'Завершенные события'),
@@ -261,6 +314,127 @@ class VolunteerAchievement(models.Model):
         return f'{self.volunteer.username} - {self.achievement.title}'
 
 
+class XpTransaction(models.Model):
+    """Запись журнала начислений XP. Журнал только дополняется, UserProfile.xp - его сумма."""
+
+    SOURCE_CHOICES = [
+        ('event_completion', 'Завершение события'),
+        ('opening_balance', 'Начальный баланс'),
+        ('adjustment', 'Корректировка'),
+    ]
+
+    volunteer = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='xp_transactions',
+        verbose_name='Волонтер',
+    )
+    source = models.CharField(max_length=30, choices=SOURCE_CHOICES, verbose_name='Источник')
+    amount = models.IntegerField(verbose_name='Количество XP')
+    related_registration = models.ForeignKey(
+        EventRegistration,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='xp_transactions',
+        verbose_name='Связанная заявка',
+    )
+    created_at = models.DateTimeField(default=timezone.now, db_index=True, verbose_name='Создано')
+
+    class Meta:
+        verbose_name = 'Начисление XP'
+        verbose_name_plural = 'Начисления XP'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['volunteer', 'created_at']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['related_registration', 'source'],
+                name='unique_xp_transaction_per_registration',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.volunteer.username}: {self.amount:+d} XP ({self.get_source_display()})'
+
+
+class XpRollup(models.Model):
+    """Агрегат XP волонтера за неделю или месяц; city='' - общий рейтинг по всем городам."""
+
+    PERIOD_CHOICES = [
+        ('week', 'Неделя'),
+        ('month', 'Месяц'),
+    ]
+
+    volunteer = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='xp_rollups',
+        verbose_name='Волонтер',
+    )
+    period = models.CharField(max_length=10, choices=PERIOD_CHOICES, verbose_name='Период')
+    period_start = models.DateField(verbose_name='Начало периода')
+    city = models.CharField(max_length=100, blank=True, verbose_name='Город')
+    xp = models.IntegerField(default=0, verbose_name='XP за период')
+    events_completed = models.PositiveIntegerField(default=0, verbose_name='Завершено событий')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Обновлено')
+
+    class Meta:
+        verbose_name = 'Агрегат рейтинга'
+        verbose_name_plural = 'Агрегаты рейтинга'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['period', 'period_start', 'city', 'volunteer'],
+                name='unique_xp_rollup_per_period',
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['period', 'period_start', 'city', '-xp', '-events_completed'],
+                name='xp_rollup_ranking_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.volunteer.username}: {self.xp} XP ({self.period} {self.period_start})'
+
+
+def period_start_for(period, day):
+    """Возвращает первый день недели или месяца, в который попадает дата."""
+    if period == 'week':
+        return day - timedelta(days=day.weekday())
+    if period == 'month':
+        return day.replace(day=1)
+    raise ValueError(f'Unknown leaderboard period: {period}')
+
+
+def record_xp_rollups(user, amount, city='', events_completed=0, day=None):
+    """Инкрементально обновляет агрегаты рейтинга для всех периодов."""
+    day = day or timezone.localdate()
+    scopes = [''] + ([city] if city else [])
+    for period in LEADERBOARD_PERIODS:
+        period_start = period_start_for(period, day)
+        for scope in scopes:
+            lookup = {'period': period, 'period_start': period_start, 'city': scope, 'volunteer': user}
+            updated = XpRollup.objects.filter(**lookup).update(
+                xp=F('xp') + amount,
+                events_completed=F('events_completed') + events_completed,
+                updated_at=timezone.now(),
+            )
+            if updated:
+                continue
+            try:
+                with transaction.atomic():
+                    XpRollup.objects.create(xp=amount, events_completed=events_completed, **lookup)
+            except IntegrityError:
+                # Строку успел создать параллельный запрос
+                XpRollup.objects.filter(**lookup).update(
+                    xp=F('xp') + amount,
+                    events_completed=F('events_completed') + events_completed,
+                )
+
+
 class ChatChannel(models.Model):
     event = models.ForeignKey(
         Event,
@@ -279,6 +453,17 @@ class ChatChannel(models.Model):
         verbose_name='Создан пользователем',
     )
     is_archived = models.BooleanField(default=False, verbose_name='Архивный')
+    # Денормализованная ссылка для списка каналов; обновляется при каждом новом сообщении
+    last_message = models.ForeignKey(
+        'ChatMessage',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name='Последнее сообщение',
+    )
+    # Номер последнего изменения в канале (новое, измененное или удаленное сообщение)
+    last_seq = models.PositiveBigIntegerField(default=0, verbose_name='Номер последнего изменения')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Создан')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='Обновлен')
     participants = models.ManyToManyField(
@@ -317,6 +502,8 @@ class ChatChannelMembership(models.Model):
     )
     notifications_enabled = models.BooleanField(default=True, verbose_name='Уведомления включены')
     last_read_at = models.DateTimeField(default=timezone.now, verbose_name='Последнее чтение')
+    # Чужие сообщения после last_read_at; растет при каждом сообщении, обнуляется при чтении
+    unread_count = models.PositiveIntegerField(default=0, verbose_name='Непрочитанных сообщений')
     joined_at = models.DateTimeField(auto_now_add=True, verbose_name='Вступил')
 
     class Meta:
@@ -345,6 +532,10 @@ class ChatMessage(models.Model):
     content = models.TextField(verbose_name='Сообщение')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Создано')
     edited_at = models.DateTimeField(null=True, blank=True, verbose_name='Изменено')
+    # Номер последнего изменения сообщения в канале: клиенты синхронизируются по seq > N
+    seq = models.PositiveBigIntegerField(default=0, verbose_name='Номер изменения')
+    is_deleted = models.BooleanField(default=False, verbose_name='Удалено')
+    deleted_at = models.DateTimeField(null=True, blank=True, verbose_name='Удалено в')
 
     class Meta:
         verbose_name = 'Сообщение'
@@ -352,11 +543,134 @@ class ChatMessage(models.Model):
         ordering = ['created_at']
         indexes = [
             models.Index(fields=['channel', 'created_at']),
+            models.Index(fields=['channel', 'seq'], name='chatmessage_channel_seq_idx'),
         ]
 
     def __str__(self):
         return f'{self.author.username}: {self.content[:40]}'
 
+    def save(self, *args, **kwargs):
+        if self._state.adding and not self.seq:
+            with transaction.atomic():
+                self.seq = next_channel_seq(self.channel_id)
+                super().save(*args, **kwargs)
+            return
+        super().save(*args, **kwargs)
+
+
+class ChatArchiveSegment(models.Model):
+    """
+    Сжатая пачка старых сообщений канала (gzip JSON), вынесенная из ChatMessage.
+    Сегмент покрывает непрерывный диапазон (created_at, id) - см. events/chat_archive.py.
+    """
+
+    channel = models.ForeignKey(
+        ChatChannel,
+        on_delete=models.CASCADE,
+        related_name='archive_segments',
+        verbose_name='Канал',
+    )
+    first_created_at = models.DateTimeField(verbose_name='Первое сообщение')
+    first_message_id = models.PositiveBigIntegerField(verbose_name='ID первого сообщения')
+    last_created_at = models.DateTimeField(verbose_name='Последнее сообщение')
+    last_message_id = models.PositiveBigIntegerField(verbose_name='ID последнего сообщения')
+    message_count = models.PositiveIntegerField(verbose_name='Сообщений')
+    payload = models.BinaryField(verbose_name='Сжатые сообщения')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Создан')
+
+    class Meta:
+        verbose_name = 'Архивный сегмент чата'
+        verbose_name_plural = 'Архивные сегменты чата'
+        indexes = [
+            models.Index(
+                fields=['channel', '-last_created_at', '-last_message_id'],
+                name='chat_archive_segment_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.channel} ({self.message_count})'
+
+
+def next_channel_seq(channel_id):
+    """
+    Выдает следующий номер изменения в канале. Вызывается внутри транзакции:
+    UPDATE блокирует строку канала до коммита, поэтому изменения одного канала
+    фиксируются в порядке номеров и клиент, прочитавший seq > N, ничего не пропустит.
+    """
+    channels = ChatChannel.objects.filter(pk=channel_id)
+    channels.update(last_seq=F('last_seq') + 1)
+    return channels.values_list('last_seq', flat=True).get()
+
+
+class BroadcastNotification(models.Model):
+    """
+    Уведомление для всех пользователей роли (например, о новом событии).
+    Хранится один раз и подмешивается в ленту пользователя при чтении.
+    """
+
+    type = models.CharField(max_length=50, verbose_name='Тип уведомления')
+    title = models.CharField(max_length=200, verbose_name='Заголовок')
+    message = models.TextField(verbose_name='Сообщение')
+    audience_role = models.CharField(
+        max_length=20,
+        choices=UserProfile.ROLE_CHOICES,
+        default='volunteer',
+        verbose_name='Аудитория',
+    )
+    related_event = models.ForeignKey(
+        Event,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='broadcasts',
+        verbose_name='Связанное событие',
+    )
+    created_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='sent_broadcasts',
+        verbose_name='Автор',
+    )
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Создано')
+
+    class Meta:
+        verbose_name = 'Рассылка'
+        verbose_name_plural = 'Рассылки'
+        ordering = ['-id']
+
+    def __str__(self):
+        return self.title
+
+
+class NotificationQuerySet(models.QuerySet):
+    """
+    Обновляет кешированные счетчики непрочитанных после коммита вставки
+    и будит открытые потоки уведомлений получателей.
+    """
+
+    def create(self, **kwargs):
+        notification = super().create(**kwargs)
+        if not notification.is_read:
+            user_ids = [notification.user_id]
+            transaction.on_commit(lambda: incr_unread_counts(user_ids), using=self.db)
+            publish([user_topic(notification.user_id)], 'notification')
+        return notification
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = super().bulk_create(objs, *args, **kwargs)
+        user_ids = [obj.user_id for obj in objs if not obj.is_read]
+        if user_ids:
+            if kwargs.get('ignore_conflicts'):
+                # Сколько строк вставлено на самом деле, неизвестно: счетчики пересчитаются при чтении.
+                transaction.on_commit(lambda: invalidate_unread_counts(user_ids), using=self.db)
+            else:
+                transaction.on_commit(lambda: incr_unread_counts(user_ids), using=self.db)
+            publish([user_topic(user_id) for user_id in user_ids], 'notification')
+        return objs
+
 
 class Notification(models.Model):
     TYPE_CHOICES = [
@@ -400,21 +714,70 @@ class Notification(models.Model):
         related_name='notifications',
         verbose_name='Связанная заявка',
     )
-    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Создано')
+    broadcast = models.ForeignKey(
+        BroadcastNotification,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='deliveries',
+        verbose_name='Рассылка',
+    )
+    related_channel = models.ForeignKey(
+        ChatChannel,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='notifications',
+        verbose_name='Связанный канал',
+    )
+    # Сообщение чата, текст которого показан в уведомлении (при объединении - последнее)
+    related_message = models.ForeignKey(
+        ChatMessage,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='notifications',
+        verbose_name='Связанное сообщение',
+    )
+    # Сколько событий объединено в уведомлении (например, сообщений в канале)
+    count = models.PositiveIntegerField(default=1, verbose_name='Количество')
+    # default вместо auto_now_add: доставленная рассылка сохраняет время своего создания
+    created_at = models.DateTimeField(default=timezone.now, verbose_name='Создано')
+    # Последнее объединенное событие; created_at не меняется, чтобы не ломать курсор ленты
+    updated_at = models.DateTimeField(default=timezone.now, verbose_name='Обновлено')
+
+    objects = NotificationQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Уведомление'
         verbose_name_plural = 'Уведомления'
         ordering = ['-created_at']
         indexes = [
-            models.Index(fields=['user', 'is_read']),
+            # Лента уведомлений: keyset-страницы по (created_at, id) для всех/по статусу
+            models.Index(fields=['user', '-created_at', '-id'], name='notification_feed_idx'),
+            models.Index(fields=['user', 'is_read', '-created_at', '-id'], name='notification_status_feed_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'broadcast'],
+                condition=models.Q(broadcast__isnull=False),
+                name='unique_broadcast_delivery_per_user',
+            ),
+            # Одно непрочитанное уведомление о сообщениях на канал: новые сообщения увеличивают count
+            models.UniqueConstraint(
+                fields=['user', 'related_channel'],
+                condition=models.Q(related_channel__isnull=False, is_read=False),
+                name='unique_unread_channel_notification',
+            ),
         ]
 
     def __str__(self):
         return f'{self.user.username} - {self.title}'
 
     def get_absolute_url(self):
-        """Возвращает URL для уведомления (событие если есть, иначе список уведомлений)"""
+        """Возвращает URL для уведомления (канал, событие или список уведомлений)"""
+        if self.related_channel_id:
+            return reverse('chat_channel_detail', kwargs={'channel_id': self.related_channel_id})
         if self.related_event:
             return reverse('event_detail', kwargs={'pk': self.related_event.pk})
         return reverse('notifications_list')
@@ -434,6 +797,80 @@ class Notification(models.Model):
         return icons.get(self.type, '🔔')
 
 
+class NotificationPreference(models.Model):
+    """Отключенный пользователем тип уведомлений; учитывается прямо в запросах рассылки."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='notification_preferences',
+        verbose_name='Пользователь',
+    )
+    type = models.CharField(
+        max_length=50,
+        choices=Notification.TYPE_CHOICES,
+        verbose_name='Тип уведомления',
+    )
+    muted = models.BooleanField(default=True, verbose_name='Отключено')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Обновлено')
+
+    class Meta:
+        verbose_name = 'Настройка уведомлений'
+        verbose_name_plural = 'Настройки уведомлений'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'type'], name='unique_notification_preference'),
+        ]
+
+    def __str__(self):
+        return f'{self.user.username}: {self.type} ({"muted" if self.muted else "on"})'
+
+
+def muted_notification(notification_type, user_ref='pk'):
+    """
+    Условие EXISTS "получатель отключил этот тип уведомлений" для фильтра
+    ~muted_notification(...) в запросе получателей. user_ref - поле с id
+    пользователя во внешнем запросе ('pk' для User, 'user_id' для участников).
+    """
+    return Exists(
+        NotificationPreference.objects.filter(
+            user_id=OuterRef(user_ref),
+            type=notification_type,
+            muted=True,
+        )
+    )
+
+
+class NotificationOutbox(models.Model):
+    """
+    Очередь отложенной отправки уведомлений в БД.
+    Запрос только добавляет строку, уведомления создает process_notification_outbox.
+    """
+
+    STATUS_CHOICES = [
+        ('pending', 'Ожидает'),
+        ('failed', 'Ошибка'),
+    ]
+
+    kind = models.CharField(max_length=50, verbose_name='Тип задачи')
+    payload = models.JSONField(default=dict, verbose_name='Данные')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', verbose_name='Статус')
+    attempts = models.PositiveIntegerField(default=0, verbose_name='Попыток')
+    available_at = models.DateTimeField(default=timezone.now, verbose_name='Доступно с')
+    last_error = models.TextField(blank=True, verbose_name='Последняя ошибка')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Создано')
+
+    class Meta:
+        verbose_name = 'Задача отправки уведомлений'
+        verbose_name_plural = 'Очередь отправки уведомлений'
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'available_at', 'id'], name='outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.kind} #{self.pk} ({self.get_status_display()})'
+
+
 DEFAULT_ACHIEVEMENTS = [
     {
         'slug': 'first_event',
@@ -493,16 +930,92 @@ def ensure_default_achievements():
         )
 
 
+def latest_broadcast_id():
+    """
+    Id последней рассылки - один поиск по первичному ключу. Для частых проверок
+    есть caching.get_latest_broadcast_id, который держит значение в общем кеше.
+    """
+    return BroadcastNotification.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+
+def qualified_volunteer_ids(achievement):
+    """
+    Возвращает queryset id волонтеров, которые выполнили условие достижения,
+    но еще его не получили. Вся проверка выполняется одним запросом в БД.
+    """
+    awarded = VolunteerAchievement.objects.filter(achievement=achievement).values('volunteer_id')
+
+    if achievement.category == 'events_completed':
+        return (
+            EventRegistration.objects.filter(status='completed')
+            .exclude(volunteer_id__in=awarded)
+            .values('volunteer_id')
+            .annotate(total=models.Count('id'))
+            .filter(total__gte=achievement.threshold)
+            .order_by('volunteer_id')
+            .values_list('volunteer_id', flat=True)
+        )
+    if achievement.category == 'xp_total':
+        return (
+            UserProfile.objects.filter(role='volunteer', xp__gte=achievement.threshold)
+            .exclude(user_id__in=awarded)
+            .order_by('user_id')
+            .values_list('user_id', flat=True)
+        )
+    return UserProfile.objects.none().values_list('user_id', flat=True)
+
+
+def award_xp(user, amount, source, registration=None):
+    """
+    Записывает начисление в журнал XP и обновляет накопленную сумму в профиле.
+    Списание не уводит XP ниже нуля: в журнал пишется фактически списанная сумма,
+    чтобы профиль всегда совпадал с суммой журнала.
+    Возвращает обновленный профиль и уровень до начисления.
+    """
+    with transaction.atomic():
+        profile = UserProfile.objects.select_for_update().get(user=user)
+        previous_level = profile.level
+        amount = max(amount, -profile.xp)
+
+        XpTransaction.objects.create(
+            volunteer=user,
+            source=source,
+            amount=amount,
+            related_registration=registration,
+        )
+        profile.xp += amount
+        profile.recalculate_level()
+        if source == 'event_completion':
+            profile.completed_events += 1
+        UserProfile.objects.filter(pk=profile.pk).update(
+            xp=profile.xp,
+            level=profile.level,
+            completed_events=profile.completed_events,
+        )
+        record_xp_rollups(
+            user,
+            amount,
+            city=profile.city,
+            events_completed=1 if source == 'event_completion' else 0,
+        )
+        transaction.on_commit(bump_leaderboard_version)
+
+    # Держим закешированный профиль пользователя в актуальном состоянии.
+    user.profile = profile
+    return profile, previous_level
+
+
 def apply_event_completion_rewards(registration):
     if registration.status != 'completed' or registration.xp_awarded:
         return
 
     with transaction.atomic():
-        profile = registration.volunteer.profile
-        previous_level = profile.level
-        profile.xp += registration.event.xp_reward
-        profile.recalculate_level()
-        profile.save(update_fields=['xp', 'level'])
+        profile, previous_level = award_xp(
+            registration.volunteer,
+            registration.event.xp_reward,
+            source='event_completion',
+            registration=registration,
+        )
 
         registration.xp_awarded = True
         if registration.completed_at is None:
@@ -550,7 +1063,8 @@ def apply_event_completion_rewards(registration):
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
     if created:
-        UserProfile.objects.create(user=instance)
+        # Новый пользователь не получает рассылки, созданные до регистрации
+        UserProfile.objects.create(user=instance, last_broadcast_id=latest_broadcast_id())
 
 
 @receiver(post_save, sender=User)
@@ -574,6 +1088,23 @@ def ensure_user_profile_level(sender, instance, **kwargs):
         UserProfile.objects.filter(pk=instance.pk).update(level=instance.level)
 
 
+@receiver(post_save, sender=ChatMessage)
+def publish_chat_message(sender, instance, created, **kwargs):
+    if not created:
+        return
+    # Условие по id защищает от перезаписи более новым сообщением при гонке
+    ChatChannel.objects.filter(
+        models.Q(last_message__isnull=True) | models.Q(last_message_id__lt=instance.pk),
+        pk=instance.channel_id,
+    ).update(last_message=instance, updated_at=instance.created_at)
+    # Один UPDATE по участникам канала вместо подсчета сообщений при каждом показе списка
+    ChatChannelMembership.objects.filter(channel_id=instance.channel_id).exclude(
+        user_id=instance.author_id
+    ).update(unread_count=F('unread_count') + 1)
+    # Подключенные участники канала дочитают новое сообщение по своему курсору
+    publish([channel_topic(instance.channel_id)], 'message')
+
+
 @receiver(post_save, sender=Event)
 def create_default_event_channel(sender, instance, created, **kwargs):
     if not created:
@@ -584,4 +1115,5 @@ def create_default_event_channel(sender, instance, created, **kwargs):
         topic='Основной канал события',
         created_by=instance.organizer,
     )
-    ChatChannelMembership.objects.get_or_create(channel=channel, user=instance.organizer)
+    # У нового события еще нет заявок, поэтому единственный участник - организатор
+    ChatChannelMembership.objects.create(channel=channel, user=instance.organizer)
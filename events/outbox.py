@@ -0,0 +1,132 @@
+"""
+Очередь отправки уведомлений на базе таблицы NotificationOutbox.
+
+Запрос в рамках своей транзакции добавляет одну строку через enqueue(),
+а воркер (manage.py process_notification_outbox) выбирает готовые задачи
+пачками и вызывает зарегистрированные обработчики. Внешний брокер не нужен.
+"""
+import logging
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import NotificationOutbox
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_HANDLERS = {}
+# Обработчики, которые сами управляют транзакциями и получают задачу (task=...)
+STREAMING_HANDLERS = set()
+
+DEFAULT_MAX_ATTEMPTS = 5
+BACKOFF_BASE_SECONDS = 5
+BACKOFF_MAX_SECONDS = 3600
+# На сколько задача резервируется за воркером, прежде чем станет доступна снова
+LEASE_SECONDS = 300
+
+
+def outbox_handler(kind, streaming=False):
+    """
+    Регистрирует функцию-обработчик задач указанного типа.
+    Обычный обработчик выполняется в одной транзакции с удалением задачи.
+    Потоковый (streaming=True) получает задачу и фиксирует прогресс сам,
+    чтобы большие рассылки коммитились пачками и продолжались после сбоя.
+    """
+    def decorator(func):
+        OUTBOX_HANDLERS[kind] = func
+        if streaming:
+            STREAMING_HANDLERS.add(kind)
+        return func
+    return decorator
+
+
+def save_progress(task, **progress):
+    """
+    Сохраняет курсор потокового обработчика; вызывается внутри транзакции пачки.
+    Заодно продлевает резерв задачи: долгая рассылка не должна достаться второму воркеру.
+    """
+    task.payload = {**task.payload, **progress}
+    NotificationOutbox.objects.filter(pk=task.pk).update(
+        payload=task.payload,
+        available_at=timezone.now() + timedelta(seconds=LEASE_SECONDS),
+    )
+
+
+def enqueue(kind, **payload):
+    """Добавляет задачу в очередь. Вызывается внутри транзакции запроса."""
+    return NotificationOutbox.objects.create(kind=kind, payload=payload)
+
+
+def backoff_delay(attempts):
+    return timedelta(seconds=min(BACKOFF_BASE_SECONDS * 2 ** (attempts - 1), BACKOFF_MAX_SECONDS))
+
+
+def _run_task(task, max_attempts):
+    handler = OUTBOX_HANDLERS.get(task.kind)
+    try:
+        if handler is None:
+            raise LookupError(f'No outbox handler registered for "{task.kind}"')
+        if task.kind in STREAMING_HANDLERS:
+            handler(task=task, **task.payload)
+            NotificationOutbox.objects.filter(pk=task.pk).delete()
+        else:
+            with transaction.atomic():
+                handler(**task.payload)
+                NotificationOutbox.objects.filter(pk=task.pk).delete()
+        return True
+    except Exception as exc:
+        attempts = task.attempts + 1
+        logger.warning('Outbox task %s (%s) failed on attempt %s: %s', task.pk, task.kind, attempts, exc)
+        NotificationOutbox.objects.filter(pk=task.pk).update(
+            attempts=attempts,
+            last_error=str(exc),
+            status='failed' if attempts >= max_attempts else 'pending',
+            available_at=timezone.now() + backoff_delay(attempts),
+        )
+        return False
+
+
+def _renew_lease(task, leased_until):
+    """
+    Продлевает резерв задачи перед запуском, если он все еще принадлежит этому воркеру:
+    после истечения резерва другой воркер мог захватить задачу и сдвинуть available_at.
+    """
+    return NotificationOutbox.objects.filter(
+        pk=task.pk,
+        status='pending',
+        available_at=leased_until,
+    ).update(available_at=timezone.now() + timedelta(seconds=LEASE_SECONDS)) == 1
+
+
+def process_outbox_batch(batch_size=100, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """
+    Обрабатывает до batch_size готовых задач. Возвращает (успешно, с ошибкой).
+    На PostgreSQL задачи захватываются через SELECT ... FOR UPDATE SKIP LOCKED,
+    поэтому можно запускать несколько воркеров одновременно. Резерв продлевается
+    перед запуском каждой задачи, поэтому медленная пачка не отдает хвост второму воркеру.
+    """
+    # Обработчики объявлены в services; импорт здесь избегает циклической зависимости.
+    from . import services  # noqa: F401
+
+    with transaction.atomic():
+        tasks = list(
+            NotificationOutbox.objects.select_for_update(skip_locked=True)
+            .filter(status='pending', available_at__lte=timezone.now())
+            .order_by('id')[:batch_size]
+        )
+        # Откладываем захваченные задачи, чтобы другой воркер не взял их повторно.
+        leased_until = timezone.now() + timedelta(seconds=LEASE_SECONDS)
+        NotificationOutbox.objects.filter(pk__in=[task.pk for task in tasks]).update(available_at=leased_until)
+
+    succeeded = failed = 0
+    for task in tasks:
+        if not _renew_lease(task, leased_until):
+            # Пачка шла дольше резерва, и задачу уже взял другой воркер
+            logger.warning('Outbox task %s (%s) lease expired before it was run, skipping', task.pk, task.kind)
+            continue
+        if _run_task(task, max_attempts):
+            succeeded += 1
+        else:
+            failed += 1
+    return succeeded, failed
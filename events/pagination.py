@@ -0,0 +1,49 @@
+"""
+Keyset-пагинация по (created_at, id).
+
+Курсор - непрозрачная строка с позицией последней строки страницы. Следующая
+страница выбирается условием "строго после курсора" в порядке индекса, поэтому
+каждая страница - это сканирование диапазона индекса без OFFSET.
+"""
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+
+
+def encode_cursor(created_at, pk):
+    raw = f'{created_at.isoformat()}|{pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Возвращает (created_at, pk) или None для пустого и поврежденного курсора."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, pk = raw.split('|')
+        return datetime.fromisoformat(created_at), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def keyset_page(queryset, cursor=None, size=20, descending=True):
+    """
+    Страница queryset по (created_at, id). descending=True - от новых к старым.
+    Возвращает (строки, курсор следующей страницы или None).
+    """
+    position = decode_cursor(cursor)
+    if position is not None:
+        created_at, pk = position
+        if descending:
+            queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk))
+        else:
+            queryset = queryset.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, pk__gt=pk))
+
+    ordering = ('-created_at', '-pk') if descending else ('created_at', 'pk')
+    rows = list(queryset.order_by(*ordering)[:size + 1])
+    if len(rows) <= size:
+        return rows, None
+    rows = rows[:size]
+    return rows, encode_cursor(rows[-1].created_at, rows[-1].pk)
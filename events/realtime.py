@@ -0,0 +1,230 @@
+"""
+Доставка событий подключенным клиентам (Server-Sent Events) под ASGI.
+
+Подписчики - очереди asyncio, сгруппированные по топикам ("user:5", "channel:12").
+В очередь кладется только сигнал о событии: клиентский поток сам дочитывает
+новые строки из БД по своему курсору, поэтому потерянный или повторный
+сигнал ничего не ломает.
+
+Публикация привязана к транзакции записи:
+- на PostgreSQL через NOTIFY; его слушает один фоновый поток на процесс,
+  поэтому события из воркера очереди доходят до всех веб-процессов;
+- на остальных БД сигнал рассылается подписчикам текущего процесса после
+  коммита, а фоновый поток раз в REALTIME_POLL_SECONDS проверяет новые строки
+  зарегистрированными поллерами (только пока есть подписчики).
+
+Стоимость не зависит от числа клиентов: простаивающее соединение ждет
+на очереди и не выполняет запросов.
+"""
+import asyncio
+import json
+import logging
+import select
+import threading
+import time
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connection, connections, transaction
+
+from .constants import REALTIME_HEARTBEAT_SECONDS
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_CHANNEL = 'events_realtime'
+# Сколько топиков помещается в один NOTIFY (лимит payload - 8000 байт)
+NOTIFY_TOPICS_PER_PAYLOAD = 300
+SUBSCRIBER_QUEUE_SIZE = 100
+
+POLLERS = []
+
+
+def realtime_poller(func):
+    """
+    Регистрирует функцию опроса БД для резервного режима (не PostgreSQL).
+    func(after_id) возвращает (новый курсор, [(топик, событие), ...]);
+    при after_id=None только возвращает текущий курсор.
+    """
+    POLLERS.append(func)
+    return func
+
+
+def user_topic(user_id):
+    return f'user:{user_id}'
+
+
+def channel_topic(channel_id):
+    return f'channel:{channel_id}'
+
+
+def _put(queue, event):
+    try:
+        queue.put_nowait(event)
+    except asyncio.QueueFull:
+        # В очереди уже есть непрочитанный сигнал - подписчик все равно дочитает БД.
+        pass
+
+
+class RealtimeHub:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+        self._listener = None
+
+    def subscribe(self, *topics):
+        """Создает очередь подписчика; вызывается из работающего цикла событий."""
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        entry = (asyncio.get_running_loop(), queue)
+        with self._lock:
+            for topic in topics:
+                self._subscribers[topic].add(entry)
+        self._ensure_listener()
+        return queue
+
+    def unsubscribe(self, queue):
+        with self._lock:
+            for topic, entries in list(self._subscribers.items()):
+                entries.difference_update({entry for entry in entries if entry[1] is queue})
+                if not entries:
+                    del self._subscribers[topic]
+
+    def has_subscribers(self):
+        with self._lock:
+            return bool(self._subscribers)
+
+    def dispatch(self, topics, event):
+        with self._lock:
+            targets = {entry for topic in topics for entry in self._subscribers.get(topic, ())}
+        for loop, queue in targets:
+            try:
+                loop.call_soon_threadsafe(_put, queue, event)
+            except RuntimeError:
+                # Цикл событий уже закрыт - подписчик отключился.
+                pass
+
+    def _ensure_listener(self):
+        interval = getattr(settings, 'REALTIME_POLL_SECONDS', 2)
+        if connection.vendor != 'postgresql' and not interval:
+            return
+        with self._lock:
+            if self._listener is not None and self._listener.is_alive():
+                return
+            self._listener = threading.Thread(target=self._run_listener, name='realtime-listener', daemon=True)
+            self._listener.start()
+
+    def _run_listener(self):
+        while True:
+            try:
+                if connection.vendor == 'postgresql':
+                    self._listen_postgres()
+                else:
+                    self._poll_database()
+            except Exception:
+                logger.exception('Realtime listener failed, restarting')
+                time.sleep(5)
+
+    def _listen_postgres(self):
+        wrapper = connections['default']
+        conn = wrapper.get_new_connection(wrapper.get_connection_params())
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(f'LISTEN {NOTIFY_CHANNEL}')
+            while True:
+                if select.select([conn], [], [], 60) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    payload = json.loads(conn.notifies.pop(0).payload)
+                    self.dispatch(payload['topics'], payload['event'])
+        finally:
+            conn.close()
+
+    def _poll_database(self):
+        interval = getattr(settings, 'REALTIME_POLL_SECONDS', 2)
+        cursors = {}
+        try:
+            while True:
+                if self.has_subscribers():
+                    for poller in POLLERS:
+                        cursor, events = poller(cursors.get(poller))
+                        cursors[poller] = cursor
+                        for topic, event in events:
+                            self.dispatch([topic], event)
+                else:
+                    # Без подписчиков курсоры сбрасываются, чтобы не догонять старые строки.
+                    cursors.clear()
+                close_old_connections()
+                time.sleep(interval)
+        finally:
+            connection.close()
+
+
+hub = RealtimeHub()
+
+
+def publish(topics, event):
+    """
+    Сообщает подписчикам топиков о событии после коммита текущей транзакции.
+    При откате транзакции сигнал не отправляется.
+    """
+    topics = list(dict.fromkeys(topics))
+    if not topics:
+        return
+    if connection.vendor == 'postgresql':
+        # NOTIFY внутри транзакции доставляется слушателям только после COMMIT.
+        with connection.cursor() as cursor:
+            for offset in range(0, len(topics), NOTIFY_TOPICS_PER_PAYLOAD):
+                payload = json.dumps({'event': event, 'topics': topics[offset:offset + NOTIFY_TOPICS_PER_PAYLOAD]})
+                cursor.execute('SELECT pg_notify(%s, %s)', [NOTIFY_CHANNEL, payload])
+    else:
+        transaction.on_commit(lambda: hub.dispatch(topics, event))
+
+
+def format_sse(event, data, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {event}')
+    lines.append(f'data: {json.dumps(data, ensure_ascii=False)}')
+    return '\n'.join(lines) + '\n\n'
+
+
+def _fetch_closing(fetch, cursor):
+    try:
+        return fetch(cursor)
+    finally:
+        # Соединение не удерживается между пробуждениями долгоживущего потока.
+        if not connection.in_atomic_block:
+            connection.close()
+
+
+async def event_stream(topic, fetch, cursor=None):
+    """
+    Поток Server-Sent Events по топику.
+
+    fetch(cursor) - синхронная функция (выполняется в потоке), которая дочитывает
+    изменения после курсора и возвращает (новый курсор, [готовые строки SSE],
+    есть ли еще данные сразу). Между изменениями соединение ждет сигнала топика
+    и не обращается к БД; раз в REALTIME_HEARTBEAT_SECONDS отправляется пинг.
+    """
+    async_fetch = sync_to_async(_fetch_closing)
+    # Подписка до чтения курсора, чтобы не пропустить событие между ними.
+    queue = hub.subscribe(topic)
+    try:
+        cursor, events, has_more = await async_fetch(fetch, cursor)
+        yield 'retry: 5000\n\n'
+        while True:
+            for event in events:
+                yield event
+            # Есть еще данные - дочитываем сразу, иначе ждем сигнала.
+            while not has_more:
+                try:
+                    await asyncio.wait_for(queue.get(), timeout=REALTIME_HEARTBEAT_SECONDS)
+                    break
+                except asyncio.TimeoutError:
+                    yield ': ping\n\n'
+            cursor, events, has_more = await async_fetch(fetch, cursor)
+    finally:
+        hub.unsubscribe(queue)
@@ -0,0 +1,147 @@
+"""
+Полнотекстовый поиск по сообщениям чата.
+
+- PostgreSQL: GIN-индекс по выражению to_tsvector(SEARCH_CONFIG, content),
+  запрос через websearch_to_tsquery, фрагменты через ts_headline;
+- SQLite: внешняя FTS5-таблица над events_chatmessage, которую поддерживают
+  триггеры, фрагменты через snippet();
+- остальные БД: поиск подстроки без индекса.
+
+Индексы создаются миграцией функциями install_search_index/drop_search_index.
+Фрагменты размечаются служебными символами, а не HTML: текст сообщения
+экранируется целиком, и только потом маркеры заменяются на <mark>.
+"""
+import re
+
+from django.db import connection
+from django.db.models import BooleanField, CharField
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+SEARCH_CONFIG = 'russian'
+FTS_TABLE = 'events_chatmessage_fts'
+MESSAGE_TABLE = 'events_chatmessage'
+HIGHLIGHT_START = '\x02'
+HIGHLIGHT_STOP = '\x03'
+SNIPPET_WORDS = 16
+
+_FTS_TRIGGERS = (
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {MESSAGE_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, content) VALUES (new.id, new.content);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {MESSAGE_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, content) VALUES ('delete', old.id, old.content);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF content ON {MESSAGE_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, content) VALUES ('delete', old.id, old.content);
+        INSERT INTO {FTS_TABLE}(rowid, content) VALUES (new.id, new.content);
+    END
+    """,
+)
+
+
+def install_search_index(schema_editor):
+    """Создает индекс поиска для текущей БД и заполняет его существующими сообщениями."""
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS chatmessage_search_idx ON {MESSAGE_TABLE} '
+            f"USING GIN (to_tsvector('{SEARCH_CONFIG}', content))"
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5('
+            f"content, content='{MESSAGE_TABLE}', content_rowid='id', "
+            "tokenize='unicode61 remove_diacritics 2')"
+        )
+        install_sqlite_triggers(schema_editor)
+        schema_editor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def install_sqlite_triggers(schema_editor):
+    """
+    Триггеры FTS5. SQLite удаляет их при пересоздании таблицы сообщений,
+    поэтому миграции, которые пересобирают events_chatmessage, вызывают эту функцию снова.
+    """
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in _FTS_TRIGGERS:
+        schema_editor.execute(statement)
+
+
+def drop_search_index(schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS chatmessage_search_idx')
+    elif vendor == 'sqlite':
+        for suffix in ('ai', 'ad', 'au'):
+            schema_editor.execute(f'DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}')
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+def _fts_query(query):
+    """Слова запроса как строки FTS5 (без операторов), последнее - по префиксу."""
+    terms = re.findall(r'\w+', query)
+    if not terms:
+        return ''
+    quoted = ['"{}"'.format(term.replace('"', '""')) for term in terms]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def search_messages(queryset, query):
+    """
+    Фильтрует queryset сообщений по запросу и добавляет аннотацию snippet
+    с сырым фрагментом (маркеры HIGHLIGHT_START/STOP). Пустой запрос - пустой результат.
+    """
+    query = query.strip()
+    if not query:
+        return queryset.none()
+    vendor = connection.vendor
+    if vendor == 'postgresql':
+        tsquery = f"websearch_to_tsquery('{SEARCH_CONFIG}', %s)"
+        return queryset.alias(
+            matched=RawSQL(
+                f"to_tsvector('{SEARCH_CONFIG}', {MESSAGE_TABLE}.content) @@ {tsquery}",
+                [query],
+                output_field=BooleanField(),
+            )
+        ).filter(matched=True).annotate(
+            snippet=RawSQL(
+                f"ts_headline('{SEARCH_CONFIG}', {MESSAGE_TABLE}.content, {tsquery}, "
+                f"'StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_STOP}, MaxWords={SNIPPET_WORDS}, MinWords=5')",
+                [query],
+                output_field=CharField(),
+            )
+        )
+
+    if vendor == 'sqlite':
+        fts_query = _fts_query(query)
+        if not fts_query:
+            return queryset.none()
+        return queryset.filter(
+            id__in=RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [fts_query])
+        ).annotate(
+            snippet=RawSQL(
+                f"SELECT snippet({FTS_TABLE}, 0, '{HIGHLIGHT_START}', '{HIGHLIGHT_STOP}', '…', {SNIPPET_WORDS}) "
+                f'FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rowid = {MESSAGE_TABLE}.id',
+                [fts_query],
+                output_field=CharField(),
+            )
+        )
+
+    return queryset.filter(content__icontains=query).annotate(
+        snippet=RawSQL(f'{MESSAGE_TABLE}.content', [], output_field=CharField())
+    )
+
+
+def highlight_snippet(snippet):
+    """Экранирует фрагмент и заменяет маркеры совпадений на <mark>."""
+    html = escape(snippet or '')
+    return mark_safe(html.replace(HIGHLIGHT_START, '<mark>').replace(HIGHLIGHT_STOP, '</mark>'))
@@ -1,7 +1,20 @@
-from django.db.models import Count, Q
+from bisect import bisect_left
 
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .caching import get_read_markers
 from .constants import APPROVED_REGISTRATION_STATUSES
-from .models import ChatChannel, ChatChannelMembership, ChatMessage, Event, EventRegistration
+from .models import (
+    ChatChannel,
+    ChatChannelMembership,
+    Event,
+    EventRegistration,
+    UserProfile,
+    XpRollup,
+    period_start_for,
+)
 
 
 def events_base_queryset():
@@ -18,6 +31,82 @@ def events_base_queryset():
     )
 
 
+LEADERBOARD_ORDERING = ('-xp', '-completed_events', 'id')
+
+
+def volunteer_ranking_queryset(city=''):
+    """Волонтеры в порядке рейтинга; порядок совпадает с profile_ranking_idx."""
+    volunteers = UserProfile.objects.filter(role='volunteer')
+    if city:
+        volunteers = volunteers.filter(city=city)
+    return volunteers.order_by(*LEADERBOARD_ORDERING)
+
+
+def _ranked_above(profile):
+    return (
+        Q(xp__gt=profile.xp)
+        | Q(xp=profile.xp, completed_events__gt=profile.completed_events)
+        | Q(xp=profile.xp, completed_events=profile.completed_events, id__lt=profile.id)
+    )
+
+
+def _ranked_below(profile):
+    return (
+        Q(xp__lt=profile.xp)
+        | Q(xp=profile.xp, completed_events__lt=profile.completed_events)
+        | Q(xp=profile.xp, completed_events=profile.completed_events, id__gt=profile.id)
+    )
+
+
+def volunteer_ranking_after(position, city=''):
+    """
+    Волонтеры строго после позиции (xp, completed_events, id) в порядке рейтинга -
+    диапазон по индексу рейтинга без OFFSET.
+    """
+    xp, completed_events, pk = position
+    return volunteer_ranking_queryset(city).filter(
+        _ranked_below(UserProfile(pk=pk, xp=xp, completed_events=completed_events))
+    )
+
+
+def volunteer_rank(profile, city=''):
+    """Место волонтера в рейтинге: один COUNT по индексу профилей с большим ключом."""
+    return volunteer_ranking_queryset(city).filter(_ranked_above(profile)).count() + 1
+
+
+def leaderboard_neighbours(profile, radius=2, city=''):
+    """
+    Возвращает (rank, profile) для волонтеров вокруг указанного профиля.
+    Соседи выбираются двумя короткими диапазонами по индексу, без OFFSET.
+    """
+    rank = volunteer_rank(profile, city)
+    ranking = volunteer_ranking_queryset(city).select_related('user').prefetch_related('skills')
+    above = list(ranking.filter(_ranked_above(profile)).order_by('xp', 'completed_events', '-id')[:radius])
+    below = list(ranking.filter(_ranked_below(profile))[:radius])
+
+    neighbours = [(rank - idx, item) for idx, item in enumerate(above, start=1)]
+    neighbours.reverse()
+    neighbours.append((rank, profile))
+    neighbours.extend((rank + idx, item) for idx, item in enumerate(below, start=1))
+    return neighbours
+
+
+def period_leaderboard_queryset(period, city='', day=None):
+    """Рейтинг за неделю/месяц: диапазон по индексу агрегатов, без обхода истории."""
+    period_start = period_start_for(period, day or timezone.localdate())
+    return (
+        XpRollup.objects.filter(
+            period=period,
+            period_start=period_start,
+            city=city,
+            volunteer__profile__role='volunteer',
+        )
+        .select_related('volunteer__profile')
+        .prefetch_related('volunteer__profile__skills')
+        .order_by('-xp', '-events_completed', 'volunteer_id')
+    )
+
+
 def user_can_access_event_chat(user, event):
     if not user.is_authenticated:
         return False
@@ -62,24 +151,92 @@ def available_channels_for_user(user):
     )
 
 
-def unread_message_counts_by_channel(user, channels):
-    memberships = list(
-        ChatChannelMembership.objects.filter(channel__in=channels, user=user)
-        .values('channel_id', 'last_read_at')
+def user_can_access_channel(user, channel):
+    """
+    Есть ли у пользователя доступ к каналу - то же правило, что в
+    available_channels_for_user, но точечными запросами по уникальным индексам
+    (организатор события, участник канала, одобренная заявка волонтера).
+    Ответ запоминается на объекте пользователя, то есть на время запроса.
+    """
+    if not user.is_authenticated or channel.is_archived or channel.event_id is None:
+        return False
+
+    checked = user.__dict__.setdefault('_channel_access', {})
+    if channel.pk not in checked:
+        checked[channel.pk] = _check_channel_access(user, channel)
+    return checked[channel.pk] is not None
+
+
+def user_is_channel_member(user, channel):
+    """Состоит ли пользователь в канале (по той же запомненной проверке доступа)."""
+    return user_can_access_channel(user, channel) and user._channel_access[channel.pk] == 'member'
+
+
+def user_moderates_channel(user, channel):
+    """Организатор события может удалять чужие сообщения в каналах события."""
+    return user.is_authenticated and channel.event_id is not None and channel.event.organizer_id == user.pk
+
+
+def _check_channel_access(user, channel):
+    """Основание доступа: 'member', 'organizer', 'registration' или None."""
+    if ChatChannelMembership.objects.filter(channel=channel, user=user).exists():
+        return 'member'
+    if user.profile.is_organizer:
+        if Event.objects.filter(pk=channel.event_id, organizer=user).exists():
+            return 'organizer'
+        return None
+    if EventRegistration.objects.filter(
+        event_id=channel.event_id,
+        volunteer=user,
+        status__in=APPROVED_REGISTRATION_STATUSES,
+    ).exists():
+        return 'registration'
+    return None
+
+
+def channel_inbox_for_user(user):
+    """
+    Доступные каналы с последним сообщением, его автором и счетчиком
+    непрочитанных (атрибут unread) - одним запросом.
+    """
+    unread = ChatChannelMembership.objects.filter(channel=OuterRef('pk'), user=user).values('unread_count')[:1]
+    return (
+        available_channels_for_user(user)
+        .select_related('last_message__author')
+        .annotate(unread=Coalesce(Subquery(unread), 0))
     )
-    unread_by_channel = {item['channel_id']: 0 for item in memberships}
-
-    unread_filter = Q()
-    for item in memberships:
-        unread_filter |= Q(channel_id=item['channel_id'], created_at__gt=item['last_read_at'])
-
-    if unread_filter:
-        unread_counts = (
-            ChatMessage.objects.filter(unread_filter)
-            .exclude(author=user)
-            .values('channel_id')
-            .annotate(total=Count('id'))
-        )
-        unread_by_channel.update({item['channel_id']: item['total'] for item in unread_counts})
 
-    return unread_by_channel
+
+def apply_buffered_reads(user, channels):
+    """
+    Учитывает еще не сброшенные в БД отметки прочтения: канал, прочитанный
+    после своего последнего сообщения, показывается без непрочитанных.
+    Ожидает каналы из channel_inbox_for_user.
+    """
+    markers = get_read_markers([(channel.pk, user.pk) for channel in channels])
+    for channel in channels:
+        read_at = markers.get((channel.pk, user.pk))
+        if read_at is not None and (channel.last_message is None or channel.last_message.created_at <= read_at):
+            channel.unread = 0
+    return channels
+
+
+def attach_read_receipts(channel, chat_messages, user):
+    """
+    Проставляет своим сообщениям пользователя read_count - сколько других
+    участников канала прочитали их, по last_read_at и несброшенным отметкам из кеша.
+    """
+    own = [message for message in chat_messages if message.author_id == user.pk]
+    if not own:
+        return chat_messages
+    read_times = dict(
+        ChatChannelMembership.objects.filter(channel=channel)
+        .exclude(user=user)
+        .values_list('user_id', 'last_read_at')
+    )
+    for (_, user_id), read_at in get_read_markers([(channel.pk, user_id) for user_id in read_times]).items():
+        read_times[user_id] = max(read_times[user_id], read_at)
+    ordered = sorted(read_times.values())
+    for message in own:
+        message.read_count = len(ordered) - bisect_left(ordered, message.created_at)
+    return chat_messages
@@ -1,9 +1,59 @@
-from django.db import IntegrityError
+import logging
+import time
+from datetime import datetime, time as dt_time, timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Exists, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.urls import reverse
+from django.utils import timezone
 from django.utils.http import url_has_allowed_host_and_scheme
 
-from .constants import REAPPLY_REGISTRATION_STATUSES
-from .models import ChatChannelMembership, EventRegistration, Notification, User
+from .caching import (
+    acknowledge_read_markers,
+    acquire_read_marker_lock,
+    buffer_read_marker,
+    cache_is_shared,
+    claim_read_markers,
+    get_broadcast_cursor,
+    get_latest_broadcast_id,
+    get_read_markers,
+    get_unread_count,
+    invalidate_unread_counts,
+    read_markers_flush_due,
+    release_read_marker_lock,
+    remember_broadcast_cursor,
+    remember_latest_broadcast_id,
+)
+from .constants import (
+    APPROVED_REGISTRATION_STATUSES,
+    BROADCAST_DELIVERY_LIMIT,
+    FANOUT_CHUNK_SIZE,
+    READ_MARKER_FLUSH_BATCH,
+    READ_MARKER_FLUSH_SECONDS,
+    REAPPLY_REGISTRATION_STATUSES,
+    REMINDER_DEFAULT_EVENT_TIME,
+    REMINDER_LEAD_MINUTES,
+)
+from .models import (
+    BroadcastNotification,
+    ChatChannelMembership,
+    ChatMessage,
+    Event,
+    EventRegistration,
+    EventReminder,
+    Notification,
+    NotificationPreference,
+    User,
+    UserProfile,
+    latest_broadcast_id,
+    muted_notification,
+    next_channel_seq,
+)
+from .outbox import enqueue, outbox_handler, save_progress
+from .realtime import channel_topic, publish, realtime_poller, user_topic
+
+logger = logging.getLogger(__name__)
 
 
 def safe_redirect_target(request, fallback='event_list'):
@@ -18,8 +68,10 @@ def safe_redirect_target(request, fallback='event_list'):
 
 
 def add_volunteer_to_event_channels(user, event):
-    for channel in event.chat_channels.all():
-        ChatChannelMembership.objects.get_or_create(channel=channel, user=user)
+    ChatChannelMembership.objects.bulk_create(
+        [ChatChannelMembership(channel=channel, user=user) for channel in event.chat_channels.all()],
+        ignore_conflicts=True,
+    )
 
 
 def remove_volunteer_from_event_channels(user, event):
@@ -66,97 +118,588 @@ def submit_event_registration(form, event, volunteer, existing_registration=None
                 should_notify_organizer = False
                 success_message = 'Вы уже записаны на это событие.'
 
-    # Отправляем уведомления
+    # Уведомления создаст воркер очереди
     if should_notify_organizer:
-        Notification.objects.create(
-            user=event.organizer,
+        enqueue('new_application', registration_id=registration.pk)
+    return registration, success_message
+
+
+@outbox_handler('new_application')
+def deliver_new_application(registration_id):
+    registration = (
+        EventRegistration.objects.select_related('event', 'volunteer')
+        .filter(pk=registration_id)
+        .first()
+    )
+    if registration is None:
+        return
+    event = registration.event
+    volunteer = registration.volunteer
+    Notification.objects.bulk_create([
+        Notification(
+            user_id=event.organizer_id,
             type='new_application',
             title='Новая заявка на событие',
             message=f'{volunteer.get_full_name()} подал заявку на событие "{event.title}".',
             related_event=event,
             related_registration=registration,
-        )
-        Notification.objects.create(
+        ),
+        Notification(
             user=volunteer,
             type='new_application',
             title='Заявка отправлена',
             message=f'Ваша заявка на событие "{event.title}" была отправлена организатору.',
             related_event=event,
             related_registration=registration,
-        )
-    return registration, success_message
+        ),
+    ])
 
 
 def notify_registration_approved(registration, event):
+    enqueue('registration_approved', registration_id=registration.pk)
+
+
+@outbox_handler('registration_approved')
+def deliver_registration_approved(registration_id):
+    registration = EventRegistration.objects.select_related('event').filter(pk=registration_id).first()
+    if registration is None:
+        return
     Notification.objects.create(
-        user=registration.volunteer,
+        user_id=registration.volunteer_id,
         type='application_approved',
         title='Заявка одобрена!',
-        message=f'Ваша заявка на событие "{event.title}" была одобрена.',
-        related_event=event,
+        message=f'Ваша заявка на событие "{registration.event.title}" была одобрена.',
+        related_event=registration.event,
         related_registration=registration,
     )
 
 
 def notify_registration_rejected(registration, event):
+    enqueue('registration_rejected', registration_id=registration.pk)
+
+
+@outbox_handler('registration_rejected')
+def deliver_registration_rejected(registration_id):
+    registration = EventRegistration.objects.select_related('event').filter(pk=registration_id).first()
+    if registration is None:
+        return
     Notification.objects.create(
-        user=registration.volunteer,
+        user_id=registration.volunteer_id,
         type='application_rejected',
         title='Заявка отклонена',
-        message=f'К сожалению, ваша заявка на событие "{event.title}" была отклонена.',
-        related_event=event,
+        message=f'К сожалению, ваша заявка на событие "{registration.event.title}" была отклонена.',
+        related_event=registration.event,
         related_registration=registration,
     )
 
 
-def add_approved_volunteers_to_channel(channel, event):
-    approved_volunteers = (
-        EventRegistration.objects.filter(
-            event=event,
-            status__in=['approved', 'completed'],
-        )
-        .select_related('volunteer')
-        .distinct()
+def event_channel_member_ids(event):
+    """Кто должен состоять в каналах события: организатор и одобренные волонтеры."""
+    volunteer_ids = EventRegistration.objects.filter(
+        event=event,
+        status__in=APPROVED_REGISTRATION_STATUSES,
+    ).values_list('volunteer_id', flat=True)
+    return {event.organizer_id, *volunteer_ids}
+
+
+def sync_channel_members(channel, user_ids):
+    """
+    Приводит участников канала к набору user_ids: одно чтение текущих
+    участников, один bulk_create недостающих и один DELETE лишних.
+    Счетчики и last_read_at оставшихся участников не меняются.
+    Возвращает (добавлено, удалено).
+    """
+    desired = set(user_ids)
+    existing = set(ChatChannelMembership.objects.filter(channel=channel).values_list('user_id', flat=True))
+
+    missing = desired - existing
+    ChatChannelMembership.objects.bulk_create(
+        [ChatChannelMembership(channel=channel, user_id=user_id) for user_id in missing],
+        batch_size=FANOUT_CHUNK_SIZE,
+        ignore_conflicts=True,
     )
-    for registration in approved_volunteers:
-        ChatChannelMembership.objects.get_or_create(channel=channel, user=registration.volunteer)
+    removed = 0
+    extra = existing - desired
+    if extra:
+        removed, _ = ChatChannelMembership.objects.filter(channel=channel, user_id__in=extra).delete()
+    return len(missing), removed
 
 
 def notify_event_created(event, exclude_user=None):
-    """Отправляет уведомления волонтерам о создании нового события"""
-    volunteers = User.objects.filter(profile__role='volunteer')
-    if exclude_user:
-        volunteers = volunteers.exclude(id=exclude_user.id)
-    
-    notifications = [
-        Notification(
-            user=volunteer,
-            type='new_event',
-            title='Новое событие!',
-            message=f'Появилось новое событие: "{event.title}"',
-            related_event=event,
+    """
+    Сообщает волонтерам о новом событии одной записью-рассылкой.
+    Персональные уведомления создаются при чтении ленты (deliver_pending_broadcasts).
+    """
+    enqueue('event_created', event_id=event.pk, exclude_user_id=exclude_user.pk if exclude_user else None)
+
+
+@outbox_handler('event_created')
+def deliver_event_created(event_id, exclude_user_id=None):
+    event = Event.objects.filter(pk=event_id).first()
+    if event is None:
+        return None
+    broadcast = BroadcastNotification.objects.create(
+        type='new_event',
+        title='Новое событие!',
+        message=f'Появилось новое событие: "{event.title}"',
+        audience_role='volunteer',
+        related_event=event,
+        created_by_id=exclude_user_id,
+    )
+    transaction.on_commit(lambda: remember_latest_broadcast_id(broadcast.pk))
+    return broadcast
+
+
+def deliver_pending_broadcasts(user):
+    """
+    Подмешивает в ленту пользователя рассылки, появившиеся после его курсора.
+    Рассылки читаются от старых к новым пачками по BROADCAST_DELIVERY_LIMIT,
+    курсор сдвигается только до последней доставленной пачки.
+    Если новых рассылок нет, обходится одним поиском по первичному ключу.
+    """
+    profile = user.profile
+    latest_id = latest_broadcast_id()
+    remember_latest_broadcast_id(latest_id)
+    if latest_id <= profile.last_broadcast_id:
+        remember_broadcast_cursor(user.pk, profile.last_broadcast_id)
+        return 0
+
+    pending_broadcasts = (
+        BroadcastNotification.objects.filter(
+            ~Exists(
+                NotificationPreference.objects.filter(user=user, type=OuterRef('type'), muted=True)
+            ),
+            audience_role=profile.role,
+            id__lte=latest_id,
         )
-        for volunteer in volunteers
-    ]
-    Notification.objects.bulk_create(notifications, ignore_conflicts=True)
+        .exclude(created_by=user)
+        .order_by('id')
+    )
+    delivered = 0
+    cursor = profile.last_broadcast_id
+    while cursor < latest_id:
+        batch = list(pending_broadcasts.filter(id__gt=cursor)[:BROADCAST_DELIVERY_LIMIT])
+        Notification.objects.bulk_create(
+            [
+                Notification(
+                    user=user,
+                    type=broadcast.type,
+                    title=broadcast.title,
+                    message=broadcast.message,
+                    related_event_id=broadcast.related_event_id,
+                    broadcast=broadcast,
+                    created_at=broadcast.created_at,
+                )
+                for broadcast in batch
+            ],
+            ignore_conflicts=True,
+        )
+        delivered += len(batch)
+        # Неполная пачка - рассылок для пользователя до latest_id больше нет
+        cursor = batch[-1].id if len(batch) == BROADCAST_DELIVERY_LIMIT else latest_id
+        UserProfile.objects.filter(pk=profile.pk, last_broadcast_id__lt=cursor).update(last_broadcast_id=cursor)
+
+    profile.last_broadcast_id = latest_id
+    if delivered:
+        # bulk_create не вызывает сигналы, поэтому счетчик пересчитается из БД
+        transaction.on_commit(lambda: invalidate_unread_counts([user.pk]))
+    transaction.on_commit(lambda: remember_broadcast_cursor(user.pk, latest_id))
+    return delivered
+
+
+def unread_notification_count(user):
+    """
+    Число непрочитанных уведомлений пользователя. Если счетчик и id последней
+    рассылки есть в общем кеше и новых рассылок не появлялось, запросов к БД не выполняется.
+    """
+    cursor = get_broadcast_cursor(user.pk)
+    if cursor is None or cursor < get_latest_broadcast_id(latest_broadcast_id):
+        deliver_pending_broadcasts(user)
+    return get_unread_count(
+        user.pk,
+        lambda: Notification.objects.filter(user=user, is_read=False).count(),
+    )
+
+
+@realtime_poller
+def poll_new_notifications(after_id):
+    """Резервный опрос для БД без LISTEN/NOTIFY: сигналы о новых уведомлениях."""
+    if after_id is None:
+        return Notification.objects.order_by('-id').values_list('id', flat=True).first() or 0, []
+    rows = list(
+        Notification.objects.filter(id__gt=after_id)
+        .order_by('id')
+        .values_list('id', 'user_id')[:FANOUT_CHUNK_SIZE]
+    )
+    if not rows:
+        return after_id, []
+    return rows[-1][0], [(user_topic(user_id), 'notification') for user_id in {row[1] for row in rows}]
+
+
+@realtime_poller
+def poll_new_chat_messages(after_id):
+    """Резервный опрос для БД без LISTEN/NOTIFY: сигналы о новых сообщениях чата."""
+    if after_id is None:
+        return ChatMessage.objects.order_by('-id').values_list('id', flat=True).first() or 0, []
+    rows = list(
+        ChatMessage.objects.filter(id__gt=after_id)
+        .order_by('id')
+        .values_list('id', 'channel_id')[:FANOUT_CHUNK_SIZE]
+    )
+    if not rows:
+        return after_id, []
+    return rows[-1][0], [(channel_topic(channel_id), 'message') for channel_id in {row[1] for row in rows}]
+
+
+def fan_out_notifications(recipient_ids, build_notification, task=None, after_id=0,
+                          id_field='id', chunk_size=FANOUT_CHUNK_SIZE, label='fan-out',
+                          coalesce=None):
+    """
+    Создает уведомления для получателей пачками по chunk_size.
+
+    recipient_ids - queryset из values_list(<id_field>, flat=True). Получатели
+    читаются потоком через iterator(), в памяти держится только одна пачка.
+    Каждая пачка вставляется в своей транзакции вместе с курсором задачи
+    очереди, поэтому после сбоя рассылка продолжается с места остановки.
+
+    coalesce(user_ids) - необязательная функция, которая обновляет уже
+    существующие уведомления пачки и возвращает id их получателей; для них
+    новые строки не вставляются.
+    """
+    started = time.monotonic()
+    recipients = batches = coalesced = 0
+    batch = []
+    last_id = after_id
+
+    def flush():
+        nonlocal batches, coalesced
+        with transaction.atomic():
+            if coalesce is None:
+                Notification.objects.bulk_create(batch)
+            else:
+                covered = coalesce([notification.user_id for notification in batch])
+                coalesced += len(covered)
+                # Конфликт с параллельно вставленной строкой не ошибка: уведомление уже есть.
+                Notification.objects.bulk_create(
+                    [notification for notification in batch if notification.user_id not in covered],
+                    ignore_conflicts=True,
+                )
+            if task is not None:
+                save_progress(task, after_id=last_id)
+        batches += 1
+
+    ids = (
+        recipient_ids.filter(**{f'{id_field}__gt': after_id})
+        .order_by(id_field)
+        .distinct()
+        .iterator(chunk_size=chunk_size)
+    )
+    for user_id in ids:
+        batch.append(build_notification(user_id))
+        last_id = user_id
+        if len(batch) >= chunk_size:
+            flush()
+            recipients += len(batch)
+            batch = []
+    if batch:
+        flush()
+        recipients += len(batch)
+
+    elapsed = time.monotonic() - started
+    stats = {
+        'recipients': recipients,
+        'batches': batches,
+        'coalesced': coalesced,
+        'seconds': round(elapsed, 3),
+        'per_second': round(recipients / elapsed) if elapsed else recipients,
+    }
+    logger.info(
+        'Fan-out %s: %s recipients (%s coalesced) in %s batches, %.3fs (%s/s)',
+        label, stats['recipients'], coalesced, stats['batches'], elapsed, stats['per_second'],
+    )
+    return stats
 
 
 def notify_event_updated(event, participants=None):
     """Отправляет уведомления участникам события об его обновлении"""
-    if participants is None:
-        participants = User.objects.filter(
+    participant_ids = None
+    if participants is not None:
+        participant_ids = [participant.pk for participant in participants]
+    enqueue('event_updated', event_id=event.pk, participant_ids=participant_ids)
+
+
+@outbox_handler('event_updated', streaming=True)
+def deliver_event_updated(event_id, participant_ids=None, after_id=0, task=None):
+    event = Event.objects.filter(pk=event_id).first()
+    if event is None:
+        return None
+    if participant_ids is None:
+        recipients = User.objects.filter(
             event_registrations__event=event,
             event_registrations__status__in=['approved', 'completed']
-        ).distinct()
-    
-    notifications = [
-        Notification(
-            user=participant,
+        )
+    else:
+        recipients = User.objects.filter(pk__in=participant_ids)
+    recipients = recipients.filter(~muted_notification('new_event'))
+
+    return fan_out_notifications(
+        recipients.values_list('id', flat=True),
+        lambda user_id: Notification(
+            user_id=user_id,
             type='new_event',  # TODO: Создать отдельный тип 'event_updated' в модели Notification
             title='Событие обновлено',
             message=f'Событие "{event.title}" было обновлено организатором.',
             related_event=event,
+        ),
+        task=task,
+        after_id=after_id,
+        label=f'event_updated:{event.pk}',
+    )
+
+
+def edit_chat_message(message, content):
+    """Меняет текст сообщения и записывает изменение под новым номером канала."""
+    with transaction.atomic():
+        message.seq = next_channel_seq(message.channel_id)
+        message.content = content
+        message.edited_at = timezone.now()
+        message.save(update_fields=['content', 'edited_at', 'seq'])
+        publish([channel_topic(message.channel_id)], 'message')
+    return message
+
+
+def delete_chat_message(message):
+    """
+    Мягкое удаление: строка остается, клиенты получают изменение с новым номером.
+    Текст стирается сразу (вместе с ним - из поискового индекса и превью уведомлений):
+    модератор удаляет сообщение, чтобы убрать его содержимое.
+    """
+    with transaction.atomic():
+        message.seq = next_channel_seq(message.channel_id)
+        message.is_deleted = True
+        message.deleted_at = timezone.now()
+        message.content = ''
+        message.save(update_fields=['is_deleted', 'deleted_at', 'content', 'seq'])
+        Notification.objects.filter(related_message=message).update(message=chat_message_preview(message))
+        publish([channel_topic(message.channel_id)], 'message')
+    return message
+
+
+def chat_message_preview(message):
+    """Текст уведомления о сообщении чата: автор и начало сообщения."""
+    sender_name = message.author.get_full_name() or message.author.username
+    content = 'Сообщение удалено' if message.is_deleted else message.content[:80]
+    return f'{sender_name}: {content}'
+
+
+def mark_channel_read(channel_id, user_id):
+    """
+    Отмечает канал прочитанным. Время пишется в кеш; в БД отметки переносит
+    flush_read_markers - командой flush_chat_read_markers или из запроса, когда
+    в журнале набралось READ_MARKER_FLUSH_BATCH пар либо прошло READ_MARKER_FLUSH_SECONDS.
+    Повторные чтения пары, уже ждущей сброса, в БД не пишут.
+    Без общего кеша отметка сразу пишется в БД одним UPDATE.
+    """
+    if not cache_is_shared():
+        ChatChannelMembership.objects.filter(channel_id=channel_id, user_id=user_id).update(
+            last_read_at=timezone.now(),
+            unread_count=0,
+        )
+        return
+    position = buffer_read_marker(channel_id, user_id, timezone.now())
+    if position is None:
+        return
+    if position % READ_MARKER_FLUSH_BATCH == 0 or read_markers_flush_due(READ_MARKER_FLUSH_SECONDS):
+        flush_read_markers()
+
+
+def flush_read_markers(batch_size=READ_MARKER_FLUSH_BATCH):
+    """
+    Переносит пачку отметок прочтения из кеша в ChatChannelMembership:
+    last_read_at - одним bulk_update, unread_count пересчитывается одним UPDATE
+    по сообщениям после новой отметки. Возвращает число обработанных пар
+    (0 - журнал пуст или сброс уже идет в другом процессе).
+    """
+    if not acquire_read_marker_lock():
+        return 0
+    try:
+        pairs, position = claim_read_markers(batch_size)
+        if pairs is None:
+            return 0
+        markers = get_read_markers(pairs)
+        memberships = [
+            membership
+            for membership in ChatChannelMembership.objects.filter(
+                channel_id__in={channel_id for channel_id, _ in markers},
+                user_id__in={user_id for _, user_id in markers},
+            ).only('id', 'channel_id', 'user_id', 'last_read_at')
+            if (membership.channel_id, membership.user_id) in markers
+        ]
+        changed = []
+        for membership in memberships:
+            read_at = markers[(membership.channel_id, membership.user_id)]
+            if read_at > membership.last_read_at:
+                membership.last_read_at = read_at
+                changed.append(membership)
+
+        if changed:
+            unread = (
+                ChatMessage.objects.filter(
+                    channel_id=OuterRef('channel_id'),
+                    created_at__gt=OuterRef('last_read_at'),
+                )
+                .exclude(author_id=OuterRef('user_id'))
+                .order_by()
+                .values('channel_id')
+                .annotate(count=Count('id'))
+                .values('count')
+            )
+            with transaction.atomic():
+                ChatChannelMembership.objects.bulk_update(changed, ['last_read_at'], batch_size=FANOUT_CHUNK_SIZE)
+                ChatChannelMembership.objects.filter(id__in=[membership.id for membership in changed]).update(
+                    unread_count=Coalesce(Subquery(unread), 0)
+                )
+        acknowledge_read_markers(position)
+        return len(pairs)
+    finally:
+        release_read_marker_lock()
+
+
+def notify_new_chat_message(message):
+    enqueue('chat_message', message_id=message.pk)
+
+
+@outbox_handler('chat_message', streaming=True)
+def deliver_chat_message(message_id, after_id=0, task=None):
+    message = (
+        ChatMessage.objects.select_related('channel', 'author')
+        .filter(pk=message_id)
+        .first()
+    )
+    # Удаленное до доставки сообщение не рассылается
+    if message is None or message.is_deleted:
+        return None
+    channel = message.channel
+    # Получатели сводок узнают о сообщениях из send_message_digests
+    recipient_ids = ChatChannelMembership.objects.filter(
+        ~muted_notification('new_message', 'user_id'),
+        channel=channel,
+        notifications_enabled=True,
+        user__profile__message_digest='instant',
+    ).exclude(user_id=message.author_id).values_list('user_id', flat=True)
+
+    text = chat_message_preview(message)
+
+    def coalesce(user_ids):
+        unread = Notification.objects.filter(
+            type='new_message',
+            is_read=False,
+            related_channel=channel,
+            user_id__in=user_ids,
+        )
+        covered = set(unread.values_list('user_id', flat=True))
+        if covered:
+            # created_at не трогаем: по нему строится курсор ленты
+            unread.filter(user_id__in=covered).update(
+                count=F('count') + 1,
+                title=f'Новые сообщения в канале "{channel.name}"',
+                message=text,
+                related_message=message,
+                updated_at=timezone.now(),
+            )
+            publish([user_topic(user_id) for user_id in covered], 'notification')
+        return covered
+
+    return fan_out_notifications(
+        recipient_ids,
+        lambda user_id: Notification(
+            user_id=user_id,
+            type='new_message',
+            title=f'Новое сообщение в канале "{channel.name}"',
+            message=text,
+            related_event_id=channel.event_id,
+            related_channel=channel,
+            related_message=message,
+            created_at=message.created_at,
+        ),
+        task=task,
+        after_id=after_id,
+        id_field='user_id',
+        label=f'chat_message:{message.pk}',
+        coalesce=coalesce,
+    )
+
+
+def event_start(event):
+    """Момент начала события в текущей временной зоне."""
+    start_time = event.time or dt_time(*REMINDER_DEFAULT_EVENT_TIME)
+    return timezone.make_aware(datetime.combine(event.date, start_time))
+
+
+def _reminder_text(event, start, now):
+    if start - now > timedelta(hours=12):
+        when = f'{timezone.localtime(start):%d.%m в %H:%M}'
+    else:
+        hours, minutes = divmod(max(int((start - now).total_seconds() // 60), 1), 60)
+        when = f'через {hours} ч {minutes} мин' if hours else f'через {minutes} мин'
+    return f'Напоминаем, что событие "{event.title}" начнется {when}. Место: {event.location}.'
+
+
+def send_event_reminders(now=None, leads=REMINDER_LEAD_MINUTES):
+    """
+    Создает напоминания участникам событий, до начала которых осталось не больше
+    одного из упреждений leads (в минутах). Рассчитано на запуск из cron раз
+    в несколько минут: отправленные напоминания отмечаются в EventReminder.
+
+    Для каждого упреждения, от меньшего к большему, выполняется один запрос
+    одобренных заявок с антиджойном по EventReminder: заявка пропускается, если
+    уже было напоминание с таким же или меньшим упреждением. Поэтому участник,
+    одобренный за час до начала, получит одно напоминание, а не два.
+    Отметки вставляются bulk_create на каждое упреждение, уведомления - одним
+    bulk_create; параллельный запуск упрется в уникальный индекс и откатится целиком.
+    """
+    now = now or timezone.now()
+    notifications = []
+    try:
+        with transaction.atomic():
+            for lead in sorted(set(leads)):
+                notifications.extend(_create_due_reminders(now, lead))
+            Notification.objects.bulk_create(notifications)
+    except IntegrityError:
+        logger.warning('Event reminders are being sent by another process, skipping this run')
+        return 0
+    return len(notifications)
+
+
+def _create_due_reminders(now, lead):
+    horizon = now + timedelta(minutes=lead)
+    # Напоминание с меньшим упреждением делает более раннее ненужным.
+    already_reminded = EventReminder.objects.filter(registration=OuterRef('pk'), lead_minutes__lte=lead)
+    candidates = EventRegistration.objects.filter(
+        ~Exists(already_reminded),
+        ~muted_notification('event_reminder', 'volunteer_id'),
+        status__in=APPROVED_REGISTRATION_STATUSES,
+        event__is_active=True,
+        event__date__gte=timezone.localdate(now),
+        event__date__lte=timezone.localdate(horizon),
+    ).select_related('event')
+
+    reminders = []
+    notifications = []
+    for registration in candidates:
+        start = event_start(registration.event)
+        if not now < start <= horizon:
+            continue
+        reminders.append(EventReminder(registration=registration, lead_minutes=lead, sent_at=now))
+        notifications.append(
+            Notification(
+                user_id=registration.volunteer_id,
+                type='event_reminder',
+                title='Напоминание о событии',
+                message=_reminder_text(registration.event, start, now),
+                related_event=registration.event,
+                related_registration=registration,
+            )
         )
-        for participant in participants
-    ]
-    Notification.objects.bulk_create(notifications, ignore_conflicts=True)
+    EventReminder.objects.bulk_create(reminders)
+    return notifications
@@ -410,6 +410,164 @@
         log.scrollTop = log.scrollHeight;
     }
 
+    // =========================================
+    // Chat history (подгрузка более ранних сообщений)
+    // =========================================
+    function setupChatHistory() {
+        const log = document.querySelector('[data-chat-log]');
+        const button = log ? log.querySelector('[data-chat-older]') : null;
+        if (!button) {
+            return;
+        }
+
+        let loading = false;
+        button.addEventListener('click', async function () {
+            if (loading) {
+                return;
+            }
+            loading = true;
+            button.disabled = true;
+
+            const url = button.getAttribute('data-url') + '?before=' + encodeURIComponent(button.getAttribute('data-cursor'));
+            try {
+                const response = await fetch(url, {
+                    headers: { 'X-Requested-With': 'XMLHttpRequest' },
+                    credentials: 'same-origin',
+                });
+                if (!response.ok) {
+                    return;
+                }
+                const data = await response.json();
+                // Сохраняем позицию прокрутки, чтобы видимые сообщения не сдвигались.
+                const offsetFromBottom = log.scrollHeight - log.scrollTop;
+                button.parentElement.insertAdjacentHTML('afterend', data.html);
+                log.scrollTop = log.scrollHeight - offsetFromBottom;
+
+                if (data.older_cursor) {
+                    button.setAttribute('data-cursor', data.older_cursor);
+                } else {
+                    button.parentElement.remove();
+                }
+            } catch (error) {
+                console.error('Failed to load chat history:', error);
+            } finally {
+                loading = false;
+                button.disabled = false;
+            }
+        });
+    }
+
+    // =========================================
+    // Chat realtime (поток изменений канала, отправка, правка и удаление без перезагрузки)
+    // =========================================
+    function setupChatRealtime() {
+        const log = document.querySelector('[data-chat-log]');
+        if (!log) {
+            return;
+        }
+
+        // Новое сообщение добавляется в конец, измененное или удаленное заменяется на месте.
+        function renderMessage(id, html) {
+            const existing = log.querySelector('[data-message-id="' + id + '"]');
+            if (existing) {
+                existing.outerHTML = html;
+                return;
+            }
+            const nearBottom = log.scrollHeight - log.scrollTop - log.clientHeight < 80;
+            const empty = log.querySelector('[data-chat-empty]');
+            if (empty) {
+                empty.remove();
+            }
+            log.insertAdjacentHTML('beforeend', html);
+            if (nearBottom) {
+                log.scrollTop = log.scrollHeight;
+            }
+        }
+
+        async function postMessageAction(url, body) {
+            const response = await fetch(url, {
+                method: 'POST',
+                body: body,
+                headers: {
+                    'X-Requested-With': 'XMLHttpRequest',
+                    'X-CSRFToken': getCookie('csrftoken') || '',
+                },
+                credentials: 'same-origin',
+            });
+            const data = await response.json();
+            if (!response.ok) {
+                showToast(data.error || 'Не удалось изменить сообщение', 'error');
+                return;
+            }
+            renderMessage(data.id, data.html);
+        }
+
+        log.addEventListener('click', function (e) {
+            const editButton = e.target.closest('[data-chat-edit]');
+            if (editButton) {
+                const row = editButton.closest('[data-message-id]');
+                const text = row.querySelector('[data-chat-text]');
+                const content = window.prompt('Изменить сообщение', text ? text.textContent : '');
+                if (content && content.trim()) {
+                    const body = new FormData();
+                    body.append('content', content);
+                    postMessageAction(editButton.getAttribute('data-chat-edit'), body);
+                }
+                return;
+            }
+            const deleteButton = e.target.closest('[data-chat-delete]');
+            if (deleteButton && window.confirm('Удалить сообщение?')) {
+                postMessageAction(deleteButton.getAttribute('data-chat-delete'), new FormData());
+            }
+        });
+
+        const streamUrl = log.getAttribute('data-stream-url');
+        if (streamUrl && window.EventSource) {
+            const source = new EventSource(streamUrl + '?after=' + (log.getAttribute('data-last-seq') || 0));
+            source.addEventListener('message', function (event) {
+                const message = JSON.parse(event.data);
+                renderMessage(message.id, message.html);
+            });
+            window.addEventListener('beforeunload', function () {
+                source.close();
+            });
+        }
+
+        const form = document.querySelector('[data-chat-compose]');
+        if (!form || !window.fetch) {
+            return;
+        }
+        form.addEventListener('submit', async function (e) {
+            e.preventDefault();
+            const field = form.querySelector('textarea, input[name="content"]');
+            if (!field || !field.value.trim()) {
+                return;
+            }
+            const button = form.querySelector('button[type="submit"]');
+            button.disabled = true;
+            try {
+                const response = await fetch(form.action, {
+                    method: 'POST',
+                    body: new FormData(form),
+                    headers: { 'X-Requested-With': 'XMLHttpRequest' },
+                    credentials: 'same-origin',
+                });
+                const data = await response.json();
+                if (!response.ok) {
+                    showToast(data.error || 'Не удалось отправить сообщение', 'error');
+                    return;
+                }
+                field.value = '';
+                renderMessage(data.id, data.html);
+                log.scrollTop = log.scrollHeight;
+            } catch (error) {
+                console.error('Failed to send chat message:', error);
+            } finally {
+                button.disabled = false;
+            }
+        });
+    }
+
     // =========================================
     // Notifications polling
     // =========================================
@@ -451,6 +609,27 @@
                 .catch(function () {});
         }
 
+        const typeMap = {
+            application_approved: 'success',
+            application_rejected: 'error',
+            new_application: 'info',
+            new_event: 'info',
+            event_reminder: 'warning',
+            new_message: 'info',
+            achievement_unlocked: 'success',
+            level_up: 'success',
+        };
+
+        function showNotification(notification) {
+            // Объединенное уведомление сохраняет id, но увеличивает count
+            const key = notification.id + ':' + (notification.count || 1);
+            if (sessionStorage.getItem('lastNotificationId') === key) {
+                return;
+            }
+            sessionStorage.setItem('lastNotificationId', key);
+            showToast(notification.title + ': ' + notification.message, typeMap[notification.type] || 'info');
+        }
+
         function checkLatest() {
             if (document.hidden) {
                 return;
@@ -464,25 +643,8 @@
                 })
                 .then(function (data) {
                     renderCount(data.count || 0);
-                    if (!data.notifications || !data.notifications.length) {
-                        return;
-                    }
-
-                    const latest = data.notifications[0];
-                    const previousId = sessionStorage.getItem('lastNotificationId');
-                    if (previousId !== String(latest.id)) {
-                        sessionStorage.setItem('lastNotificationId', String(latest.id));
-                        const typeMap = {
-                            application_approved: 'success',
-                            application_rejected: 'error',
-                            new_application: 'info',
-                            new_event: 'info',
-                            event_reminder: 'warning',
-                            new_message: 'info',
-                            achievement_unlocked: 'success',
-                            level_up: 'success',
-                        };
-                        showToast(latest.title + ': ' + latest.message, typeMap[latest.type] || 'info');
+                    if (data.notifications && data.notifications.length) {
+                        showNotification(data.notifications[0]);
                     }
                 })
                 .catch(function () {
@@ -490,8 +652,35 @@
                 });
         }
 
-        checkLatest();
-        setInterval(checkLatest, 30000);
+        function startPolling() {
+            checkLatest();
+            setInterval(checkLatest, 30000);
+        }
+
+        // Поток событий от сервера; если он недоступен, возвращаемся к опросу.
+        const streamUrl = document.body.getAttribute('data-notifications-stream-url');
+        if (!streamUrl || !window.EventSource) {
+            startPolling();
+            return;
+        }
+
+        const source = new EventSource(streamUrl);
+        let connected = false;
+        source.addEventListener('open', function () {
+            connected = true;
+        });
+        source.addEventListener('count', function (event) {
+            renderCount(JSON.parse(event.data).count || 0);
+        });
+        source.addEventListener('notification', function (event) {
+            showNotification(JSON.parse(event.data));
+        });
+        source.addEventListener('error', function () {
+            if (!connected) {
+                source.close();
+                startPolling();
+            }
+        });
     }
 
     // =========================================
@@ -764,6 +953,8 @@
         setupErrorScrolling();
         setupRoleCardSelection();
         setupChatAutoScroll();
+        setupChatHistory();
+        setupChatRealtime();
         setupNotifications();
         setupFormEnhancements();
         setupHeaderSearch();
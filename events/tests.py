@@ -1,16 +1,68 @@
+import asyncio
+import gzip
+import json
+import tempfile
 from datetime import timedelta
+from pathlib import Path
+from unittest import mock
+from io import StringIO
+
+from asgiref.sync import sync_to_async
 
 from django.contrib.auth.models import User
-from django.test import TestCase
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 
-from .models import ChatChannelMembership, Event, EventRegistration, Notification
+from .models import (
+    Achievement,
+    BroadcastNotification,
+    ChatChannel,
+    ChatChannelMembership,
+    ChatMessage,
+    Event,
+    EventRegistration,
+    Notification,
+    NotificationOutbox,
+    NotificationPreference,
+    VolunteerAchievement,
+    XpRollup,
+    XpTransaction,
+    apply_event_completion_rewards,
+    award_xp,
+)
+from .caching import buffer_read_marker, read_marker_key, set_unread_counts
+from .controllers.chat_controller import ChatController
+from .controllers.notification_controller import NotificationController
+from .controllers.profile_controller import ProfileController
+from .outbox import LEASE_SECONDS, OUTBOX_HANDLERS, enqueue, process_outbox_batch, save_progress
+from .realtime import publish, user_topic
+from .search import search_messages
+from .selectors import available_channels_for_user, channel_inbox_for_user, user_can_access_channel
+from .services import (
+    delete_chat_message,
+    deliver_event_created,
+    fan_out_notifications,
+    notify_event_created,
+    notify_event_updated,
+    notify_new_chat_message,
+    sync_channel_members,
+    send_event_reminders,
+    unread_notification_count,
+)
 
 
 class BaseEventsTestCase(TestCase):
     password = 'StrongPassword123!'
 
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
     def create_user(self, username, role='volunteer'):
         user = User.objects.create_user(
             username=username,
@@ -23,6 +75,10 @@ class BaseEventsTestCase(TestCase):
         user.profile.save(update_fields=['role'])
         return user
 
+    def drain_outbox(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('process_notification_outbox', stdout=StringIO())
+
     def create_event(self, organizer, **overrides):
         defaults = {
             'title': 'Test event',
@@ -63,6 +119,7 @@ class EventRegistrationFlowTests(BaseEventsTestCase):
         self.assertEqual(EventRegistration.objects.filter(event=event, volunteer=volunteer).count(), 1)
         self.assertEqual(existing.status, 'pending')
         self.assertEqual(existing.message, 'Updated message')
+        self.drain_outbox()
         self.assertTrue(
             Notification.objects.filter(
                 user=organizer,
@@ -311,9 +368,1068 @@ class NotificationsTests(BaseEventsTestCase):
 
         response = self.client.get(reverse('notifications_list'))
         self.assertEqual(response.status_code, 200)
-        self.assertIn('page_obj', response.context)
         self.assertEqual(len(response.context['notifications']), 20)
+        next_cursor = response.context['next_cursor']
+        self.assertTrue(next_cursor)
 
-        response_page_2 = self.client.get(reverse('notifications_list'), {'page': 2})
+        response_page_2 = self.client.get(reverse('notifications_list'), {'cursor': next_cursor})
         self.assertEqual(response_page_2.status_code, 200)
         self.assertEqual(len(response_page_2.context['notifications']), 5)
+        self.assertIsNone(response_page_2.context['next_cursor'])
+        seen = {n.pk for n in response.context['notifications']} | {n.pk for n in response_page_2.context['notifications']}
+        self.assertEqual(len(seen), 25)
+
+    def test_notifications_feed_returns_next_page_as_json(self):
+        user = self.create_user('volunteer_feed', role='volunteer')
+        self.client.login(username=user.username, password=self.password)
+        same_time = timezone.now()
+        Notification.objects.bulk_create(
+            [
+                Notification(user=user, type='new_event', title=f'Title {idx}', message='M', created_at=same_time)
+                for idx in range(22)
+            ]
+        )
+        first_page = self.client.get(reverse('notifications_list')).context
+
+        data = self.client.get(
+            reverse('notifications_feed'), {'cursor': first_page['next_cursor']}
+        ).json()
+
+        self.assertEqual(len(data['notifications']), 2)
+        self.assertIsNone(data['next_cursor'])
+        self.assertIn('notification-card', data['html'])
+        first_ids = {n.pk for n in first_page['notifications']}
+        self.assertFalse(first_ids & {n['id'] for n in data['notifications']})
+
+
+class AchievementBackfillTests(BaseEventsTestCase):
+    def test_backfill_awards_new_achievement_to_qualified_volunteers(self):
+        organizer = self.create_user('organizer_backfill', role='organizer')
+        veteran = self.create_user('volunteer_backfill_veteran')
+        newbie = self.create_user('volunteer_backfill_newbie')
+        for idx in range(2):
+            event = self.create_event(organizer=organizer, title=f'Backfill {idx}')
+            EventRegistration.objects.create(event=event, volunteer=veteran, status='completed')
+        EventRegistration.objects.create(
+            event=self.create_event(organizer=organizer, title='Backfill pending'),
+            volunteer=newbie,
+            status='pending',
+        )
+        achievement = Achievement.objects.create(
+            slug='two_events',
+            title='Two events',
+            description='Completed two events',
+            category='events_completed',
+            threshold=2,
+        )
+
+        call_command('backfill_achievements', achievement=['two_events'], dry_run=True, stdout=StringIO())
+        self.assertFalse(VolunteerAchievement.objects.filter(achievement=achievement).exists())
+
+        call_command('backfill_achievements', achievement=['two_events'], stdout=StringIO())
+        call_command('backfill_achievements', achievement=['two_events'], stdout=StringIO())
+
+        awarded = VolunteerAchievement.objects.filter(achievement=achievement)
+        self.assertEqual(list(awarded.values_list('volunteer_id', flat=True)), [veteran.id])
+        self.assertEqual(
+            Notification.objects.filter(user=veteran, type='achievement_unlocked').count(),
+            1,
+        )
+
+
+class XpLedgerTests(BaseEventsTestCase):
+    def test_completion_rewards_are_recorded_in_ledger_once(self):
+        organizer = self.create_user('organizer_ledger', role='organizer')
+        volunteer = self.create_user('volunteer_ledger')
+        event = self.create_event(organizer=organizer, xp_reward=120)
+        registration = EventRegistration.objects.create(event=event, volunteer=volunteer, status='completed')
+
+        apply_event_completion_rewards(registration)
+        apply_event_completion_rewards(registration)
+
+        volunteer.profile.refresh_from_db()
+        self.assertEqual(volunteer.profile.xp, 120)
+        self.assertEqual(volunteer.profile.level, 2)
+        entries = XpTransaction.objects.filter(volunteer=volunteer)
+        self.assertEqual(entries.count(), 1)
+        self.assertEqual(entries.get().related_registration, registration)
+
+    def test_rebuild_restores_profile_total_from_ledger(self):
+        volunteer = self.create_user('volunteer_ledger_rebuild')
+        XpTransaction.objects.create(volunteer=volunteer, source='adjustment', amount=40)
+        XpTransaction.objects.create(volunteer=volunteer, source='adjustment', amount=70)
+
+        call_command('rebuild_xp_totals', stdout=StringIO())
+
+        volunteer.profile.refresh_from_db()
+        self.assertEqual(volunteer.profile.xp, 110)
+        self.assertEqual(volunteer.profile.level, 2)
+
+    def test_negative_adjustment_is_clamped_in_ledger_too(self):
+        volunteer = self.create_user('volunteer_ledger_negative')
+        award_xp(volunteer, 30, source='adjustment')
+        award_xp(volunteer, -50, source='adjustment')
+
+        amounts = XpTransaction.objects.filter(volunteer=volunteer).order_by('id').values_list('amount', flat=True)
+        self.assertEqual(list(amounts), [30, -30])
+        call_command('rebuild_xp_totals', stdout=StringIO())
+        volunteer.profile.refresh_from_db()
+        self.assertEqual(volunteer.profile.xp, 0)
+
+    def test_admin_corrects_xp_only_through_ledger(self):
+        volunteer = self.create_user('volunteer_ledger_admin')
+        award_xp(volunteer, 30, source='adjustment')
+        admin_user = User.objects.create_superuser('admin_ledger', 'admin@example.com', self.password)
+        self.client.force_login(admin_user)
+        profile = volunteer.profile
+        profile.refresh_from_db()
+
+        response = self.client.post(
+            reverse('admin:events_userprofile_change', args=[profile.pk]),
+            {
+                'user': volunteer.pk,
+                'role': profile.role,
+                'city': profile.city,
+                'last_broadcast_id': profile.last_broadcast_id,
+                'message_digest': profile.message_digest,
+                'xp': 1000,
+                'xp_adjustment': 15,
+            },
+        )
+
+        self.assertEqual(response.status_code, 302)
+        profile.refresh_from_db()
+        self.assertEqual(profile.xp, 45)
+        amounts = XpTransaction.objects.filter(volunteer=volunteer).order_by('id').values_list('amount', flat=True)
+        self.assertEqual(list(amounts), [30, 15])
+        response = self.client.get(reverse('admin:events_xptransaction_changelist'))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.context['has_add_permission'])
+        self.assertFalse(response.context['cl'].model_admin.has_change_permission(response.wsgi_request))
+        self.assertFalse(response.context['cl'].model_admin.has_delete_permission(response.wsgi_request))
+
+
+class PeriodLeaderboardTests(BaseEventsTestCase):
+    def test_xp_awards_update_week_month_and_city_rollups(self):
+        volunteer = self.create_user('volunteer_rollup')
+        volunteer.profile.city = 'Almaty'
+        volunteer.profile.save(update_fields=['city'])
+
+        award_xp(volunteer, 30, source='adjustment')
+        award_xp(volunteer, 20, source='adjustment')
+
+        rollups = XpRollup.objects.filter(volunteer=volunteer)
+        self.assertEqual(
+            set(rollups.values_list('period', 'city', 'xp')),
+            {('week', '', 50), ('week', 'Almaty', 50), ('month', '', 50), ('month', 'Almaty', 50)},
+        )
+
+    def test_weekly_leaderboard_ranks_by_period_xp(self):
+        leader = self.create_user('volunteer_rollup_leader')
+        runner_up = self.create_user('volunteer_rollup_runner')
+        award_xp(leader, 80, source='adjustment')
+        award_xp(runner_up, 40, source='adjustment')
+
+        self.client.login(username=leader.username, password=self.password)
+        response = self.client.get(reverse('leaderboard'), {'period': 'week'})
+
+        self.assertEqual(response.status_code, 200)
+        rows = response.context['leaderboard']
+        self.assertEqual([row['username'] for row in rows], [leader.username, runner_up.username])
+        self.assertEqual([row['rank'] for row in rows], [1, 2])
+
+
+class RankedLeaderboardTests(BaseEventsTestCase):
+    def test_my_rank_and_neighbours_follow_xp_order(self):
+        volunteers = [self.create_user(f'volunteer_rank_{idx}') for idx in range(5)]
+        for idx, volunteer in enumerate(volunteers):
+            award_xp(volunteer, (idx + 1) * 10, source='adjustment')
+
+        me = volunteers[2]
+        self.client.login(username=me.username, password=self.password)
+        response = self.client.get(reverse('leaderboard'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['my_rank'], 3)
+        self.assertEqual(
+            [(row['rank'], row['username']) for row in response.context['neighbours']],
+            [(idx + 1, volunteers[4 - idx].username) for idx in range(5)],
+        )
+
+    def test_leaderboard_is_paginated(self):
+        me = self.create_user('volunteer_page_me')
+        for idx in range(51):
+            User.objects.create(username=f'volunteer_page_{idx}')
+
+        self.client.login(username=me.username, password=self.password)
+        first_page = self.client.get(reverse('leaderboard'))
+        cursor = first_page.context['next_cursor']
+        with self.assertNumQueries(2):
+            # страница по ключу (xp, completed_events, id) и навыки
+            second_page = ProfileController.get_leaderboard(cursor=cursor)
+
+        self.assertEqual(len(first_page.context['leaderboard']), 50)
+        self.assertIsNotNone(cursor)
+        self.assertEqual([row['rank'] for row in second_page['leaderboard']], [51, 52])
+        self.assertIsNone(second_page['next_cursor'])
+        first_ids = {row['profile_id'] for row in first_page.context['leaderboard']}
+        self.assertFalse(first_ids & {row['profile_id'] for row in second_page['leaderboard']})
+
+    def test_profile_edit_invalidates_cached_top_page(self):
+        volunteer = self.create_user('volunteer_page_rename')
+        ProfileController.get_leaderboard()
+        volunteer.first_name = 'Renamed'
+        volunteer.save(update_fields=['first_name'])
+
+        form = mock.Mock(is_valid=mock.Mock(return_value=True), instance=volunteer.profile)
+        with self.captureOnCommitCallbacks(execute=True):
+            ProfileController.update_profile(None, form)
+
+        rows = ProfileController.get_leaderboard()['leaderboard']
+        self.assertIn('Renamed', [row['full_name'].split()[0] for row in rows])
+
+
+class LeaderboardDeltaTests(BaseEventsTestCase):
+    def test_delta_returns_not_modified_then_only_changed_rows(self):
+        leader = self.create_user('volunteer_delta_leader')
+        other = self.create_user('volunteer_delta_other')
+        with self.captureOnCommitCallbacks(execute=True):
+            award_xp(leader, 100, source='adjustment')
+            award_xp(other, 50, source='adjustment')
+
+        self.client.login(username=leader.username, password=self.password)
+        page = self.client.get(reverse('leaderboard'))
+        version = page.context['version']
+
+        unchanged = self.client.get(reverse('leaderboard_delta'), {'version': version})
+        self.assertEqual(unchanged.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            award_xp(other, 100, source='adjustment')
+
+        delta = self.client.get(reverse('leaderboard_delta'), {'version': version}).json()
+        self.assertFalse(delta['full'])
+        self.assertNotEqual(delta['version'], version)
+        self.assertEqual(
+            {(row['username'], row['rank'], row['xp']) for row in delta['rows']},
+            {(other.username, 1, 150), (leader.username, 2, 100)},
+        )
+
+
+class BroadcastNotificationTests(BaseEventsTestCase):
+    def test_new_event_is_stored_once_and_delivered_on_read(self):
+        organizer = self.create_user('organizer_broadcast', role='organizer')
+        volunteer = self.create_user('volunteer_broadcast')
+        self.create_user('volunteer_broadcast_idle')
+        event = self.create_event(organizer=organizer)
+
+        notify_event_created(event, exclude_user=organizer)
+        self.drain_outbox()
+
+        self.assertEqual(BroadcastNotification.objects.count(), 1)
+        self.assertFalse(Notification.objects.filter(type='new_event').exists())
+
+        self.client.login(username=volunteer.username, password=self.password)
+        self.assertEqual(self.client.get(reverse('notifications_unread_count')).json()['count'], 1)
+        self.assertEqual(self.client.get(reverse('notifications_unread_count')).json()['count'], 1)
+        self.assertEqual(Notification.objects.filter(type='new_event').count(), 1)
+
+    def test_user_registered_later_does_not_receive_old_broadcasts(self):
+        organizer = self.create_user('organizer_broadcast_old', role='organizer')
+        notify_event_created(self.create_event(organizer=organizer), exclude_user=organizer)
+        self.drain_outbox()
+
+        newcomer = self.create_user('volunteer_broadcast_newcomer')
+        self.client.login(username=newcomer.username, password=self.password)
+        self.assertEqual(self.client.get(reverse('notifications_unread_count')).json()['count'], 0)
+
+    def test_backlog_larger_than_one_batch_is_delivered_in_order(self):
+        volunteer = self.create_user('volunteer_broadcast_backlog')
+        self.assertEqual(unread_notification_count(volunteer), 0)
+        # Рассылки пишет воркер: кеш веб-процесса о них не знает
+        for idx in range(5):
+            BroadcastNotification.objects.create(
+                type='new_event', title=f'Event {idx}', message='', audience_role='volunteer'
+            )
+
+        with mock.patch('events.services.BROADCAST_DELIVERY_LIMIT', 2):
+            with self.captureOnCommitCallbacks(execute=True):
+                unread_notification_count(volunteer)
+        self.assertEqual(unread_notification_count(volunteer), 5)
+
+        volunteer.profile.refresh_from_db()
+        self.assertEqual(volunteer.profile.last_broadcast_id, BroadcastNotification.objects.latest('id').id)
+        self.assertEqual(
+            list(Notification.objects.filter(user=volunteer).order_by('id').values_list('title', flat=True)),
+            [f'Event {idx}' for idx in range(5)],
+        )
+
+
+class NotificationOutboxTests(BaseEventsTestCase):
+    def test_registration_enqueues_single_task_delivered_by_worker(self):
+        organizer = self.create_user('organizer_outbox', role='organizer')
+        volunteer = self.create_user('volunteer_outbox')
+        event = self.create_event(organizer=organizer)
+
+        self.client.login(username=volunteer.username, password=self.password)
+        self.client.post(reverse('event_register', kwargs={'pk': event.pk}), {'message': 'Hi'})
+
+        self.assertEqual(NotificationOutbox.objects.filter(kind='new_application').count(), 1)
+        self.assertFalse(Notification.objects.filter(type='new_application').exists())
+
+        self.drain_outbox()
+
+        self.assertFalse(NotificationOutbox.objects.exists())
+        self.assertEqual(
+            set(Notification.objects.filter(type='new_application').values_list('user_id', flat=True)),
+            {organizer.id, volunteer.id},
+        )
+
+    def test_failed_task_is_retried_with_backoff(self):
+        task = NotificationOutbox.objects.create(kind='unknown_kind', payload={})
+
+        self.drain_outbox()
+
+        task.refresh_from_db()
+        self.assertEqual(task.status, 'pending')
+        self.assertEqual(task.attempts, 1)
+        self.assertGreater(task.available_at, timezone.now())
+        self.assertIn('unknown_kind', task.last_error)
+
+    def test_task_claimed_by_another_worker_after_lease_expiry_is_skipped(self):
+        first = enqueue('test_slow')
+        second = enqueue('test_slow')
+        runs = []
+
+        def slow_handler():
+            runs.append(1)
+            # Пока выполнялась первая задача, резерв второй истек и ее захватил другой воркер
+            NotificationOutbox.objects.filter(pk=second.pk).update(
+                available_at=timezone.now() + timedelta(seconds=LEASE_SECONDS * 2)
+            )
+
+        with mock.patch.dict(OUTBOX_HANDLERS, {'test_slow': slow_handler}):
+            self.assertEqual(process_outbox_batch(), (1, 0))
+
+        self.assertEqual(len(runs), 1)
+        self.assertFalse(NotificationOutbox.objects.filter(pk=first.pk).exists())
+        self.assertTrue(NotificationOutbox.objects.filter(pk=second.pk).exists())
+
+
+class NotificationFanOutTests(BaseEventsTestCase):
+    def test_fan_out_inserts_in_bounded_batches_and_resumes_from_cursor(self):
+        organizer = self.create_user('organizer_fanout', role='organizer')
+        event = self.create_event(organizer=organizer, max_volunteers=10)
+        volunteers = [self.create_user(f'volunteer_fanout_{idx}') for idx in range(5)]
+        for volunteer in volunteers:
+            EventRegistration.objects.create(event=event, volunteer=volunteer, status='approved')
+
+        recipients = User.objects.filter(event_registrations__event=event).values_list('id', flat=True)
+
+        def build(user_id):
+            return Notification(user_id=user_id, type='new_event', title='T', message='M')
+
+        stats = fan_out_notifications(recipients, build, after_id=volunteers[1].id, chunk_size=2)
+
+        self.assertEqual(stats['recipients'], 3)
+        self.assertEqual(stats['batches'], 2)
+        self.assertEqual(
+            set(Notification.objects.values_list('user_id', flat=True)),
+            {volunteer.id for volunteer in volunteers[2:]},
+        )
+
+    def test_event_update_is_fanned_out_by_worker(self):
+        organizer = self.create_user('organizer_fanout_update', role='organizer')
+        event = self.create_event(organizer=organizer)
+        volunteer = self.create_user('volunteer_fanout_update')
+        EventRegistration.objects.create(event=event, volunteer=volunteer, status='approved')
+
+        notify_event_updated(event)
+        self.drain_outbox()
+
+        self.assertTrue(Notification.objects.filter(user=volunteer, related_event=event).exists())
+        self.assertFalse(NotificationOutbox.objects.exists())
+
+    def test_saved_progress_extends_the_lease(self):
+        task = enqueue('event_updated', event_id=1)
+        started = timezone.now()
+
+        save_progress(task, after_id=42)
+
+        task.refresh_from_db()
+        self.assertEqual(task.payload['after_id'], 42)
+        self.assertGreaterEqual(task.available_at, started + timedelta(seconds=LEASE_SECONDS))
+
+
+@override_settings(CACHE_IS_SHARED=True)
+class UnreadCounterTests(BaseEventsTestCase):
+    def create_notification(self, user):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Notification.objects.create(user=user, type='new_event', title='T', message='M')
+
+    def test_counter_is_served_from_cache_and_tracks_changes(self):
+        volunteer = self.create_user('volunteer_counter')
+        first = self.create_notification(volunteer)
+        self.assertEqual(unread_notification_count(volunteer), 1)
+
+        self.create_notification(volunteer)
+        with self.assertNumQueries(0):
+            self.assertEqual(unread_notification_count(volunteer), 2)
+
+        self.client.login(username=volunteer.username, password=self.password)
+        self.client.post(reverse('notification_mark_read', kwargs={'pk': first.pk}))
+        self.client.post(reverse('notification_mark_read', kwargs={'pk': first.pk}))
+        self.assertEqual(self.client.get(reverse('notifications_unread_count')).json()['count'], 1)
+
+        self.client.post(reverse('notification_mark_all_read'))
+        with self.assertNumQueries(0):
+            self.assertEqual(unread_notification_count(volunteer), 0)
+
+    def test_new_broadcast_reaches_cached_counter(self):
+        volunteer = self.create_user('volunteer_counter_broadcast')
+        organizer = self.create_user('organizer_counter_broadcast', role='organizer')
+        self.assertEqual(unread_notification_count(volunteer), 0)
+
+        event = self.create_event(organizer=organizer)
+        with self.captureOnCommitCallbacks(execute=True):
+            deliver_event_created(event.pk, exclude_user_id=organizer.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            unread_notification_count(volunteer)
+        self.assertEqual(unread_notification_count(volunteer), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(unread_notification_count(volunteer), 1)
+
+    def test_reconcile_command_corrects_drifted_counters(self):
+        volunteer = self.create_user('volunteer_counter_drift')
+        self.create_notification(volunteer)
+        set_unread_counts({volunteer.id: 7})
+
+        out = StringIO()
+        call_command('reconcile_notification_counters', stdout=out)
+
+        self.assertIn('corrected 1', out.getvalue())
+        self.assertEqual(unread_notification_count(volunteer), 1)
+
+    @override_settings(CACHE_IS_SHARED=False)
+    def test_counter_is_read_from_database_without_shared_cache(self):
+        volunteer = self.create_user('volunteer_counter_local')
+        self.create_notification(volunteer)
+        set_unread_counts({volunteer.id: 7})
+
+        self.assertEqual(unread_notification_count(volunteer), 1)
+        # Изменения из другого процесса (воркера) видны сразу
+        Notification.objects.create(user=volunteer, type='new_event', title='T', message='M')
+        self.assertEqual(unread_notification_count(volunteer), 2)
+
+
+@override_settings(REALTIME_POLL_SECONDS=0)
+class NotificationStreamTests(BaseEventsTestCase):
+    async def test_stream_pushes_notification_written_after_connect(self):
+        volunteer = await sync_to_async(self.create_user)('volunteer_stream')
+        stream = NotificationController.stream_notifications(volunteer)
+        self.assertEqual(await anext(stream), 'retry: 5000\n\n')
+        self.assertIn('"count": 0', await anext(stream))
+
+        def write_notification():
+            with self.captureOnCommitCallbacks(execute=True):
+                return Notification.objects.create(user=volunteer, type='new_event', title='T', message='M')
+
+        notification = await sync_to_async(write_notification)()
+        event = await asyncio.wait_for(anext(stream), timeout=5)
+        self.assertTrue(event.startswith(f'id: {notification.id}\nevent: notification\n'))
+        self.assertIn('"count": 1', await anext(stream))
+        await stream.aclose()
+
+    async def test_stream_resends_coalesced_notification_with_new_count(self):
+        volunteer = await sync_to_async(self.create_user)('volunteer_stream_bump')
+        notification = await Notification.objects.acreate(user=volunteer, type='new_message', title='T', message='M')
+        stream = NotificationController.stream_notifications(volunteer)
+        await anext(stream)
+        await anext(stream)
+
+        def bump():
+            with self.captureOnCommitCallbacks(execute=True):
+                Notification.objects.filter(pk=notification.pk).update(count=2, updated_at=timezone.now())
+                publish([user_topic(volunteer.pk)], 'notification')
+
+        await sync_to_async(bump)()
+        event = await asyncio.wait_for(anext(stream), timeout=5)
+        self.assertTrue(event.startswith(f'id: {notification.id}\nevent: notification\n'))
+        self.assertIn('"count": 2', event)
+        await stream.aclose()
+
+
+class ChatNotificationCoalescingTests(BaseEventsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.organizer = self.create_user('organizer_coalesce', role='organizer')
+        self.member = self.create_user('volunteer_coalesce')
+        self.channel = self.create_event(organizer=self.organizer).chat_channels.first()
+        ChatChannelMembership.objects.get_or_create(channel=self.channel, user=self.organizer)
+        ChatChannelMembership.objects.get_or_create(channel=self.channel, user=self.member)
+
+    def post_message(self, content):
+        message = ChatMessage.objects.create(channel=self.channel, author=self.organizer, content=content)
+        notify_new_chat_message(message)
+        self.drain_outbox()
+        return message
+
+    def test_unread_channel_notification_is_incremented_instead_of_duplicated(self):
+        self.post_message('first')
+        self.post_message('second')
+
+        notification = Notification.objects.get(user=self.member, related_channel=self.channel)
+        self.assertEqual(notification.count, 2)
+        self.assertIn('second', notification.message)
+
+        Notification.objects.filter(pk=notification.pk).update(is_read=True)
+        self.post_message('third')
+        self.assertEqual(Notification.objects.filter(user=self.member, related_channel=self.channel).count(), 2)
+
+    def test_coalescing_keeps_feed_position_and_wakes_streams(self):
+        self.post_message('first')
+        notification = Notification.objects.get(user=self.member, related_channel=self.channel)
+
+        with mock.patch('events.services.publish') as publish_mock:
+            self.post_message('second')
+
+        bumped = Notification.objects.get(pk=notification.pk)
+        self.assertEqual(bumped.created_at, notification.created_at)
+        self.assertGreater(bumped.updated_at, notification.updated_at)
+        publish_mock.assert_any_call([user_topic(self.member.pk)], 'notification')
+
+    def test_digest_users_get_one_summary_instead_of_instant_notifications(self):
+        self.member.profile.message_digest = 'hourly'
+        self.member.profile.save(update_fields=['message_digest'])
+        ChatChannelMembership.objects.filter(user=self.member).update(
+            last_read_at=timezone.now() - timedelta(hours=2)
+        )
+        self.post_message('first')
+        self.post_message('second')
+        self.assertFalse(Notification.objects.filter(user=self.member).exists())
+
+        call_command('send_message_digests', 'hourly', stdout=StringIO())
+
+        digest = Notification.objects.get(user=self.member)
+        self.assertEqual(digest.count, 2)
+        self.assertIn(self.channel.name, digest.message)
+
+
+class NotificationRetentionTests(BaseEventsTestCase):
+    def test_purge_archives_and_deletes_only_expired_notifications(self):
+        volunteer = self.create_user('volunteer_retention')
+        now = timezone.now()
+
+        def notification(days_old, is_read):
+            return Notification.objects.create(
+                user=volunteer,
+                type='new_event',
+                title='T',
+                message='M',
+                is_read=is_read,
+                created_at=now - timedelta(days=days_old),
+            )
+
+        old_read = notification(40, True)
+        recent_read = notification(5, True)
+        old_unread = notification(40, False)
+        ancient_unread = notification(200, False)
+
+        out = StringIO()
+        with tempfile.TemporaryDirectory() as archive_dir:
+            call_command(
+                'purge_notifications',
+                '--read-days=30',
+                '--unread-days=180',
+                '--batch-size=2',
+                f'--archive-dir={archive_dir}',
+                '--vacuum',
+                stdout=out,
+            )
+            archives = list(Path(archive_dir).glob('*.jsonl.gz'))
+            self.assertEqual(len(archives), 1)
+            with gzip.open(archives[0], 'rt', encoding='utf-8') as archive:
+                archived = {row['id']: row for row in map(json.loads, archive)}
+
+        self.assertEqual(set(archived), {old_read.id, ancient_unread.id})
+        self.assertIn('updated_at', archived[old_read.id])
+        self.assertIn('VACUUM skipped', out.getvalue())
+        self.assertEqual(
+            set(Notification.objects.values_list('id', flat=True)),
+            {recent_read.id, old_unread.id},
+        )
+
+
+class NotificationPreferenceTests(BaseEventsTestCase):
+    def test_muted_types_are_filtered_out_of_fan_out_and_broadcasts(self):
+        organizer = self.create_user('organizer_prefs', role='organizer')
+        muted = self.create_user('volunteer_prefs_muted')
+        listening = self.create_user('volunteer_prefs_listening')
+        event = self.create_event(organizer=organizer)
+        for volunteer in (muted, listening):
+            EventRegistration.objects.create(event=event, volunteer=volunteer, status='approved')
+
+        self.client.login(username=muted.username, password=self.password)
+        response = self.client.post(reverse('notification_settings'), {'muted_types': ['new_event']})
+        self.assertRedirects(response, reverse('notification_settings'))
+        self.assertTrue(NotificationPreference.objects.filter(user=muted, type='new_event', muted=True).exists())
+
+        notify_event_updated(event)
+        notify_event_created(self.create_event(organizer=organizer), exclude_user=organizer)
+        self.drain_outbox()
+
+        self.assertEqual(self.client.get(reverse('notifications_unread_count')).json()['count'], 0)
+        self.assertFalse(Notification.objects.filter(user=muted).exists())
+        self.assertTrue(Notification.objects.filter(user=listening, related_event=event).exists())
+
+
+class EventReminderTests(BaseEventsTestCase):
+    def create_registration(self, username, starts_in):
+        organizer = self.create_user(f'{username}_organizer', role='organizer')
+        volunteer = self.create_user(username)
+        start = timezone.localtime() + starts_in
+        event = self.create_event(organizer=organizer, date=start.date(), time=start.time())
+        return EventRegistration.objects.create(event=event, volunteer=volunteer, status='approved')
+
+    def reminders_for(self, registration):
+        return Notification.objects.filter(user=registration.volunteer, type='event_reminder')
+
+    def test_each_lead_time_is_sent_once(self):
+        registration = self.create_registration('volunteer_reminder', timedelta(hours=20))
+
+        self.assertEqual(send_event_reminders(), 1)
+        self.assertEqual(send_event_reminders(), 0)
+
+        later = timezone.now() + timedelta(hours=18, minutes=30)
+        self.assertEqual(send_event_reminders(now=later), 1)
+        self.assertEqual(send_event_reminders(now=later), 0)
+        self.assertEqual(self.reminders_for(registration).count(), 2)
+
+    def test_late_approval_gets_only_the_shortest_due_reminder(self):
+        registration = self.create_registration('volunteer_reminder_late', timedelta(hours=1))
+
+        call_command('send_event_reminders', stdout=StringIO())
+
+        self.assertEqual(self.reminders_for(registration).count(), 1)
+        self.assertEqual(registration.reminders.get().lead_minutes, 120)
+
+
+@mock.patch('events.controllers.chat_controller.CHAT_PAGE_SIZE', 3)
+class ChatHistoryTests(BaseEventsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.organizer = self.create_user('organizer_history', role='organizer')
+        self.channel = self.create_event(organizer=self.organizer).chat_channels.first()
+        ChatChannelMembership.objects.get_or_create(channel=self.channel, user=self.organizer)
+        # Одинаковое время у части сообщений проверяет порядок по id внутри одной отметки.
+        created_at = timezone.now() - timedelta(hours=1)
+        self.messages = []
+        for index in range(7):
+            message = ChatMessage.objects.create(channel=self.channel, author=self.organizer, content=f'msg {index}')
+            ChatMessage.objects.filter(pk=message.pk).update(created_at=created_at + timedelta(minutes=index // 2))
+            self.messages.append(message.pk)
+        self.client.force_login(self.organizer)
+
+    def test_channel_page_renders_only_latest_messages(self):
+        response = self.client.get(reverse('chat_channel_detail', args=[self.channel.pk]))
+
+        self.assertEqual([m.content for m in response.context['messages']], ['msg 4', 'msg 5', 'msg 6'])
+        self.assertIsNotNone(response.context['older_cursor'])
+
+    def test_older_messages_are_paged_by_cursor_without_gaps(self):
+        response = self.client.get(reverse('chat_channel_detail', args=[self.channel.pk]))
+        cursor = response.context['older_cursor']
+        url = reverse('chat_older_messages', args=[self.channel.pk])
+
+        loaded = [m.pk for m in response.context['messages']]
+        while cursor:
+            data = self.client.get(url, {'before': cursor}).json()
+            loaded = [m['id'] for m in data['messages']] + loaded
+            cursor = data['older_cursor']
+
+        expected = list(ChatMessage.objects.filter(channel=self.channel).order_by('created_at', 'id').values_list('pk', flat=True))
+        self.assertEqual(loaded, expected)
+        self.assertEqual(len(loaded), 7)
+
+    def test_older_messages_require_channel_access(self):
+        outsider = self.create_user('outsider_history')
+        self.client.force_login(outsider)
+
+        response = self.client.get(reverse('chat_older_messages', args=[self.channel.pk]), {'before': 'x'})
+
+        self.assertEqual(response.status_code, 403)
+
+
+@override_settings(REALTIME_POLL_SECONDS=0)
+class ChatRealtimeTests(BaseEventsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.organizer = self.create_user('organizer_realtime', role='organizer')
+        self.channel = self.create_event(organizer=self.organizer).chat_channels.first()
+
+    async def test_stream_pushes_messages_written_after_connect(self):
+        stream = ChatController.stream_channel(self.organizer, self.channel.pk)
+        self.assertEqual(await anext(stream), 'retry: 5000\n\n')
+
+        def write_message():
+            with self.captureOnCommitCallbacks(execute=True):
+                return ChatMessage.objects.create(channel=self.channel, author=self.organizer, content='live')
+
+        message = await sync_to_async(write_message)()
+        event = await asyncio.wait_for(anext(stream), timeout=5)
+        self.assertTrue(event.startswith(f'id: {message.seq}\nevent: message\n'))
+        self.assertIn('live', event)
+        await stream.aclose()
+
+    async def test_stream_marks_channel_read_only_for_messages_of_others(self):
+        volunteer = await sync_to_async(self.create_user)('volunteer_realtime')
+
+        def write_message(author):
+            with self.captureOnCommitCallbacks(execute=True):
+                return ChatMessage.objects.create(channel=self.channel, author=author, content='live')
+
+        with mock.patch('events.controllers.chat_controller.mark_channel_read') as mark_read:
+            stream = ChatController.stream_channel(self.organizer, self.channel.pk)
+            await anext(stream)
+            await sync_to_async(write_message)(self.organizer)
+            await asyncio.wait_for(anext(stream), timeout=5)
+            mark_read.assert_not_called()
+
+            await sync_to_async(write_message)(volunteer)
+            await asyncio.wait_for(anext(stream), timeout=5)
+            mark_read.assert_called_once_with(self.channel.pk, self.organizer.pk)
+            await stream.aclose()
+
+    def test_send_returns_json_for_script_requests(self):
+        self.client.force_login(self.organizer)
+
+        response = self.client.post(
+            reverse('chat_send_message', args=[self.channel.pk]),
+            {'content': 'hello'},
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+        )
+
+        self.assertEqual(response.status_code, 201)
+        message = ChatMessage.objects.get(channel=self.channel)
+        self.assertEqual(response.json()['id'], message.pk)
+        self.assertIn('data-message-id="%d"' % message.pk, response.json()['html'])
+
+
+class ChatAccessTests(BaseEventsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.organizer = self.create_user('organizer_access', role='organizer')
+        self.event = self.create_event(organizer=self.organizer)
+        self.channel = self.event.chat_channels.first()
+
+    def test_access_matches_available_channels(self):
+        approved = self.create_user('volunteer_access_approved')
+        pending = self.create_user('volunteer_access_pending')
+        EventRegistration.objects.create(event=self.event, volunteer=approved, status='approved')
+        EventRegistration.objects.create(event=self.event, volunteer=pending, status='pending')
+
+        for user in (self.organizer, approved, pending):
+            expected = available_channels_for_user(user).filter(pk=self.channel.pk).exists()
+            self.assertEqual(user_can_access_channel(user, self.channel), expected)
+        self.assertFalse(user_can_access_channel(pending, self.channel))
+
+    def test_access_is_checked_once_per_user_object(self):
+        with self.assertNumQueries(1):
+            self.assertTrue(user_can_access_channel(self.organizer, self.channel))
+            self.assertTrue(user_can_access_channel(self.organizer, self.channel))
+
+
+class ChatUnreadCounterTests(BaseEventsTestCase):
+    def test_counter_grows_per_message_and_resets_when_channel_is_opened(self):
+        organizer = self.create_user('organizer_unread_chat', role='organizer')
+        member = self.create_user('volunteer_unread_chat')
+        channel = self.create_event(organizer=organizer).chat_channels.first()
+        ChatChannelMembership.objects.create(channel=channel, user=member)
+
+        for content in ('one', 'two'):
+            ChatMessage.objects.create(channel=channel, author=organizer, content=content)
+
+        self.assertEqual(ChatChannelMembership.objects.get(channel=channel, user=member).unread_count, 2)
+        self.assertEqual(ChatChannelMembership.objects.get(channel=channel, user=organizer).unread_count, 0)
+
+        self.client.force_login(member)
+        self.client.get(reverse('chat_channel_detail', args=[channel.pk]))
+        self.assertEqual(ChatChannelMembership.objects.get(channel=channel, user=member).unread_count, 0)
+
+
+class ChatSearchTests(BaseEventsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.organizer = self.create_user('organizer_search', role='organizer')
+        self.channel = self.create_event(organizer=self.organizer).chat_channels.first()
+        other_organizer = self.create_user('organizer_search_other', role='organizer')
+        self.other_channel = self.create_event(organizer=other_organizer).chat_channels.first()
+        self.client.force_login(self.organizer)
+
+    def search(self, **params):
+        return self.client.get(reverse('chat_search'), params).context
+
+    def test_results_are_highlighted_and_limited_to_accessible_channels(self):
+        ChatMessage.objects.create(channel=self.channel, author=self.organizer, content='Сбор у <b>входа</b>, адрес Ленина 5')
+        ChatMessage.objects.create(channel=self.other_channel, author=self.other_channel.created_by, content='Адрес Ленина 7')
+
+        context = self.search(q='ленина')
+
+        self.assertEqual([m.channel_id for m in context['results']], [self.channel.pk])
+        snippet = context['results'][0].snippet_html
+        self.assertIn('<mark>Ленина</mark>', snippet)
+        self.assertIn('&lt;b&gt;', snippet)
+
+    def test_results_are_paged_by_cursor(self):
+        for index in range(3):
+            ChatMessage.objects.create(channel=self.channel, author=self.organizer, content=f'телефон {index}')
+
+        with mock.patch('events.controllers.chat_controller.SEARCH_PAGE_SIZE', 2):
+            first = self.search(q='телефон', channel=self.channel.pk)
+            second = self.search(q='телефон', channel=self.channel.pk, cursor=first['next_cursor'])
+
+        self.assertEqual(len(first['results']), 2)
+        self.assertEqual(len(second['results']), 1)
+        self.assertIsNone(second['next_cursor'])
+
+
+class ChatInboxTests(BaseEventsTestCase):
+    def test_inbox_has_last_message_and_unread_count_in_one_query(self):
+        organizer = self.create_user('organizer_inbox', role='organizer')
+        member = self.create_user('volunteer_inbox')
+        channels = [self.create_event(organizer=organizer, title=f'Inbox {i}').chat_channels.first() for i in range(3)]
+        for channel in channels:
+            ChatChannelMembership.objects.create(channel=channel, user=member)
+            ChatMessage.objects.create(channel=channel, author=organizer, content=f'first {channel.pk}')
+            ChatMessage.objects.create(channel=channel, author=organizer, content=f'last {channel.pk}')
+
+        with self.assertNumQueries(1):
+            inbox = {
+                channel.pk: (channel.unread, channel.last_message.content, channel.last_message.author.username)
+                for channel in channel_inbox_for_user(member)
+            }
+
+        self.assertEqual(
+            inbox,
+            {channel.pk: (2, f'last {channel.pk}', 'organizer_inbox') for channel in channels},
+        )
+
+
+class ChannelMembershipSyncTests(BaseEventsTestCase):
+    def test_sync_adds_missing_and_removes_extra_members_in_constant_queries(self):
+        organizer = self.create_user('organizer_sync', role='organizer')
+        channel = self.create_event(organizer=organizer).chat_channels.first()
+        volunteers = [self.create_user(f'volunteer_sync_{i}') for i in range(5)]
+        ChatChannelMembership.objects.create(channel=channel, user=volunteers[0], unread_count=3)
+        ChatChannelMembership.objects.create(channel=channel, user=volunteers[1])
+
+        desired = {organizer.pk, volunteers[0].pk, volunteers[2].pk, volunteers[3].pk, volunteers[4].pk}
+        with self.assertNumQueries(3):
+            added, removed = sync_channel_members(channel, desired)
+
+        self.assertEqual((added, removed), (3, 1))
+        self.assertEqual(set(channel.memberships.values_list('user_id', flat=True)), desired)
+        self.assertEqual(channel.memberships.get(user=volunteers[0]).unread_count, 3)
+
+    def test_new_channel_gets_organizer_and_approved_volunteers(self):
+        organizer = self.create_user('organizer_sync_new', role='organizer')
+        event = self.create_event(organizer=organizer)
+        approved = self.create_user('volunteer_sync_approved')
+        pending = self.create_user('volunteer_sync_pending')
+        EventRegistration.objects.create(event=event, volunteer=approved, status='approved')
+        EventRegistration.objects.create(event=event, volunteer=pending, status='pending')
+        self.client.force_login(organizer)
+
+        self.client.post(reverse('chat_create_channel', args=[event.pk]), {'name': 'Логистика', 'topic': ''})
+
+        channel = event.chat_channels.get(name='Логистика')
+        self.assertEqual(set(channel.memberships.values_list('user_id', flat=True)), {organizer.pk, approved.pk})
+
+
+class ChatMessageChangeTests(BaseEventsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.organizer = self.create_user('organizer_changes', role='organizer')
+        self.member = self.create_user('volunteer_changes')
+        self.channel = self.create_event(organizer=self.organizer).chat_channels.first()
+        ChatChannelMembership.objects.create(channel=self.channel, user=self.member)
+        self.message = ChatMessage.objects.create(channel=self.channel, author=self.member, content='draft')
+
+    def changes_since(self, seq):
+        response = self.client.get(reverse('chat_channel_changes', args=[self.channel.pk]), {'since': seq})
+        return response.json()
+
+    def test_edit_and_delete_are_returned_as_changes_since_seq(self):
+        other = ChatMessage.objects.create(channel=self.channel, author=self.organizer, content='other')
+        self.client.force_login(self.member)
+        since = ChatChannel.objects.get(pk=self.channel.pk).last_seq
+        self.assertEqual(since, other.seq)
+
+        self.client.post(reverse('chat_edit_message', args=[self.message.pk]), {'content': 'final'})
+        data = self.changes_since(since)
+        self.assertEqual([(c['id'], c['content']) for c in data['changes']], [(self.message.pk, 'final')])
+
+        self.client.force_login(self.organizer)
+        self.client.post(reverse('chat_delete_message', args=[self.message.pk]))
+        data = self.changes_since(data['last_seq'])
+        self.assertEqual(len(data['changes']), 1)
+        self.assertTrue(data['changes'][0]['is_deleted'])
+        self.assertEqual(data['changes'][0]['content'], '')
+        self.assertEqual(data['last_seq'], ChatChannel.objects.get(pk=self.channel.pk).last_seq)
+
+    def test_only_author_can_edit_and_volunteers_cannot_delete_others(self):
+        other = ChatMessage.objects.create(channel=self.channel, author=self.organizer, content='keep')
+        self.client.force_login(self.member)
+
+        edit = self.client.post(reverse('chat_edit_message', args=[other.pk]), {'content': 'changed'})
+        delete = self.client.post(reverse('chat_delete_message', args=[other.pk]))
+
+        self.assertEqual((edit.status_code, delete.status_code), (400, 400))
+        other.refresh_from_db()
+        self.assertEqual((other.content, other.is_deleted), ('keep', False))
+
+    def test_delete_erases_text_from_row_search_and_notification_preview(self):
+        secret = ChatMessage.objects.create(channel=self.channel, author=self.member, content='call me 555-0199')
+        notify_new_chat_message(secret)
+        self.drain_outbox()
+        self.assertIn('555-0199', Notification.objects.get(user=self.organizer, related_channel=self.channel).message)
+
+        self.client.force_login(self.organizer)
+        self.client.post(reverse('chat_delete_message', args=[secret.pk]))
+
+        secret.refresh_from_db()
+        self.assertEqual(secret.content, '')
+        self.assertFalse(search_messages(ChatMessage.objects.all(), '0199').exists())
+        preview = Notification.objects.get(user=self.organizer, related_channel=self.channel).message
+        self.assertNotIn('555-0199', preview)
+        self.assertIn('Сообщение удалено', preview)
+
+    def test_delete_leaves_notification_of_identical_message_intact(self):
+        first = ChatMessage.objects.create(channel=self.channel, author=self.member, content='same text')
+        notify_new_chat_message(first)
+        self.drain_outbox()
+        Notification.objects.filter(user=self.organizer).update(is_read=True)
+        second = ChatMessage.objects.create(channel=self.channel, author=self.member, content='same text')
+        notify_new_chat_message(second)
+        self.drain_outbox()
+
+        delete_chat_message(first)
+
+        previews = dict(
+            Notification.objects.filter(user=self.organizer, related_channel=self.channel)
+            .values_list('related_message_id', 'message')
+        )
+        self.assertIn('Сообщение удалено', previews[first.pk])
+        self.assertIn('same text', previews[second.pk])
+
+
+@mock.patch('events.controllers.chat_controller.CHAT_PAGE_SIZE', 3)
+class ChatArchiveTests(BaseEventsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.organizer = self.create_user('organizer_archive', role='organizer')
+        event = self.create_event(organizer=self.organizer, date=timezone.localdate() - timedelta(days=200))
+        self.channel = event.chat_channels.first()
+        for index in range(8):
+            ChatMessage.objects.create(channel=self.channel, author=self.organizer, content=f'msg {index}')
+        self.client.force_login(self.organizer)
+
+    def test_old_messages_move_to_segments_and_history_reads_through(self):
+        out = StringIO()
+        call_command('archive_chat_messages', '--segment-size', '3', '--vacuum', stdout=out)
+        self.assertIn('Archived 7 messages into 3 segments', out.getvalue())
+        self.assertIn('VACUUM skipped', out.getvalue())
+
+        self.assertEqual(list(ChatMessage.objects.filter(channel=self.channel).values_list('content', flat=True)), ['msg 7'])
+        self.assertEqual(self.channel.archive_segments.count(), 3)
+
+        response = self.client.get(reverse('chat_channel_detail', args=[self.channel.pk]))
+        loaded = [m.content for m in response.context['messages']]
+        cursor = response.context['older_cursor']
+        while cursor:
+            data = self.client.get(reverse('chat_older_messages', args=[self.channel.pk]), {'before': cursor}).json()
+            loaded = [m['content'] for m in data['messages']] + loaded
+            cursor = data['older_cursor']
+
+        self.assertEqual(loaded, [f'msg {index}' for index in range(8)])
+
+    def test_recent_events_are_not_archived(self):
+        self.channel.event.date = timezone.localdate() - timedelta(days=10)
+        self.channel.event.save(update_fields=['date'])
+
+        out = StringIO()
+        call_command('archive_chat_messages', '--dry-run', stdout=out)
+
+        self.assertIn('0 messages would be archived', out.getvalue())
+        self.assertEqual(ChatMessage.objects.filter(channel=self.channel).count(), 8)
+
+
+@override_settings(CACHE_IS_SHARED=True)
+class ChatReadMarkerTests(BaseEventsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.organizer = self.create_user('organizer_read_markers', role='organizer')
+        self.member = self.create_user('volunteer_read_markers')
+        self.channel = self.create_event(organizer=self.organizer).chat_channels.first()
+        self.membership = ChatChannelMembership.objects.create(channel=self.channel, user=self.member)
+
+    def test_repeat_visits_do_not_write_membership_rows(self):
+        self.client.force_login(self.member)
+        self.client.get(reverse('chat_channel_detail', args=[self.channel.pk]))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('chat_channel_detail', args=[self.channel.pk]))
+
+        self.assertEqual(response.status_code, 200)
+        writes = [q['sql'] for q in queries if 'events_chatchannelmembership' in q['sql'] and not q['sql'].startswith('SELECT')]
+        self.assertEqual(writes, [])
+
+    def test_flush_applies_marker_and_recounts_unread(self):
+        ChatMessage.objects.create(channel=self.channel, author=self.organizer, content='read')
+        read_at = timezone.now()
+        buffer_read_marker(self.channel.pk, self.member.pk, read_at)
+        ChatMessage.objects.create(channel=self.channel, author=self.organizer, content='unread')
+        self.membership.refresh_from_db()
+        self.assertEqual(self.membership.unread_count, 2)
+
+        out = StringIO()
+        call_command('flush_chat_read_markers', stdout=out)
+
+        self.assertIn('Flushed 1 chat read markers', out.getvalue())
+        self.membership.refresh_from_db()
+        self.assertEqual(self.membership.last_read_at, read_at)
+        self.assertEqual(self.membership.unread_count, 1)
+
+    def test_own_messages_count_readers_from_database_and_cache(self):
+        message = ChatMessage.objects.create(channel=self.channel, author=self.organizer, content='hello')
+        cached_reader = self.create_user('volunteer_read_markers_cached')
+        stale_reader = self.create_user('volunteer_read_markers_stale')
+        ChatChannelMembership.objects.create(
+            channel=self.channel, user=cached_reader, last_read_at=message.created_at - timedelta(minutes=1)
+        )
+        ChatChannelMembership.objects.create(
+            channel=self.channel, user=stale_reader, last_read_at=message.created_at - timedelta(minutes=1)
+        )
+        self.membership.last_read_at = message.created_at + timedelta(seconds=1)
+        self.membership.save(update_fields=['last_read_at'])
+        buffer_read_marker(self.channel.pk, cached_reader.pk, message.created_at + timedelta(seconds=1))
+
+        self.client.force_login(self.organizer)
+        response = self.client.get(reverse('chat_channel_detail', args=[self.channel.pk]))
+
+        self.assertEqual(response.context['messages'][0].read_count, 2)
+        self.assertContains(response, 'прочитано 2')
+
+    @override_settings(CACHE_IS_SHARED=False)
+    def test_visit_writes_directly_without_shared_cache(self):
+        ChatMessage.objects.create(channel=self.channel, author=self.organizer, content='hello')
+        self.client.force_login(self.member)
+        self.client.get(reverse('chat_channel_detail', args=[self.channel.pk]))
+
+        self.membership.refresh_from_db()
+        self.assertEqual(self.membership.unread_count, 0)
+        self.assertFalse(cache.get(read_marker_key(self.channel.pk, self.member.pk)))
+        out = StringIO()
+        call_command('flush_chat_read_markers', stdout=out)
+        self.assertIn('nothing to flush', out.getvalue())
@@ -19,15 +19,26 @@ urlpatterns = [
     path('profile/', views.profile_view, name='profile'),
     path('my-events/', views.my_events, name='my_events'),
     path('leaderboard/', views.leaderboard_view, name='leaderboard'),
+    path('api/leaderboard/', views.leaderboard_delta, name='leaderboard_delta'),
     path('volunteers/', views.volunteer_search, name='volunteer_search'),
     path('volunteers/<int:pk>/', views.volunteer_profile, name='volunteer_profile'),
     path('notifications/', views.notifications_list, name='notifications_list'),
     path('notifications/<int:pk>/read/', views.notification_mark_read, name='notification_mark_read'),
     path('notifications/mark-all-read/', views.notification_mark_all_read, name='notification_mark_all_read'),
+    path('notifications/settings/', views.notification_settings, name='notification_settings'),
     path('api/notifications/count/', views.notifications_unread_count, name='notifications_unread_count'),
     path('api/notifications/latest/', views.notifications_latest, name='notifications_latest'),
+    path('api/notifications/feed/', views.notifications_feed, name='notifications_feed'),
+    path('api/notifications/stream/', views.notifications_stream, name='notifications_stream'),
     path('chat/', views.chat_channels, name='chat_channels'),
+    path('chat/search/', views.chat_search, name='chat_search'),
     path('chat/<int:channel_id>/', views.chat_channel_detail, name='chat_channel_detail'),
+    path('chat/<int:channel_id>/messages/', views.chat_older_messages, name='chat_older_messages'),
+    path('chat/<int:channel_id>/send/', views.chat_send_message, name='chat_send_message'),
+    path('chat/<int:channel_id>/stream/', views.chat_channel_stream, name='chat_channel_stream'),
+    path('chat/<int:channel_id>/changes/', views.chat_channel_changes, name='chat_channel_changes'),
+    path('chat/messages/<int:message_id>/edit/', views.chat_edit_message, name='chat_edit_message'),
+    path('chat/messages/<int:message_id>/delete/', views.chat_delete_message, name='chat_delete_message'),
     path('health/', health_check, name='health_check'),
     #allauth
     path('accounts/', include('allauth.urls')),
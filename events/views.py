@@ -1,5 +1,16 @@
 from .views_auth import login_view, logout_view, register_view
-from .views_chat import chat_channel_detail, chat_channels, chat_create_channel
+from .views_chat import (
+    chat_channel_changes,
+    chat_channel_detail,
+    chat_channel_stream,
+    chat_channels,
+    chat_create_channel,
+    chat_delete_message,
+    chat_edit_message,
+    chat_older_messages,
+    chat_search,
+    chat_send_message,
+)
 from .views_events import (
     event_cancel_registration,
     event_create,
@@ -14,11 +25,20 @@ from .views_events import (
 from .views_notifications import (
     notification_mark_all_read,
     notification_mark_read,
+    notification_settings,
+    notifications_feed,
     notifications_latest,
     notifications_list,
+    notifications_stream,
     notifications_unread_count,
 )
-from .views_profiles import profile_view, volunteer_profile, volunteer_search, leaderboard_view
+from .views_profiles import (
+    leaderboard_delta,
+    leaderboard_view,
+    profile_view,
+    volunteer_profile,
+    volunteer_search,
+)
 
 __all__ = [
     'event_list',
@@ -35,14 +55,25 @@ __all__ = [
     'profile_view',
     'my_events',
     'leaderboard_view',
+    'leaderboard_delta',
     'volunteer_search',
     'volunteer_profile',
     'notifications_list',
     'notification_mark_read',
     'notification_mark_all_read',
+    'notification_settings',
     'notifications_unread_count',
     'notifications_latest',
+    'notifications_feed',
+    'notifications_stream',
     'chat_channels',
+    'chat_channel_changes',
     'chat_channel_detail',
+    'chat_channel_stream',
     'chat_create_channel',
+    'chat_delete_message',
+    'chat_edit_message',
+    'chat_older_messages',
+    'chat_search',
+    'chat_send_message',
 ]
@@ -1,13 +1,15 @@
+from asgiref.sync import sync_to_async
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.db import IntegrityError, transaction
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.utils import timezone
+from django.views.decorators.http import require_POST
 
 from .forms import ChatChannelForm, ChatMessageForm
 from .models import ChatChannel, ChatChannelMembership, Event, Notification
-from .selectors import available_channels_for_user, unread_message_counts_by_channel
-from .services import add_approved_volunteers_to_channel
+from .selectors import available_channels_for_user, user_can_access_channel, user_moderates_channel
 from .controllers.chat_controller import ChatController
 
 
@@ -33,6 +35,92 @@ def chat_channel_detail(request, channel_id):
         return redirect('chat_channels')
 
 
+@login_required
+def chat_search(request):
+    """Поиск по сообщениям чата"""
+    try:
+        context = ChatController.search(request)
+        return render(request, 'events/chat_search.html', context)
+    except ValueError as e:
+        messages.error(request, str(e))
+        return redirect('chat_channels')
+
+
+@login_required
+def chat_older_messages(request, channel_id):
+    """API: более ранние сообщения канала по курсору"""
+    return ChatController.get_older_messages(request, channel_id)
+
+
+@login_required
+@require_POST
+def chat_send_message(request, channel_id):
+    """Отправка сообщения: JSON для запросов из скрипта, иначе редирект в канал"""
+    is_ajax = request.headers.get('X-Requested-With') == 'XMLHttpRequest'
+    try:
+        message = ChatController.send_message(request, channel_id)
+    except ValueError as e:
+        if is_ajax:
+            return JsonResponse({'error': str(e)}, status=400)
+        messages.error(request, str(e))
+        return redirect('chat_channel_detail', channel_id=channel_id)
+    
+    if is_ajax:
+        return JsonResponse(ChatController.serialize_message(message, request.user), status=201)
+    return redirect('chat_channel_detail', channel_id=channel_id)
+
+
+@login_required
+@require_POST
+def chat_edit_message(request, message_id):
+    """API: изменение своего сообщения"""
+    try:
+        message = ChatController.edit_message(request, message_id)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse(ChatController.serialize_message(message, request.user))
+
+
+@login_required
+@require_POST
+def chat_delete_message(request, message_id):
+    """API: мягкое удаление сообщения"""
+    try:
+        message = ChatController.delete_message(request, message_id)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse(ChatController.serialize_message(message, request.user))
+
+
+@login_required
+def chat_channel_changes(request, channel_id):
+    """API: изменения канала после номера since"""
+    return ChatController.get_changes(request, channel_id)
+
+
+@login_required
+async def chat_channel_stream(request, channel_id):
+    """API: поток новых сообщений канала (Server-Sent Events, требует ASGI)"""
+    user = await request.auser()
+    channel = await ChatChannel.objects.select_related('event').filter(pk=channel_id).afirst()
+    if channel is None or not await sync_to_async(user_can_access_channel)(user, channel):
+        return JsonResponse({'error': 'У вас нет доступа к этому каналу.'}, status=403)
+    
+    # При переподключении браузер сам передает Last-Event-ID, при первом - ?after=
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('after', '')
+    stream = ChatController.stream_channel(
+        user,
+        channel_id,
+        int(last_event_id) if last_event_id.isdigit() else None,
+        can_moderate=user_moderates_channel(user, channel),
+    )
+    response = StreamingHttpResponse(stream, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Отключает буферизацию ответа в nginx
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @login_required
 def chat_create_channel(request, event_pk):
     """Создание нового канала чата для события"""
@@ -1,7 +1,7 @@
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse
 from django.views.decorators.http import require_POST
@@ -22,6 +22,19 @@ def notifications_list(request):
         return redirect('event_list')
 
 
+@login_required
+def notification_settings(request):
+    """Настройки: какие типы уведомлений не присылать"""
+    if request.method == 'POST':
+        form, saved = NotificationController.save_preferences(request)
+        if saved:
+            messages.success(request, 'Настройки уведомлений сохранены')
+            return redirect('notification_settings')
+    else:
+        form = NotificationController.get_preferences_form(request)
+    return render(request, 'events/notification_settings.html', {'form': form})
+
+
 @login_required
 @require_POST
 def notification_mark_read(request, pk):
@@ -62,3 +75,25 @@ def notifications_unread_count(request):
 def notifications_latest(request):
     """API: последние непрочитанные уведомления"""
     return NotificationController.get_latest_notifications(request)
+
+
+@login_required
+def notifications_feed(request):
+    """API: следующая страница ленты уведомлений по курсору"""
+    return NotificationController.get_notifications_feed(request)
+
+
+@login_required
+async def notifications_stream(request):
+    """API: поток новых уведомлений (Server-Sent Events, требует ASGI)"""
+    user = await request.auser()
+    last_event_id = request.headers.get('Last-Event-ID', '')
+    stream = NotificationController.stream_notifications(
+        user,
+        int(last_event_id) if last_event_id.isdigit() else None,
+    )
+    response = StreamingHttpResponse(stream, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Отключает буферизацию ответа в nginx
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -3,6 +3,8 @@ from django.contrib.auth.decorators import login_required
 from django.shortcuts import get_object_or_404, redirect, render
 from django.utils import timezone
 
+from .constants import LEADERBOARD_PERIODS
+from .decorators import rate_limit
 from .forms import UserProfileForm, VolunteerSearchForm
 from .models import Event, EventRegistration, UserProfile, VolunteerAchievement
 from .controllers.profile_controller import ProfileController
@@ -75,11 +77,28 @@ def volunteer_profile(request, pk):
 def leaderboard_view(request):
     """Таблица лидеров"""
     try:
-        leaderboard_data = ProfileController.get_leaderboard()
-        context = {
-            'leaderboard_data': leaderboard_data,
-        }
+        period = request.GET.get('period', 'all')
+        if period not in LEADERBOARD_PERIODS:
+            period = 'all'
+        city = request.GET.get('city', '').strip()
+        context = ProfileController.get_leaderboard(
+            period=period,
+            city=city,
+            cursor=request.GET.get('cursor'),
+            user=request.user,
+        )
+        context.update({
+            'period': period,
+            'selected_city': city,
+        })
         return render(request, 'events/leaderboard.html', context)
     except Exception as e:
         messages.error(request, f'Ошибка загрузки таблицы лидеров: {str(e)}')
         return redirect('event_list')
+
+
+@login_required
+@rate_limit('leaderboard_delta', limit=120, window_seconds=60)
+def leaderboard_delta(request):
+    """API: изменения страницы рейтинга с указанной версии"""
+    return ProfileController.get_leaderboard_delta(request)
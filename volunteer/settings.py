@@ -182,6 +182,29 @@ DATABASES = {
 }
 
 
+# Cache
+# Счетчики уведомлений и версии рейтинга должны быть общими для всех процессов,
+# поэтому в продакшене задается REDIS_URL; без него используется локальная память.
+# CACHE_IS_SHARED выключает кеши, которые неверны, если каждый процесс видит только свой кеш.
+
+REDIS_URL = os.environ.get('REDIS_URL', '')
+CACHE_IS_SHARED = bool(REDIS_URL)
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -226,6 +249,9 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Архивы удаленных по сроку хранения данных (purge_notifications)
+ARCHIVE_ROOT = Path(os.environ.get('ARCHIVE_ROOT', BASE_DIR / 'archive'))
+
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field